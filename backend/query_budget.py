@@ -0,0 +1,38 @@
+"""
+Query-budget assertions for endpoint tests.
+
+Every response carries a Server-Timing `db` metric with the number of Mongo
+commands the request ran (see QUERY STATS in server.py), so a test can pin
+an endpoint's query count and catch N+1 regressions:
+
+    from fastapi.testclient import TestClient
+    from query_budget import assert_query_budget
+    import server
+
+    def test_feed_resolves_stores_in_one_query():
+        with TestClient(server.app) as client:
+            response = client.get("/api/products", params={"latitude": 19.07, "longitude": 72.87})
+            assert_query_budget(response, 2)
+
+Counts come from pymongo command monitoring, so they need a real mongod;
+mongomock never emits command events and always reports 0 queries.
+"""
+import re
+
+SERVER_TIMING_DB = re.compile(r'(?:^|,)\s*db;dur=([\d.]+);desc="(\d+) queries"')
+
+def request_queries(response):
+    """(query count, db milliseconds) the server reported for `response`"""
+    match = SERVER_TIMING_DB.search(response.headers.get("server-timing", ""))
+    if match is None:
+        raise AssertionError("response has no Server-Timing db metric; is QueryStatsMiddleware installed?")
+    return int(match.group(2)), float(match.group(1))
+
+def assert_query_budget(response, budget: int):
+    """Fail when the request behind `response` ran more than `budget` Mongo commands"""
+    count, db_ms = request_queries(response)
+    request = response.request
+    assert count <= budget, (
+        f"{request.method} {request.url.path} ran {count} queries ({db_ms:.1f} ms), budget is {budget}"
+    )
+    return count
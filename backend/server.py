@@ -1,20 +1,46 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Header, Cookie
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Header, Cookie, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers, MutableHeaders
 from motor.motor_asyncio import AsyncIOMotorClient
+from motor.frameworks import asyncio as motor_asyncio_framework
+from pymongo import UpdateOne, DeleteMany, ReturnDocument, monitoring
+from pymongo.errors import DuplicateKeyError, CollectionInvalid
 from pydantic import BaseModel, Field, ConfigDict, field_validator
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, NamedTuple
 from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
+from cachetools import TTLCache, LRUCache
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from twilio.rest import Client
 from jose import JWTError, jwt
+from PIL import Image
 import os
 import logging
 from pathlib import Path
 import uuid
 import httpx
 import math
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+import json
+import asyncio
+import csv
+import io
+import hashlib
+import hmac
+import time
+import threading
+import contextvars
+from collections import Counter as TallyCounter, deque
+import zlib
+import smtplib
+from email.message import EmailMessage
+import orjson
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+from emergentintegrations.llm.chat import LlmChat, UserMessage, ImageContent
 import base64
 import razorpay
 import bcrypt
@@ -25,8 +51,134 @@ load_dotenv(ROOT_DIR / '.env')
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# ====== METRICS ======
+# Prometheus collectors, served as text from /metrics (see METRICS ENDPOINT
+# below). HTTP metrics are labelled by route template, never by raw path, so
+# cardinality stays at one series per route. Mongo commands are observed by a
+# pymongo CommandListener on the client, which pymongo only accepts at
+# construction - hence this section sits ahead of the client. The same
+# listener feeds the per-request QueryStats (see QUERY STATS below): Motor
+# runs commands with the caller's context, so the listener can see which
+# request issued them.
+
+HTTP_REQUESTS = Counter("foodambo_http_requests_total", "HTTP requests", ["method", "route", "status"])
+HTTP_LATENCY = Histogram("foodambo_http_request_duration_seconds", "HTTP request latency", ["method", "route"])
+HTTP_IN_FLIGHT = Gauge("foodambo_http_requests_in_flight", "HTTP requests being handled", ["method", "route"])
+MONGO_COMMANDS = Counter("foodambo_mongo_commands_total", "Mongo commands", ["collection", "command", "outcome"])
+MONGO_LATENCY = Histogram(
+    "foodambo_mongo_command_duration_seconds", "Mongo command latency", ["collection", "command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+CACHE_REQUESTS = Counter("foodambo_cache_requests_total", "In-process cache lookups", ["cache", "outcome"])
+EVENT_LOOP_LAG = Histogram(
+    "foodambo_event_loop_lag_seconds", "Event loop scheduling delay",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+EXECUTOR_QUEUE = Gauge("foodambo_executor_queue_depth", "Calls waiting for a worker thread", ["executor"])
+TASK_QUEUE_DEPTH = Gauge("foodambo_task_queue_depth", "Background tasks by queue and status", ["queue", "status"])
+TASK_QUEUE_LAG = Gauge("foodambo_task_queue_oldest_due_seconds", "Age of the oldest due task", ["queue"])
+
+def command_collection(command_name: str, command) -> str:
+    target = command.get(command_name)
+    if isinstance(target, str):
+        return target
+    return command.get("collection", "-")  # getMore names it separately
+
+def query_shape(value):
+    """A filter with every literal replaced by "?": {"id": {"$in": "?"}}"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        return [query_shape(item) for item in value]  # $or / $and branches
+    return "?"
+
+SHAPE_FILTERS = {"find": "filter", "count": "query", "distinct": "query", "findAndModify": "query"}
+
+def command_shape(command_name: str, command) -> str:
+    """collection.command plus the normalized filter, so that commands which
+    differ only in their values share one shape"""
+    if command_name in SHAPE_FILTERS:
+        spec = query_shape(command.get(SHAPE_FILTERS[command_name]) or {})
+    elif command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes") or [{}]
+        spec = query_shape(statements[0].get("q", {}))
+    elif command_name == "aggregate":
+        spec = [
+            {"$match": query_shape(stage["$match"])} if "$match" in stage else next(iter(stage), "?")
+            for stage in command.get("pipeline", [])
+        ]
+    else:
+        return f"{command_collection(command_name, command)}.{command_name}"
+    return f"{command_collection(command_name, command)}.{command_name} {orjson.dumps(spec, option=orjson.OPT_SORT_KEYS).decode()}"
+
+class QueryStats:
+    """Mongo commands issued on behalf of one request"""
+    
+    def __init__(self, scope=None):
+        self.scope = scope  # routing later adds the matched route to it
+        self.lock = threading.Lock()
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = TallyCounter()
+    
+    def started(self, shape: str):
+        with self.lock:
+            self.count += 1
+            self.shapes[shape] += 1
+    
+    def finished(self, seconds: float):
+        with self.lock:
+            self.seconds += seconds
+
+current_query_stats: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("current_query_stats", default=None)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Counts and times every command per collection and per request; runs on Motor's worker threads"""
+    
+    def __init__(self):
+        self.inflight: Dict[int, tuple] = {}
+    
+    def started(self, event):
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.started(command_shape(event.command_name, event.command))
+        self.inflight[event.request_id] = (command_collection(event.command_name, event.command), stats, event)
+    
+    def succeeded(self, event):
+        self.record(event, "ok")
+    
+    def failed(self, event):
+        self.record(event, "error")
+    
+    def record(self, event, outcome: str):
+        collection, stats, started = self.inflight.pop(event.request_id, ("-", None, None))
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMANDS.labels(collection, event.command_name, outcome).inc()
+        MONGO_LATENCY.labels(collection, event.command_name).observe(seconds)
+        if stats is not None:
+            stats.finished(seconds)
+        if seconds * 1000 >= SLOW_QUERY_MS and started is not None:
+            record_slow_query(started, collection, stats, seconds)
+
+class MetricsRoute(APIRoute):
+    """APIRoute that keeps the in-flight gauge for its own path template"""
+    
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        path = self.path
+        
+        async def tracked_handler(request: Request):
+            in_flight = HTTP_IN_FLIGHT.labels(request.method, path)
+            in_flight.inc()
+            try:
+                return await handler(request)
+            finally:
+                in_flight.dec()
+        return tracked_handler
+
 mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(mongo_url)
+# tz_aware: BSON dates come back as UTC-aware datetimes, comparable with datetime.now(timezone.utc)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, event_listeners=[MongoCommandMetrics()])
 db = client[os.environ.get('DB_NAME', 'foodambo_db')]
 
 SECRET_KEY = os.environ.get('SECRET_KEY', 'fallback_secret_key')
@@ -43,6 +195,45 @@ RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID', '')
 RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', '')
 RAZORPAY_WEBHOOK_SECRET = os.environ.get('RAZORPAY_WEBHOOK_SECRET', '')
 
+ANALYTICS_REFRESH_SECONDS = int(os.environ.get('ANALYTICS_REFRESH_SECONDS', 60))
+ADMIN_COUNT_TTL_SECONDS = int(os.environ.get('ADMIN_COUNT_TTL_SECONDS', 30))
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 500))
+ROLLUP_INTERVAL_SECONDS = int(os.environ.get('ROLLUP_INTERVAL_SECONDS', 300))
+DATETIME_MIGRATION_BATCH_SIZE = int(os.environ.get('DATETIME_MIGRATION_BATCH_SIZE', 500))
+DESCRIPTION_CACHE_SIZE = int(os.environ.get('DESCRIPTION_CACHE_SIZE', 2048))
+DESCRIPTION_CACHE_TTL_DAYS = int(os.environ.get('DESCRIPTION_CACHE_TTL_DAYS', 30))
+DESCRIPTION_CONCURRENCY = int(os.environ.get('DESCRIPTION_CONCURRENCY', 4))
+DESCRIPTION_TIMEOUT_SECONDS = float(os.environ.get('DESCRIPTION_TIMEOUT_SECONDS', 30))
+FSSAI_EXTRACTOR = os.environ.get('FSSAI_EXTRACTOR', 'llm')  # 'llm' or 'fake'
+FSSAI_JOB_TIMEOUT_SECONDS = float(os.environ.get('FSSAI_JOB_TIMEOUT_SECONDS', 60))
+FSSAI_JOB_MAX_ATTEMPTS = int(os.environ.get('FSSAI_JOB_MAX_ATTEMPTS', 3))
+FSSAI_JOB_RETRY_BASE_SECONDS = float(os.environ.get('FSSAI_JOB_RETRY_BASE_SECONDS', 5))
+TASK_QUEUE_CONCURRENCY_OVERRIDES = os.environ.get('TASK_QUEUE_CONCURRENCY', '')  # e.g. "llm=4,email=1"
+TASK_POLL_SECONDS = float(os.environ.get('TASK_POLL_SECONDS', 1))
+TASK_VISIBILITY_SECONDS = float(os.environ.get('TASK_VISIBILITY_SECONDS', 900))
+TASK_RETENTION_DAYS = int(os.environ.get('TASK_RETENTION_DAYS', 7))
+ORDER_EXPIRY_SWEEP_SECONDS = int(os.environ.get('ORDER_EXPIRY_SWEEP_SECONDS', 60))
+PAYMENT_EVENT_BATCH_SIZE = int(os.environ.get('PAYMENT_EVENT_BATCH_SIZE', 100))
+SUBSCRIPTION_SWEEP_SECONDS = int(os.environ.get('SUBSCRIPTION_SWEEP_SECONDS', 300))
+SUBSCRIPTION_SWEEP_BATCH_SIZE = int(os.environ.get('SUBSCRIPTION_SWEEP_BATCH_SIZE', 500))
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', 1024))
+QUERY_BUDGET = int(os.environ.get('QUERY_BUDGET', 20))
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+SLOW_QUERY_LOG_BYTES = int(os.environ.get('SLOW_QUERY_LOG_BYTES', 16 * 1024 * 1024))
+SLOW_QUERY_FLUSH_SECONDS = int(os.environ.get('SLOW_QUERY_FLUSH_SECONDS', 10))
+SLOW_QUERY_EXPLAIN_TTL_SECONDS = int(os.environ.get('SLOW_QUERY_EXPLAIN_TTL_SECONDS', 3600))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # when set, /metrics requires "Bearer <token>"
+EVENT_LOOP_LAG_SAMPLE_SECONDS = float(os.environ.get('EVENT_LOOP_LAG_SAMPLE_SECONDS', 0.5))
+PUBLIC_READ_CACHE_SIZE = int(os.environ.get('PUBLIC_READ_CACHE_SIZE', 4096))
+PUBLIC_READ_CACHE_TTL_SECONDS = float(os.environ.get('PUBLIC_READ_CACHE_TTL_SECONDS', 5))
+
+SMTP_HOST = os.environ.get('SMTP_HOST', '')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+SMTP_USERNAME = os.environ.get('SMTP_USERNAME', '')
+SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', '')
+SMTP_FROM = os.environ.get('SMTP_FROM', 'Foodambo <no-reply@foodambo.in>')
+
 twilio_client = None
 if TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and not TWILIO_ACCOUNT_SID.startswith('your_'):
     try:
@@ -63,8 +254,29 @@ if RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET and not RAZORPAY_KEY_ID.startswith('y
 else:
     logger.info("Razorpay not configured - using mock mode")
 
-app = FastAPI(title="Foodambo API")
-api_router = APIRouter(prefix="/api")
+# ====== JSON RESPONSES ======
+# orjson serializes datetimes, UUIDs and dicts natively, so list endpoints can
+# hand raw Mongo documents straight to FastJSONResponse and skip the recursive
+# jsonable_encoder walk FastAPI applies to plain return values.
+
+def orjson_default(value: Any):
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+app = FastAPI(title="Foodambo API", default_response_class=FastJSONResponse)
+api_router = APIRouter(prefix="/api", route_class=MetricsRoute)
+
+RATING_STARS = (1, 2, 3, 4, 5)
+
+def empty_rating_histogram() -> Dict[str, int]:
+    return {str(star): 0 for star in RATING_STARS}
 
 class User(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -90,6 +302,26 @@ class User(BaseModel):
     delivery_available: bool = False
     pickup_available: bool = True
 
+class Principal:
+    """The authenticated caller: only what authorization checks need.
+
+    Built per request by get_current_user, so it stays a plain slotted object
+    rather than a validated model. Handlers that need the rest of the profile
+    call load_user_profile().
+    """
+    __slots__ = ("id", "is_admin", "is_seller", "seller_active")
+
+    def __init__(self, id: str, is_admin: bool = False, is_seller: bool = False, seller_active: bool = False):
+        self.id = id
+        self.is_admin = is_admin
+        self.is_seller = is_seller
+        self.seller_active = seller_active
+
+    def __repr__(self) -> str:
+        return f"Principal(id={self.id!r}, is_admin={self.is_admin}, is_seller={self.is_seller})"
+
+PRINCIPAL_PROJECTION = {"_id": 0, "id": 1, "is_admin": 1, "is_seller": 1, "seller_active": 1}
+
 class UserSession(BaseModel):
     model_config = ConfigDict(extra="ignore")
     session_token: str
@@ -114,10 +346,16 @@ class Store(BaseModel):
     fssai_certificate_url: Optional[str] = None
     fssai_submitted_at: Optional[datetime] = None
     fssai_assistance_requested: bool = False
+    fssai_job_id: Optional[str] = None
+    fssai_extraction: Optional[Dict[str, Any]] = None
     rating: float = 0.0
     total_reviews: int = 0
+    rating_sum: int = 0
+    rating_histogram: Dict[str, int] = Field(default_factory=empty_rating_histogram)
     acceptance_rate: float = 100.0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = 1
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Subscription(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -132,6 +370,7 @@ class Subscription(BaseModel):
     payment_date: Optional[datetime] = None
     expires_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class PaymentOrder(BaseModel):
     plan_type: str  # 'activation', 'monthly', 'yearly'
@@ -151,6 +390,7 @@ class Product(BaseModel):
     description: str
     price: float
     photos: List[str] = []
+    thumbnail: Optional[str] = None
     product_type: str
     is_veg: bool = True
     spice_level: Optional[str] = None
@@ -166,6 +406,8 @@ class Product(BaseModel):
     pickup_available: bool = True
     active: bool = True
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = 1
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Order(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -183,8 +425,14 @@ class Order(BaseModel):
     buyer_address: Optional[str] = None
     buyer_phone: Optional[str] = None
     party_package: Optional[str] = None
+    expires_at: Optional[datetime] = None
+    accepted_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
     delivered_at: Optional[datetime] = None
+    cancelled_at: Optional[datetime] = None
+    cancellation_charge: float = 0.0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Message(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -198,11 +446,6 @@ class Message(BaseModel):
 class MessageCreate(BaseModel):
     order_id: str
     message: str
-    accepted_at: Optional[datetime] = None
-    completed_at: Optional[datetime] = None
-    expires_at: Optional[datetime] = None
-    cancelled_at: Optional[datetime] = None
-    cancellation_charge: float = 0.0
 
 class ChatMessage(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -224,6 +467,8 @@ class Review(BaseModel):
     rating: int
     comment: str
     photos: List[str] = []
+    thumbnail: Optional[str] = None
+    has_photos: bool = False
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Transaction(BaseModel):
@@ -233,6 +478,7 @@ class Transaction(BaseModel):
     transaction_type: str
     amount: float
     description: str
+    reference: Optional[str] = None  # business event this entry books, e.g. "cancellation:<order_id>"
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class OTPRequest(BaseModel):
@@ -294,8 +540,17 @@ class ReviewCreate(BaseModel):
     comment: str
     photos: List[str] = []
 
+    @field_validator('rating')
+    @classmethod
+    def rating_in_range(cls, v: int) -> int:
+        if v not in RATING_STARS:
+            raise ValueError('Rating must be between 1 and 5')
+        return v
+
 class FSSAIUpload(BaseModel):
-    image_base64: str
+    fssai_number: Optional[str] = None
+    fssai_certificate_url: Optional[str] = ""
+    image_base64: Optional[str] = None  # certificate photo, raw base64 or a data: URL
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -303,17 +558,37 @@ def create_access_token(data: dict):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def serialize_user_data(user_dict):
-    """Global helper to serialize datetime fields to ISO format"""
-    if user_dict.get('created_at') and isinstance(user_dict['created_at'], datetime):
-        user_dict['created_at'] = user_dict['created_at'].isoformat()
-    if user_dict.get('subscription_started_at') and isinstance(user_dict['subscription_started_at'], datetime):
-        user_dict['subscription_started_at'] = user_dict['subscription_started_at'].isoformat()
-    if user_dict.get('subscription_expires_at') and isinstance(user_dict['subscription_expires_at'], datetime):
-        user_dict['subscription_expires_at'] = user_dict['subscription_expires_at'].isoformat()
-    if user_dict.get('reset_otp_expires') and isinstance(user_dict['reset_otp_expires'], datetime):
-        user_dict['reset_otp_expires'] = user_dict['reset_otp_expires'].isoformat()
-    return user_dict
+USER_PRIVATE_FIELDS = ("password_hash", "reset_otp", "reset_otp_expires")
+
+def public_user(user_dict):
+    """Strip credentials from a user document; datetimes are left for the response class"""
+    return {k: v for k, v in user_dict.items() if k not in USER_PRIVATE_FIELDS}
+
+# ====== DATETIME CODEC ======
+# Every timestamp is stored as a native BSON date in UTC. Models go through
+# to_document() on the way in; anything read back that may predate the
+# migration goes through to_datetime().
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def to_datetime(value: Any) -> Optional[datetime]:
+    """Coerce a stored timestamp (BSON date or legacy ISO string) to an aware UTC datetime"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return as_utc(value).astimezone(timezone.utc)
+
+def to_document(model: BaseModel) -> Dict[str, Any]:
+    """Dump a model for insertion with all datetimes as aware UTC values"""
+    doc = model.model_dump()
+    for key, value in doc.items():
+        if isinstance(value, datetime):
+            doc[key] = to_datetime(value)
+    return doc
 
 async def get_current_user(authorization: Optional[str] = Header(None), session_token: Optional[str] = Cookie(None)):
     token = None
@@ -333,13 +608,26 @@ async def get_current_user(authorization: Optional[str] = Header(None), session_
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
     
-    user_doc = await db.users.find_one({"id": user_id}, {"_id": 0})
+    user_doc = await db.users.find_one({"id": user_id}, PRINCIPAL_PROJECTION)
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return User(**user_doc)
+    return Principal(
+        user_doc["id"],
+        is_admin=user_doc.get("is_admin", False),
+        is_seller=user_doc.get("is_seller", False),
+        seller_active=user_doc.get("seller_active", False)
+    )
+
+async def load_user_profile(principal: Principal, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Fetch the caller's profile (or just `fields` of it), without credentials"""
+    projection = {"_id": 0, **{f: 1 for f in fields}} if fields else {"_id": 0}
+    user_doc = await db.users.find_one({"id": principal.id}, projection)
+    if not user_doc:
+        raise HTTPException(status_code=404, detail="User not found")
+    return public_user(user_doc)
 
-async def get_admin_user(current_user: User = Depends(get_current_user)):
+async def get_admin_user(current_user: Principal = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_user
@@ -354,40 +642,705 @@ def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
     return R * c
 
+# ====== TASK QUEUE ======
+# Deferred work lives in the tasks collection and is run by an asyncio worker
+# pool started with the app. A worker leases the next due task on its queue
+# (status "leased" until leased_until, the visibility timeout), acks it on
+# success and otherwise reschedules it with exponential backoff; once
+# max_attempts is spent the task is dead-lettered (status "dead") for an admin
+# to inspect or retry, and the handler's on_dead hook, if any, runs. A lease
+# that runs out because its worker died makes the task eligible again.
+
+TASK_HANDLERS: Dict[str, Dict[str, Any]] = {}
+TASK_WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+TASK_RETRY_MAX_SECONDS = 3600
+
+def parse_queue_concurrency(spec: str) -> Dict[str, int]:
+    """'llm=4,email=1' -> {'llm': 4, 'email': 1}"""
+    limits = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        queue, _, limit = part.partition("=")
+        limits[queue.strip()] = int(limit)
+    return limits
+
+TASK_QUEUE_CONCURRENCY = {
+    "default": 2,
+    "email": 2,
+    "otp": 2,
+    "llm": 2,
+    "payments": 1,
+    "maintenance": 1,
+    **parse_queue_concurrency(TASK_QUEUE_CONCURRENCY_OVERRIDES)
+}
+
+task_wakeups: Dict[str, asyncio.Event] = {}
+task_stats: Dict[str, Dict[str, float]] = {
+    queue: {"completed": 0, "retried": 0, "dead": 0, "wait_seconds": 0.0, "run_seconds": 0.0}
+    for queue in TASK_QUEUE_CONCURRENCY
+}
+
+def task_handler(name: str, queue: str = "default", max_attempts: int = 5,
+                 timeout_seconds: float = 60, retry_base_seconds: float = 10, on_dead=None):
+    """Register `async def handler(payload, task)` to run tasks called `name`;
+    `async def on_dead(payload, task, error)` runs once the task is dead-lettered"""
+    if queue not in TASK_QUEUE_CONCURRENCY:
+        raise ValueError(f"Unknown task queue: {queue}")
+    if timeout_seconds >= TASK_VISIBILITY_SECONDS:
+        raise ValueError(f"Task {name} would outlive its lease")
+    
+    def register(handler):
+        TASK_HANDLERS[name] = {
+            "handler": handler,
+            "queue": queue,
+            "max_attempts": max_attempts,
+            "timeout_seconds": timeout_seconds,
+            "retry_base_seconds": retry_base_seconds,
+            "on_dead": on_dead
+        }
+        return handler
+    return register
+
+async def enqueue_task(name: str, payload: Optional[Dict[str, Any]] = None,
+                       delay_seconds: float = 0, dedupe_key: Optional[str] = None) -> str:
+    """Queue a task and return its id.
+
+    With a dedupe_key, a task with the same key that is still waiting to run
+    absorbs the request and its id is returned instead.
+    """
+    spec = TASK_HANDLERS[name]
+    now = datetime.now(timezone.utc)
+    task = {
+        "id": str(uuid.uuid4()),
+        "name": name,
+        "queue": spec["queue"],
+        "payload": payload or {},
+        "status": "ready",
+        "attempts": 0,
+        "max_attempts": spec["max_attempts"],
+        "run_at": now + timedelta(seconds=delay_seconds),
+        "leased_until": None,
+        "lease_owner": None,
+        "last_error": None,
+        "dedupe_key": dedupe_key,
+        "created_at": now,
+        "updated_at": now
+    }
+    if dedupe_key:
+        try:
+            result = await db.tasks.update_one(
+                {"dedupe_key": dedupe_key, "status": "ready"},
+                {"$setOnInsert": {k: v for k, v in task.items() if k not in ("dedupe_key", "status")}},
+                upsert=True
+            )
+            inserted = result.upserted_id is not None
+        except DuplicateKeyError:
+            inserted = False  # a concurrent enqueue upserted the same key first
+        if not inserted:
+            existing = await db.tasks.find_one({"dedupe_key": dedupe_key, "status": "ready"}, {"_id": 0, "id": 1})
+            return existing["id"] if existing else task["id"]
+    else:
+        await db.tasks.insert_one(task)
+    
+    wakeup = task_wakeups.get(spec["queue"])
+    if wakeup and delay_seconds <= 0:
+        wakeup.set()
+    return task["id"]
+
+async def lease_task(queue: str) -> Optional[Dict[str, Any]]:
+    now = datetime.now(timezone.utc)
+    return await db.tasks.find_one_and_update(
+        {"queue": queue, "$or": [
+            {"status": "ready", "run_at": {"$lte": now}},
+            {"status": "leased", "leased_until": {"$lte": now}}
+        ]},
+        {
+            "$set": {
+                "status": "leased",
+                "leased_until": now + timedelta(seconds=TASK_VISIBILITY_SECONDS),
+                "lease_owner": TASK_WORKER_ID,
+                "started_at": now,
+                "updated_at": now
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("run_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+def owned(task: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": task["id"], "status": "leased", "lease_owner": TASK_WORKER_ID}
+
+async def ack_task(task: Dict[str, Any]):
+    now = datetime.now(timezone.utc)
+    result = await db.tasks.update_one(
+        owned(task),
+        {"$set": {"status": "done", "leased_until": None, "finished_at": now, "updated_at": now}}
+    )
+    if not result.modified_count:
+        logger.warning(f"Task {task['id']} ({task['name']}) finished after its lease expired")
+
+async def fail_task(task: Dict[str, Any], error: str):
+    now = datetime.now(timezone.utc)
+    stats = task_stats[task["queue"]]
+    if task["attempts"] >= task["max_attempts"]:
+        update = {"status": "dead", "leased_until": None, "last_error": error, "finished_at": now, "updated_at": now}
+        stats["dead"] += 1
+        logger.error(f"Task {task['id']} ({task['name']}) dead after {task['attempts']} attempts: {error}")
+    else:
+        retry_base = TASK_HANDLERS.get(task["name"], {}).get("retry_base_seconds", 10)
+        delay = min(retry_base * 2 ** (task["attempts"] - 1), TASK_RETRY_MAX_SECONDS)
+        update = {"status": "ready", "run_at": now + timedelta(seconds=delay), "leased_until": None,
+                  "last_error": error, "updated_at": now}
+        stats["retried"] += 1
+        logger.warning(f"Task {task['id']} ({task['name']}) attempt {task['attempts']} failed, retrying in {delay}s: {error}")
+    await db.tasks.update_one(owned(task), {"$set": update})
+    
+    on_dead = TASK_HANDLERS.get(task["name"], {}).get("on_dead")
+    if update["status"] == "dead" and on_dead:
+        try:
+            await on_dead(task["payload"], task, error)
+        except Exception as e:
+            logger.error(f"Dead-letter hook for task {task['id']} ({task['name']}) failed: {str(e)}")
+
+async def release_task(task: Dict[str, Any]):
+    """Hand a leased task back untouched (worker shutting down)"""
+    await db.tasks.update_one(
+        owned(task),
+        {"$set": {"status": "ready", "leased_until": None, "updated_at": datetime.now(timezone.utc)}, "$inc": {"attempts": -1}}
+    )
+
+async def with_timeout(awaitable, timeout: float):
+    """asyncio.wait_for that never drops a cancellation; before Python 3.12
+    wait_for swallows one that arrives just as the awaitable finishes"""
+    inner = asyncio.ensure_future(awaitable)
+    try:
+        done, _ = await asyncio.wait({inner}, timeout=timeout)
+    except asyncio.CancelledError:
+        inner.cancel()
+        raise
+    if not done:
+        inner.cancel()
+        await asyncio.wait({inner})
+        raise asyncio.TimeoutError()
+    return inner.result()
+
+async def run_task(task: Dict[str, Any]):
+    stats = task_stats[task["queue"]]
+    started = datetime.now(timezone.utc)
+    stats["wait_seconds"] += max((started - as_utc(task["run_at"])).total_seconds(), 0.0)
+    spec = TASK_HANDLERS.get(task["name"])
+    try:
+        if not spec:
+            raise LookupError(f"No handler registered for task {task['name']}")
+        await with_timeout(spec["handler"](task["payload"], task), spec["timeout_seconds"])
+    except asyncio.CancelledError:
+        await release_task(task)
+        raise
+    except asyncio.TimeoutError:
+        await fail_task(task, "Timed out")
+    except Exception as e:
+        await fail_task(task, str(e) or type(e).__name__)
+    else:
+        await ack_task(task)
+        stats["completed"] += 1
+    finally:
+        stats["run_seconds"] += (datetime.now(timezone.utc) - started).total_seconds()
+
+async def task_worker(queue: str):
+    wakeup = task_wakeups[queue]
+    while True:
+        wakeup.clear()
+        try:
+            task = await lease_task(queue)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Leasing from task queue {queue} failed: {str(e)}")
+            task = None
+        if task is None:
+            try:
+                await with_timeout(wakeup.wait(), TASK_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await run_task(task)
+
+def start_task_workers():
+    for queue, concurrency in TASK_QUEUE_CONCURRENCY.items():
+        task_wakeups[queue] = asyncio.Event()
+        for n in range(concurrency):
+            background_tasks.append(asyncio.create_task(task_worker(queue), name=f"task_worker_{queue}_{n}"))
+
+async def task_queue_metrics() -> Dict[str, Any]:
+    """Per-queue depth by status, age of the oldest due task, and this process's counters"""
+    now = datetime.now(timezone.utc)
+    counts, lag = await asyncio.gather(
+        db.tasks.aggregate([
+            {"$match": {"status": {"$in": ["ready", "leased", "dead"]}}},
+            {"$group": {"_id": {"queue": "$queue", "status": "$status"}, "count": {"$sum": 1}}}
+        ]).to_list(None),
+        db.tasks.aggregate([
+            {"$match": {"status": "ready", "run_at": {"$lte": now}}},
+            {"$group": {"_id": "$queue", "oldest": {"$min": "$run_at"}}}
+        ]).to_list(None)
+    )
+    queues = {
+        queue: {
+            "concurrency": concurrency,
+            "ready": 0, "leased": 0, "dead": 0,
+            "oldest_due_seconds": 0.0,
+            **task_stats[queue]
+        }
+        for queue, concurrency in TASK_QUEUE_CONCURRENCY.items()
+    }
+    for row in counts:
+        queue = queues.setdefault(row["_id"]["queue"], {"ready": 0, "leased": 0, "dead": 0, "oldest_due_seconds": 0.0})
+        queue[row["_id"]["status"]] = row["count"]
+    for row in lag:
+        if row["_id"] in queues:
+            queues[row["_id"]]["oldest_due_seconds"] = round((now - as_utc(row["oldest"])).total_seconds(), 3)
+    for stats in queues.values():
+        finished = stats.get("completed", 0) + stats.get("retried", 0) + stats.get("dead", 0)
+        if finished:
+            stats["avg_wait_seconds"] = round(stats["wait_seconds"] / finished, 3)
+            stats["avg_run_seconds"] = round(stats["run_seconds"] / finished, 3)
+    return {"worker_id": TASK_WORKER_ID, "queues": queues, "generated_at": now}
+
+# ====== LIST / DETAIL PROJECTIONS ======
+# List views only ship what the cards render: a card-sized thumbnail of the
+# first photo, a description excerpt and the single detail the feed shows
+# (weight). Detail views keep the full document.
+
+DESCRIPTION_EXCERPT_LENGTH = 160
+THUMBNAIL_SIZE = 320
+THUMBNAIL_QUALITY = 70
+THUMBNAIL_BACKFILL_BATCH_SIZE = 100
+
+PRODUCT_LIST_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "seller_id": 1,
+    "store_id": 1,
+    "category": 1,
+    "title": 1,
+    "description": {"$substrCP": ["$description", 0, DESCRIPTION_EXCERPT_LENGTH]},
+    "price": 1,
+    "thumbnail": 1,
+    "product_type": 1,
+    "is_veg": 1,
+    "spice_level": 1,
+    "details.weight": 1,
+    "availability_days": 1,
+    "availability_time_slots": 1,
+    "min_quantity": 1,
+    "max_quantity": 1,
+    "qty_per_unit": 1,
+    "is_party_order": 1,
+    "party_packages": 1,
+    "delivery_available": 1,
+    "pickup_available": 1,
+    "active": 1,
+    "created_at": 1,
+}
+PRODUCT_DETAIL_PROJECTION = {"_id": 0}
+
+STORE_LIST_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "user_id": 1,
+    "store_name": 1,
+    "store_photo": 1,
+    "address": 1,
+    "location": 1,
+    "categories": 1,
+    "is_pure_veg": 1,
+    "store_active": 1,
+    "fssai_verified": 1,
+    "rating": 1,
+    "total_reviews": 1,
+    "acceptance_rate": 1,
+}
+STORE_DETAIL_PROJECTION = {"_id": 0}
+
+REVIEW_LIST_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "order_id": 1,
+    "store_id": 1,
+    "buyer_id": 1,
+    "rating": 1,
+    "comment": 1,
+    "thumbnail": 1,
+    "created_at": 1,
+}
+
+def make_thumbnail(photo: Optional[str]) -> Optional[str]:
+    """Card-sized JPEG data URL for an uploaded photo.
+    
+    Photos are stored inline as base64 data URLs straight from the browser;
+    photo URLs are already just references and are kept as they are.
+    """
+    if not photo:
+        return None
+    if not photo.startswith("data:"):
+        return photo
+    try:
+        image = Image.open(io.BytesIO(base64.b64decode(strip_data_url(photo))))
+        image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+    except Exception as e:
+        logger.warning(f"Could not thumbnail photo: {str(e)}")
+        return None
+    thumbnail = "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+    return thumbnail if len(thumbnail) < len(photo) else photo
+
+async def thumbnail_of(photos: List[str]) -> Optional[str]:
+    """Thumbnail of the first photo, encoded off the event loop"""
+    return await asyncio.to_thread(make_thumbnail, photos[0] if photos else None)
+
+async def backfill_thumbnails(batch_size: int = THUMBNAIL_BACKFILL_BATCH_SIZE) -> Dict[str, int]:
+    """Give products and reviews saved before thumbnails existed their card
+    image; documents without photos get an explicit null. Safe to re-run."""
+    filled = {}
+    try:
+        for collection, versioned in ((db.products, True), (db.reviews, False)):
+            filled[collection.name] = 0
+            while True:
+                docs = await collection.find(
+                    {"thumbnail": {"$exists": False}},
+                    {"_id": 1, "photos": {"$slice": 1}}
+                ).sort("_id", 1).limit(batch_size).to_list(batch_size)
+                if not docs:
+                    break
+                first_photos = [(doc.get("photos") or [None])[0] for doc in docs]
+                thumbnails = await asyncio.to_thread(lambda: [make_thumbnail(photo) for photo in first_photos])
+                operations = []
+                for doc, thumbnail in zip(docs, thumbnails):
+                    update = {"$set": {"thumbnail": thumbnail}}
+                    if versioned:
+                        update = revised(update)
+                    # A write that raced ahead already set its own thumbnail
+                    operations.append(UpdateOne({"_id": doc["_id"], "thumbnail": {"$exists": False}}, update))
+                await collection.bulk_write(operations, ordered=False)
+                filled[collection.name] += len(operations)
+    except Exception as e:
+        logger.error(f"Thumbnail backfill failed: {str(e)}")
+    if any(filled.values()):
+        logger.info(f"Thumbnail backfill: {filled}")
+    return filled
+
+def list_projection(base: Dict[str, Any], fields: Optional[str] = None, required: tuple = ("id",)) -> Dict[str, Any]:
+    """Narrow a list projection to the comma-separated `fields` a client asked for.
+
+    Only top-level fields of the base projection may be requested; `required`
+    fields are always kept because the handler itself reads them.
+    """
+    if not fields:
+        return base
+
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    allowed = {key.split(".")[0] for key in base if key != "_id"}
+    unknown = requested - allowed
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unsupported fields: {', '.join(sorted(unknown))}")
+
+    keep = requested | set(required)
+    projection = {"_id": 0}
+    for key, spec in base.items():
+        if key.split(".")[0] in keep:
+            projection[key] = spec
+    return projection
+
+# ====== BATCH LOADING ======
+
+async def load_by_ids(collection, ids, fields: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Resolve many `id` foreign keys with a single $in query, keyed by id"""
+    wanted = list({i for i in ids if i})
+    if not wanted:
+        return {}
+    projection = {"_id": 0, "id": 1, **{field: 1 for field in fields}}
+    docs = await collection.find({"id": {"$in": wanted}}, projection).to_list(len(wanted))
+    return {doc["id"]: doc for doc in docs}
+
+async def count_by(collection, field: str, ids, match: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+    """Count documents per `field` value for many ids with a single grouped aggregation"""
+    wanted = list({i for i in ids if i})
+    if not wanted:
+        return {}
+    pipeline = [
+        {"$match": {**(match or {}), field: {"$in": wanted}}},
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}}
+    ]
+    return {row["_id"]: row["count"] async for row in collection.aggregate(pipeline)}
+
+class DataLoader:
+    """Request-scoped find_one-by-key: every load() issued in the same
+    event-loop tick is answered by one $in query, and each key is fetched at
+    most once per loader. Returned documents are shared between callers, so
+    treat them as read-only."""
+    
+    def __init__(self, collection, key: str = "id", projection: Optional[Dict[str, int]] = None):
+        self.collection = collection
+        self.key = key
+        self.projection = {"_id": 0, **(projection or {})}
+        if any(value for field, value in self.projection.items() if field != "_id"):
+            self.projection[key] = 1
+        self.cache: Dict[Any, asyncio.Future] = {}
+        self.pending: List[Any] = []
+        self.batches: set = set()
+    
+    def load(self, key) -> "asyncio.Future":
+        future = self.cache.get(key)
+        if future is None or future.cancelled():
+            loop = asyncio.get_running_loop()
+            future = self.cache[key] = loop.create_future()
+            if not self.pending:
+                loop.call_soon(self.schedule_dispatch)
+            self.pending.append(key)
+        return future
+    
+    async def load_many(self, keys) -> List[Optional[Dict[str, Any]]]:
+        return await asyncio.gather(*(self.load(key) for key in keys))
+    
+    def schedule_dispatch(self):
+        batch = asyncio.ensure_future(self.dispatch())
+        self.batches.add(batch)
+        batch.add_done_callback(self.batches.discard)
+    
+    async def dispatch(self):
+        keys, self.pending = self.pending, []
+        futures = [self.cache[key] for key in keys]
+        try:
+            docs = await self.collection.find({self.key: {"$in": keys}}, self.projection).to_list(len(keys))
+        except Exception as exc:
+            for key, future in zip(keys, futures):
+                self.cache.pop(key, None)
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        found = {doc[self.key]: doc for doc in docs}
+        for key, future in zip(keys, futures):
+            if not future.done():
+                future.set_result(found.get(key))
+
+class Loaders:
+    """The DataLoaders one request shares; get one through get_loaders()"""
+    
+    def __init__(self):
+        self.users = DataLoader(db.users, projection={field: 0 for field in USER_PRIVATE_FIELDS})
+        self.stores = DataLoader(db.stores)
+        self.products = DataLoader(db.products)
+        self.orders = DataLoader(db.orders)
+
+def get_loaders() -> Loaders:
+    # FastAPI caches dependency results per request, so every Depends(get_loaders)
+    # inside one request resolves to the same Loaders
+    return Loaders()
+
+# ====== CONDITIONAL GET ======
+# Every store and product write goes through revised(), which bumps the
+# document's `version` and `updated_at`. Catalog reads derive a weak ETag from
+# those two fields, so a client repeating a view with If-None-Match gets a
+# bodiless 304 instead of the document.
+
+CATALOG_CACHE_CONTROL = "public, no-cache"
+OWNER_CACHE_CONTROL = "private, no-cache"
+REVIEWS_CACHE_CONTROL = f"public, max-age={int(PUBLIC_READ_CACHE_TTL_SECONDS)}"
+
+def revised(update: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
+    """`update` plus the version bump every store/product write carries"""
+    return {
+        **update,
+        "$set": {**update.get("$set", {}), "updated_at": now or datetime.now(timezone.utc)},
+        "$inc": {**update.get("$inc", {}), "version": 1}
+    }
+
+def weak_etag(*parts) -> str:
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+def document_revision(doc: Dict[str, Any]) -> tuple:
+    # Documents written before versioning fall back to their creation time
+    return (doc.get("id"), doc.get("version", 0), doc.get("updated_at") or doc.get("created_at"))
+
+def document_etag(doc: Dict[str, Any]) -> str:
+    return weak_etag(*document_revision(doc))
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison: W/"x" matches "x"
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+def conditional_response(request: Request, etag: str, cache_control: str, body) -> Response:
+    """304 when the client already holds `etag`; otherwise the body, where
+    `body` is pre-serialized bytes or a zero-argument callable producing them"""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    content = body() if callable(body) else body
+    return Response(content=content, media_type="application/json", headers=headers)
+
+# ====== PUBLIC READ CACHE ======
+# A shared store link sends hundreds of identical anonymous reads at once.
+# cached_public_read() runs one loader per key at a time - concurrent callers
+# await the same in-flight query - and keeps the serialized body for
+# PUBLIC_READ_CACHE_TTL_SECONDS, together with its ETag, so the next wave is
+# answered from memory.
+# Owners' own edits invalidate their key; everything else ages out. An
+# invalidation that lands while a load is running bumps the key's generation,
+# so that load (which may have read the old document) is not cached.
+
+public_read_cache = TTLCache(maxsize=PUBLIC_READ_CACHE_SIZE, ttl=PUBLIC_READ_CACHE_TTL_SECONDS)
+public_reads_inflight: Dict[str, asyncio.Future] = {}
+public_read_generations: Dict[str, int] = {}
+public_read_fetches: Dict[str, int] = {}  # running loads per key, superseded ones included
+public_read_totals: Dict[str, Dict[str, int]] = {}
+public_read_key_stats = LRUCache(maxsize=PUBLIC_READ_CACHE_SIZE)
+PUBLIC_READ_OUTCOMES = ("hits", "coalesced", "misses")
+
+class PublicRead(NamedTuple):
+    body: bytes
+    etag: str
+
+def count_public_read(namespace: str, cache_key: str, outcome: str):
+    CACHE_REQUESTS.labels(f"public_{namespace}", outcome).inc()
+    totals = public_read_totals.setdefault(namespace, dict.fromkeys(PUBLIC_READ_OUTCOMES, 0))
+    totals[outcome] += 1
+    stats = public_read_key_stats.get(cache_key)
+    if stats is None:
+        stats = public_read_key_stats[cache_key] = dict.fromkeys(PUBLIC_READ_OUTCOMES, 0)
+    stats[outcome] += 1
+
+async def cached_public_read(namespace: str, key: str, load, etag_of=None) -> Optional[PublicRead]:
+    """Serialized result of `await load()` for namespace/key, or None when
+    load() finds nothing (misses are coalesced but not cached). The ETag comes
+    from `etag_of(content)`, or hashes the body when no etag_of is given."""
+    cache_key = f"{namespace}:{key}"
+    read = public_read_cache.get(cache_key)
+    if read is not None:
+        count_public_read(namespace, cache_key, "hits")
+        return read
+    
+    flight = public_reads_inflight.get(cache_key)
+    if flight is not None:
+        count_public_read(namespace, cache_key, "coalesced")
+        return await asyncio.shield(flight)
+    count_public_read(namespace, cache_key, "misses")
+    
+    async def fetch() -> Optional[PublicRead]:
+        generation = public_read_generations.get(cache_key, 0)
+        public_read_fetches[cache_key] = public_read_fetches.get(cache_key, 0) + 1
+        try:
+            content = await load()
+            if content is None:
+                return None
+            body = orjson.dumps(content, default=orjson_default, option=orjson.OPT_NON_STR_KEYS)
+            etag = etag_of(content) if etag_of else weak_etag(hashlib.blake2b(body, digest_size=12).hexdigest())
+            read = PublicRead(body, etag)
+            if public_read_generations.get(cache_key, 0) == generation:
+                public_read_cache[cache_key] = read
+            return read
+        finally:
+            public_read_fetches[cache_key] -= 1
+            if not public_read_fetches[cache_key]:
+                del public_read_fetches[cache_key]
+                public_read_generations.pop(cache_key, None)
+    
+    def landed(done: asyncio.Future):
+        if public_reads_inflight.get(cache_key) is done:
+            del public_reads_inflight[cache_key]
+        if not done.cancelled():
+            done.exception()  # retrieved even when every caller has gone away
+    
+    # shield: a client disconnecting must not cancel the query other callers await
+    flight = public_reads_inflight[cache_key] = asyncio.ensure_future(fetch())
+    flight.add_done_callback(landed)
+    return await asyncio.shield(flight)
+
+def invalidate_public_read(namespace: str, key: str):
+    cache_key = f"{namespace}:{key}"
+    public_read_cache.pop(cache_key, None)
+    if cache_key in public_read_fetches:
+        # Later callers start a fresh load instead of joining the stale one
+        public_read_generations[cache_key] = public_read_generations.get(cache_key, 0) + 1
+        public_reads_inflight.pop(cache_key, None)
+
+def public_read_metrics(top: int = 20) -> Dict[str, Any]:
+    keys = sorted(public_read_key_stats.items(), key=lambda item: item[1]["hits"] + item[1]["coalesced"], reverse=True)
+    return {
+        "ttl_seconds": PUBLIC_READ_CACHE_TTL_SECONDS,
+        "entries": len(public_read_cache),
+        "inflight": len(public_reads_inflight),
+        "namespaces": public_read_totals,
+        "top_keys": [{"key": key, **stats} for key, stats in keys[:top]]
+    }
+
+# ====== CURSOR PAGINATION ======
+# Cursors are opaque url-safe tokens holding the sort key of the last row
+# returned; the next page starts strictly after it, so deep pages cost the
+# same as the first one.
+
+def _cursor_default(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+def _cursor_object_hook(obj):
+    if set(obj) == {"$date"}:
+        return datetime.fromisoformat(obj["$date"])
+    return obj
+
+def encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values), default=_cursor_default).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')), object_hook=_cursor_object_hook)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def keyset_after(field: str, value: Any, last_id: str, direction: int = -1) -> Dict[str, Any]:
+    """Filter for rows strictly after (value, last_id) in a (field, id) sort"""
+    op = "$lt" if direction < 0 else "$gt"
+    return {"$or": [
+        {field: {op: value}},
+        {field: value, "id": {op: last_id}}
+    ]}
+
+@task_handler("send_phone_otp", queue="otp", max_attempts=3, timeout_seconds=30, retry_base_seconds=5)
+async def send_phone_otp(payload: Dict[str, Any], task: Dict[str, Any]):
+    # The Twilio client is blocking; keep it off the event loop
+    await asyncio.to_thread(
+        lambda: twilio_client.verify.services(TWILIO_VERIFY_SERVICE).verifications.create(to=payload["phone"], channel="sms")
+    )
+
 @api_router.post("/auth/send-otp")
 async def send_otp(req: OTPRequest):
     if not twilio_client or not TWILIO_VERIFY_SERVICE or TWILIO_VERIFY_SERVICE.startswith('your_'):
         return {"success": True, "message": "OTP sent (mocked)"}
-    try:
-        verification = twilio_client.verify.services(TWILIO_VERIFY_SERVICE).verifications.create(to=req.phone, channel="sms")
-        return {"success": True, "status": verification.status}
-    except Exception as e:
-        logger.error(f"Twilio error: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Failed to send OTP: {str(e)}")
+    await enqueue_task("send_phone_otp", {"phone": req.phone}, dedupe_key=f"send_phone_otp:{req.phone}")
+    return {"success": True, "status": "pending"}
 
 @api_router.post("/auth/verify-otp")
 async def verify_otp(req: OTPVerify):
-    def serialize_user(user_dict):
-        """Helper to serialize datetime fields to ISO format"""
-        if user_dict.get('created_at') and isinstance(user_dict['created_at'], datetime):
-            user_dict['created_at'] = user_dict['created_at'].isoformat()
-        if user_dict.get('subscription_started_at') and isinstance(user_dict['subscription_started_at'], datetime):
-            user_dict['subscription_started_at'] = user_dict['subscription_started_at'].isoformat()
-        if user_dict.get('subscription_expires_at') and isinstance(user_dict['subscription_expires_at'], datetime):
-            user_dict['subscription_expires_at'] = user_dict['subscription_expires_at'].isoformat()
-        return user_dict
-    
     if not twilio_client or not TWILIO_VERIFY_SERVICE or TWILIO_VERIFY_SERVICE.startswith('your_'):
         if req.code == "123456":
             user_doc = await db.users.find_one({"phone": req.phone}, {"_id": 0})
             if not user_doc:
                 user = User(phone=req.phone, name=f"User {req.phone[-4:]}", auth_method="phone")
-                user_dict = user.model_dump()
-                user_dict = serialize_user(user_dict)
-                await db.users.insert_one(user_dict)
-                user_doc = user_dict
+                await db.users.insert_one(to_document(user))
+                user_doc = public_user(user.model_dump())
             else:
-                user_doc = serialize_user(user_doc)
+                user_doc = public_user(user_doc)
             token = create_access_token({"sub": user_doc["id"]})
             return {"success": True, "token": token, "user": user_doc}
         raise HTTPException(status_code=400, detail="Invalid OTP")
@@ -398,12 +1351,10 @@ async def verify_otp(req: OTPVerify):
             user_doc = await db.users.find_one({"phone": req.phone}, {"_id": 0})
             if not user_doc:
                 user = User(phone=req.phone, name=f"User {req.phone[-4:]}", auth_method="phone")
-                user_dict = user.model_dump()
-                user_dict = serialize_user(user_dict)
-                await db.users.insert_one(user_dict)
-                user_doc = user_dict
+                await db.users.insert_one(to_document(user))
+                user_doc = public_user(user.model_dump())
             else:
-                user_doc = serialize_user(user_doc)
+                user_doc = public_user(user_doc)
             token = create_access_token({"sub": user_doc["id"]})
             return {"success": True, "token": token, "user": user_doc}
         raise HTTPException(status_code=400, detail="Invalid OTP")
@@ -447,17 +1398,13 @@ async def google_auth(req: GoogleAuthRequest):
                     profile_picture=data.get("picture"), 
                     auth_method="google"
                 )
-                user_dict = user.model_dump()
-                user_dict['created_at'] = user_dict['created_at'].isoformat()
-                if user_dict.get('subscription_expires_at'):
-                    user_dict['subscription_expires_at'] = user_dict['subscription_expires_at'].isoformat()
-                await db.users.insert_one(user_dict)
-                user_doc = user_dict
+                await db.users.insert_one(to_document(user))
+                user_doc = public_user(user.model_dump())
                 logger.info(f"Created new user: {user_doc['id']}")
             
             token = create_access_token({"sub": user_doc["id"]})
             logger.info(f"Login successful for user: {user_doc['id']}")
-            return {"success": True, "token": token, "user": user_doc}
+            return {"success": True, "token": token, "user": public_user(user_doc)}
         except HTTPException:
             raise
         except Exception as e:
@@ -534,12 +1481,8 @@ async def google_callback(code: str):
                 profile_picture=user_data.get("picture"),
                 auth_method="google"
             )
-            user_dict = user.model_dump()
-            user_dict['created_at'] = user_dict['created_at'].isoformat()
-            if user_dict.get('subscription_expires_at'):
-                user_dict['subscription_expires_at'] = user_dict['subscription_expires_at'].isoformat()
-            await db.users.insert_one(user_dict)
-            user_doc = user_dict
+            await db.users.insert_one(to_document(user))
+            user_doc = public_user(user.model_dump())
         
         # Create JWT token
         token = create_access_token({"sub": user_doc["id"]})
@@ -566,14 +1509,10 @@ async def facebook_auth(access_token: str):
             user_doc = await db.users.find_one({"email": email}, {"_id": 0})
             if not user_doc:
                 user = User(email=email, name=data["name"], profile_picture=data.get("picture", {}).get("data", {}).get("url"), auth_method="facebook")
-                user_dict = user.model_dump()
-                user_dict['created_at'] = user_dict['created_at'].isoformat()
-                if user_dict.get('subscription_expires_at'):
-                    user_dict['subscription_expires_at'] = user_dict['subscription_expires_at'].isoformat()
-                await db.users.insert_one(user_dict)
-                user_doc = user_dict
+                await db.users.insert_one(to_document(user))
+                user_doc = user.model_dump()
             token = create_access_token({"sub": user_doc["id"]})
-            return {"success": True, "token": token, "user": user_doc}
+            return {"success": True, "token": token, "user": public_user(user_doc)}
         except HTTPException:
             raise
         except Exception as e:
@@ -581,11 +1520,11 @@ async def facebook_auth(access_token: str):
             raise HTTPException(status_code=400, detail="Facebook authentication failed")
 
 @api_router.get("/auth/me")
-async def get_me(current_user: User = Depends(get_current_user)):
-    return current_user
+async def get_me(current_user: Principal = Depends(get_current_user)):
+    return await load_user_profile(current_user)
 
 @api_router.put("/auth/profile")
-async def update_profile(profile_data: Dict[str, Any], current_user: User = Depends(get_current_user)):
+async def update_profile(profile_data: Dict[str, Any], current_user: Principal = Depends(get_current_user)):
     """Update user profile including location"""
     allowed_fields = ["location", "name", "profile_picture", "delivery_available", "pickup_available"]
     update_data = {k: v for k, v in profile_data.items() if k in allowed_fields}
@@ -596,8 +1535,7 @@ async def update_profile(profile_data: Dict[str, Any], current_user: User = Depe
     await db.users.update_one({"id": current_user.id}, {"$set": update_data})
     
     # Fetch and return updated user
-    updated_user = await db.users.find_one({"id": current_user.id}, {"_id": 0})
-    return updated_user
+    return await load_user_profile(current_user)
 
 # ====== EMAIL/PASSWORD AUTHENTICATION ======
 
@@ -636,8 +1574,7 @@ async def email_signup(req: EmailSignupRequest):
         name=req.name,
         auth_method="email"
     )
-    user_dict = user.model_dump()
-    user_dict = serialize_user_data(user_dict)
+    user_dict = to_document(user)
     
     # Insert into database (this may modify user_dict by adding _id)
     await db.users.insert_one(user_dict)
@@ -647,16 +1584,11 @@ async def email_signup(req: EmailSignupRequest):
     if not user_doc:
         raise HTTPException(status_code=500, detail="Failed to create user")
     
-    # Serialize again in case DB returned datetime objects
-    user_doc = serialize_user_data(user_doc)
-    
     # Create JWT token
     token = create_access_token({"sub": user_doc["id"]})
     
     # Remove sensitive data
-    user_doc.pop('password_hash', None)
-    user_doc.pop('reset_otp', None)
-    user_doc.pop('reset_otp_expires', None)
+    user_doc = public_user(user_doc)
     
     return {"success": True, "token": token, "user": user_doc}
 
@@ -681,19 +1613,47 @@ async def email_login(req: EmailLoginRequest):
     if not password_match:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    # Serialize user data
-    user_doc = serialize_user_data(user_doc)
-    
     # Create JWT token
     token = create_access_token({"sub": user_doc["id"]})
     
     # Remove sensitive data
-    user_doc.pop('password_hash', None)
-    user_doc.pop('reset_otp', None)
-    user_doc.pop('reset_otp_expires', None)
+    user_doc = public_user(user_doc)
     
     return {"success": True, "token": token, "user": user_doc}
 
+def deliver_email(to: str, subject: str, body: str):
+    message = EmailMessage()
+    message["From"] = SMTP_FROM
+    message["To"] = to
+    message["Subject"] = subject
+    message.set_content(body)
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=20) as smtp:
+        smtp.starttls()
+        if SMTP_USERNAME:
+            smtp.login(SMTP_USERNAME, SMTP_PASSWORD)
+        smtp.send_message(message)
+
+async def send_email(to: str, subject: str, body: str):
+    if not SMTP_HOST:
+        logger.info(f"Email to {to} (SMTP not configured - mock mode): {subject}\n{body}")
+        return
+    await asyncio.to_thread(deliver_email, to, subject, body)
+
+@task_handler("send_password_reset_email", queue="email", max_attempts=5, timeout_seconds=60, retry_base_seconds=15)
+async def send_password_reset_email(payload: Dict[str, Any], task: Dict[str, Any]):
+    user_doc = await db.users.find_one({"email": payload["email"]}, {"_id": 0, "reset_otp": 1, "reset_otp_expires": 1})
+    if not user_doc or not user_doc.get("reset_otp"):
+        return
+    expires_at = to_datetime(user_doc.get("reset_otp_expires"))
+    if expires_at and expires_at < datetime.now(timezone.utc):
+        return  # superseded or used up while queued
+    await send_email(
+        payload["email"],
+        "Your Foodambo password reset code",
+        f"Your password reset code is {user_doc['reset_otp']}. It is valid for 10 minutes.\n\n"
+        "If you did not ask to reset your password, you can ignore this email."
+    )
+
 @api_router.post("/auth/forgot-password")
 async def forgot_password(req: ForgotPasswordRequest):
     """Send OTP for password reset"""
@@ -723,16 +1683,10 @@ async def forgot_password(req: ForgotPasswordRequest):
         }}
     )
     
-    # In production, send OTP via email
-    # For now, log it (mock email service)
-    logger.info(f"Password Reset OTP for {req.email}: {otp}")
-    print(f"\n{'='*50}")
-    print(f"PASSWORD RESET OTP: {otp}")
-    print(f"Email: {req.email}")
-    print(f"Valid for 10 minutes")
-    print(f"{'='*50}\n")
+    # The OTP is read back from the user at send time, so it never sits in the task payload
+    await enqueue_task("send_password_reset_email", {"email": req.email}, dedupe_key=f"password_reset:{req.email}")
     
-    return {"success": True, "message": "OTP sent to your email (check console for demo)"}
+    return {"success": True, "message": "An OTP is on its way to your email"}
 
 @api_router.post("/auth/reset-password")
 async def reset_password(req: ResetPasswordRequest):
@@ -747,12 +1701,7 @@ async def reset_password(req: ResetPasswordRequest):
         raise HTTPException(status_code=400, detail="No password reset requested. Please request a new OTP.")
     
     # Check if OTP is expired
-    reset_otp_expires = user_doc['reset_otp_expires']
-    if isinstance(reset_otp_expires, str):
-        reset_otp_expires = datetime.fromisoformat(reset_otp_expires.replace('Z', '+00:00'))
-    elif isinstance(reset_otp_expires, datetime) and reset_otp_expires.tzinfo is None:
-        # Handle naive datetime from MongoDB - assume UTC
-        reset_otp_expires = reset_otp_expires.replace(tzinfo=timezone.utc)
+    reset_otp_expires = to_datetime(user_doc['reset_otp_expires'])
     
     if datetime.now(timezone.utc) > reset_otp_expires:
         raise HTTPException(status_code=400, detail="OTP expired. Please request a new one.")
@@ -781,7 +1730,7 @@ async def reset_password(req: ResetPasswordRequest):
 # ====== STORE MANAGEMENT ======
 
 @api_router.post("/stores")
-async def create_store(store_data: StoreCreate, current_user: User = Depends(get_current_user)):
+async def create_store(store_data: StoreCreate, current_user: Principal = Depends(get_current_user)):
     existing_store = await db.stores.find_one({"user_id": current_user.id}, {"_id": 0})
     if existing_store:
         raise HTTPException(status_code=400, detail="Store already exists")
@@ -793,30 +1742,68 @@ async def create_store(store_data: StoreCreate, current_user: User = Depends(get
         location={"latitude": store_data.latitude, "longitude": store_data.longitude},
         categories=store_data.categories
     )
-    store_dict = store.model_dump()
-    store_dict['created_at'] = store_dict['created_at'].isoformat()
-    await db.stores.insert_one(store_dict)
+    await db.stores.insert_one(to_document(store))
     
     await db.users.update_one({"id": current_user.id}, {"$set": {"is_seller": True}})
     
     return store
 
 @api_router.get("/stores/me")
-async def get_my_store(current_user: User = Depends(get_current_user)):
+async def get_my_store(current_user: Principal = Depends(get_current_user)):
     store = await db.stores.find_one({"user_id": current_user.id}, {"_id": 0})
     if not store:
         raise HTTPException(status_code=404, detail="Store not found")
     return store
 
+@api_router.get("/stores/search")
+async def search_stores(
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    search: Optional[str] = None,
+    radius_km: float = 2.0,
+    fields: Optional[str] = None
+):
+    query = {"store_active": True}
+    
+    if search:
+        query["store_name"] = {"$regex": search, "$options": "i"}
+    
+    projection = list_projection(STORE_LIST_PROJECTION, fields, required=("id", "location"))
+    stores = await db.stores.find(query, projection).to_list(1000)
+    
+    if latitude and longitude:
+        stores_with_distance = []
+        for store in stores:
+            if store.get("location"):
+                distance = calculate_distance(
+                    latitude, longitude,
+                    store["location"]["latitude"],
+                    store["location"]["longitude"]
+                )
+                if distance <= radius_km:
+                    store["distance"] = round(distance, 2)
+                    stores_with_distance.append(store)
+        stores = sorted(stores_with_distance, key=lambda x: x["distance"])
+        
+        product_counts = await count_by(db.products, "store_id", (s["id"] for s in stores), {"active": True})
+        for store in stores:
+            store["product_count"] = product_counts.get(store["id"], 0)
+    
+    return FastJSONResponse(stores)
+
 @api_router.get("/stores/{store_id}")
-async def get_store(store_id: str):
-    store = await db.stores.find_one({"id": store_id}, {"_id": 0})
-    if not store:
+async def get_store(store_id: str, request: Request):
+    read = await cached_public_read(
+        "store", store_id,
+        lambda: db.stores.find_one({"id": store_id}, STORE_DETAIL_PROJECTION),
+        etag_of=document_etag
+    )
+    if read is None:
         raise HTTPException(status_code=404, detail="Store not found")
-    return store
+    return conditional_response(request, read.etag, CATALOG_CACHE_CONTROL, read.body)
 
 @api_router.put("/stores/me")
-async def update_my_store(store_data: Dict[str, Any], current_user: User = Depends(get_current_user)):
+async def update_my_store(store_data: Dict[str, Any], current_user: Principal = Depends(get_current_user)):
     store = await db.stores.find_one({"user_id": current_user.id}, {"_id": 0})
     if not store:
         raise HTTPException(status_code=404, detail="Store not found")
@@ -825,78 +1812,203 @@ async def update_my_store(store_data: Dict[str, Any], current_user: User = Depen
     update_data = {k: v for k, v in store_data.items() if k in allowed_fields}
     
     if update_data:
-        await db.stores.update_one({"id": store["id"]}, {"$set": update_data})
+        await db.stores.update_one({"id": store["id"]}, revised({"$set": update_data}))
+        invalidate_public_read("store", store["id"])
     
     return {"success": True}
 
-@api_router.post("/fssai/upload")
-async def upload_fssai(data: FSSAIUpload, current_user: User = Depends(get_current_user)):
+# ====== FSSAI CERTIFICATE JOBS ======
+# Certificate extraction runs off the request path. The upload records the
+# submission, stores a job in fssai_jobs and returns its id; the extraction
+# itself is an "fssai_extract" task on the llm queue, which supplies the
+# timeout, retries and backoff, and the job document mirrors its progress for
+# polling: back to "queued" after an interrupted or failed attempt, "failed"
+# once the task is dead-lettered. The extracted fields land on the store as `fssai_extraction`;
+# verification itself stays with an admin.
+
+FSSAI_JOB_TERMINAL = ("succeeded", "failed")
+FSSAI_JOB_PROJECTION = {"_id": 0, "image_base64": 0}
+FSSAI_EXTRACTION_FIELDS = ("license_number", "business_name", "expiry_date")
+
+def parse_extraction(text: str) -> Dict[str, Any]:
+    """Pull the JSON object out of a model reply, tolerating code fences and chatter"""
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        raise ValueError("No JSON object in extractor response")
+    data = json.loads(text[start:end + 1])
+    return {field: (str(data[field]).strip() if data.get(field) else None) for field in FSSAI_EXTRACTION_FIELDS}
+
+async def llm_fssai_extractor(image_base64: str) -> Dict[str, Any]:
     if not EMERGENT_LLM_KEY:
-        raise HTTPException(status_code=500, detail="FSSAI verification not configured")
-    
-    store = await db.stores.find_one({"user_id": current_user.id}, {"_id": 0})
-    if not store:
-        raise HTTPException(status_code=404, detail="Store not found")
+        raise RuntimeError("FSSAI verification not configured")
+    chat = LlmChat(
+        api_key=EMERGENT_LLM_KEY,
+        session_id=f"fssai_{uuid.uuid4()}",
+        system_message="You are an FSSAI certificate verification assistant. Extract license number, business name, and validity from the certificate image."
+    ).with_model("openai", "gpt-5.1")
+    message = UserMessage(
+        text="Extract FSSAI license number, business name, and expiry date from this certificate. Respond in JSON format: {\"license_number\": \"\", \"business_name\": \"\", \"expiry_date\": \"\"}",
+        file_contents=[ImageContent(image_base64=image_base64)]
+    )
+    return parse_extraction(str(await chat.send_message(message)))
+
+async def fake_fssai_extractor(image_base64: str) -> Dict[str, Any]:
+    """Deterministic stand-in for local runs and tests: same image, same licence"""
+    digest = hashlib.sha256(image_base64.encode("utf-8")).hexdigest()
+    expiry = datetime.now(timezone.utc).date() + timedelta(days=365)
+    return {
+        "license_number": str(int(digest[:16], 16))[:14].rjust(14, "1"),
+        "business_name": "Test Kitchen",
+        "expiry_date": expiry.isoformat()
+    }
+
+FSSAI_EXTRACTORS = {"llm": llm_fssai_extractor, "fake": fake_fssai_extractor}
+
+def fssai_extractor():
+    return FSSAI_EXTRACTORS[FSSAI_EXTRACTOR]
+
+def strip_data_url(image_base64: str) -> str:
+    return image_base64.split(",", 1)[1] if image_base64.startswith("data:") else image_base64
+
+async def enqueue_fssai_job(store: Dict[str, Any], user_id: str, image_base64: str) -> str:
+    now = datetime.now(timezone.utc)
+    job = {
+        "id": str(uuid.uuid4()),
+        "store_id": store["id"],
+        "user_id": user_id,
+        "status": "queued",
+        "attempts": 0,
+        "max_attempts": FSSAI_JOB_MAX_ATTEMPTS,
+        "error": None,
+        "result": None,
+        "image_base64": strip_data_url(image_base64),
+        "created_at": now,
+        "updated_at": now
+    }
+    await db.fssai_jobs.insert_one(job)
+    await db.stores.update_one({"id": store["id"]}, revised({"$set": {"fssai_job_id": job["id"]}}))
+    await enqueue_task("fssai_extract", {"job_id": job["id"]})
+    return job["id"]
+
+async def fail_fssai_job(payload: Dict[str, Any], task: Dict[str, Any], error: str):
+    now = datetime.now(timezone.utc)
+    await db.fssai_jobs.update_one(
+        {"id": payload["job_id"], "status": {"$nin": list(FSSAI_JOB_TERMINAL)}},
+        {"$set": {"status": "failed", "error": error, "finished_at": now, "updated_at": now}, "$unset": {"image_base64": ""}}
+    )
+
+@task_handler(
+    "fssai_extract",
+    queue="llm",
+    max_attempts=FSSAI_JOB_MAX_ATTEMPTS,
+    timeout_seconds=FSSAI_JOB_TIMEOUT_SECONDS + 30,
+    retry_base_seconds=FSSAI_JOB_RETRY_BASE_SECONDS,
+    on_dead=fail_fssai_job
+)
+async def process_fssai_job(payload: Dict[str, Any], task: Dict[str, Any]):
+    """Run one extraction attempt, mirroring the task's progress onto the job"""
+    job_id = payload["job_id"]
+    now = datetime.now(timezone.utc)
+    job = await db.fssai_jobs.find_one_and_update(
+        {"id": job_id, "status": {"$in": ["queued", "processing"]}},
+        {"$set": {"status": "processing", "started_at": now, "updated_at": now}, "$inc": {"attempts": 1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not job:
+        return  # already finished or gone
     
     try:
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"fssai_{store['id']}",
-            system_message="You are an FSSAI certificate verification assistant. Extract license number, business name, and validity from the certificate image."
-        ).with_model("openai", "gpt-5.1")
-        
-        message = UserMessage(
-            text="Extract FSSAI license number, business name, and expiry date from this certificate. Respond in JSON format: {\"license_number\": \"\", \"business_name\": \"\", \"expiry_date\": \"\"}",
-            file_contents=[]
-        )
-        
-        response = await chat.send_message(message)
-        
-        import json
-        verification_data = json.loads(response)
-        
-        await db.stores.update_one(
-            {"id": store["id"]},
-            {"$set": {
-                "fssai_license": verification_data.get("license_number"),
-                "fssai_verified": True
-            }}
+        result = await with_timeout(fssai_extractor()(job["image_base64"]), FSSAI_JOB_TIMEOUT_SECONDS)
+    except BaseException as e:
+        # Cancellation too (task timeout, worker shutdown), or the job would sit in "processing"
+        if isinstance(e, asyncio.TimeoutError):
+            error = "Extraction timed out"
+        elif isinstance(e, asyncio.CancelledError):
+            error = "Extraction interrupted"
+        else:
+            error = str(e) or type(e).__name__
+        await db.fssai_jobs.update_one(
+            {"id": job_id, "status": "processing"},
+            {"$set": {"status": "queued", "error": error, "updated_at": datetime.now(timezone.utc)}}
         )
-        
-        return {"success": True, "verification_data": verification_data}
-    except Exception as e:
-        logger.error(f"FSSAI verification error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Verification failed: {str(e)}")
+        raise
+    
+    now = datetime.now(timezone.utc)
+    extraction = {**result, "job_id": job_id, "extracted_at": now}
+    store_update = {"fssai_extraction": extraction}
+    store = await db.stores.find_one({"id": job["store_id"]}, {"_id": 0, "fssai_number": 1})
+    if store is not None and not store.get("fssai_number") and result.get("license_number"):
+        store_update.update({"fssai_number": result["license_number"], "fssai_license": result["license_number"]})
+    await db.stores.update_one({"id": job["store_id"]}, revised({"$set": store_update}, now))
+    await db.fssai_jobs.update_one(
+        {"id": job_id},
+        {"$set": {"status": "succeeded", "result": result, "error": None, "finished_at": now, "updated_at": now}, "$unset": {"image_base64": ""}}
+    )
+
+async def get_own_fssai_job(job_id: str, user_id: str) -> Dict[str, Any]:
+    job = await db.fssai_jobs.find_one({"id": job_id, "user_id": user_id}, FSSAI_JOB_PROJECTION)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 @api_router.post("/fssai/upload")
-async def upload_fssai_certificate(data: Dict[str, Any], current_user: User = Depends(get_current_user)):
-    """Upload FSSAI certificate number and document"""
-    store = await db.stores.find_one({"user_id": current_user.id}, {"_id": 0})
+async def upload_fssai_certificate(data: FSSAIUpload, current_user: Principal = Depends(get_current_user)):
+    """Record an FSSAI submission; a certificate image is queued for extraction"""
+    store = await db.stores.find_one({"user_id": current_user.id}, {"_id": 0, "id": 1})
     if not store:
         raise HTTPException(status_code=404, detail="Store not found")
     
-    fssai_number = data.get("fssai_number")
-    fssai_certificate_url = data.get("fssai_certificate_url", "")
-    
-    if not fssai_number:
-        raise HTTPException(status_code=400, detail="FSSAI number is required")
+    if not data.fssai_number and not data.image_base64:
+        raise HTTPException(status_code=400, detail="FSSAI number or certificate image is required")
     
     now = datetime.now(timezone.utc)
-    await db.stores.update_one(
-        {"id": store["id"]},
-        {"$set": {
-            "fssai_license": fssai_number,
-            "fssai_number": fssai_number,
-            "fssai_certificate_url": fssai_certificate_url,
-            "fssai_submitted_at": now.isoformat(),
-            "fssai_verified": False
-        }}
-    )
+    update = {
+        "fssai_certificate_url": data.fssai_certificate_url or "",
+        "fssai_submitted_at": now,
+        "fssai_verified": False
+    }
+    if data.fssai_number:
+        update.update({"fssai_license": data.fssai_number, "fssai_number": data.fssai_number})
+    await db.stores.update_one({"id": store["id"]}, revised({"$set": update}))
+    
+    job_id = None
+    if data.image_base64:
+        job_id = await enqueue_fssai_job(store, current_user.id, data.image_base64)
     
-    return {"success": True, "message": "FSSAI certificate uploaded successfully. Verification pending."}
+    return {
+        "success": True,
+        "message": "FSSAI certificate uploaded successfully. Verification pending.",
+        "job_id": job_id
+    }
+
+@api_router.get("/fssai/jobs/{job_id}")
+async def get_fssai_job(job_id: str, current_user: Principal = Depends(get_current_user)):
+    """Poll an extraction job"""
+    return await get_own_fssai_job(job_id, current_user.id)
+
+@api_router.get("/fssai/jobs/{job_id}/events")
+async def stream_fssai_job(job_id: str, current_user: Principal = Depends(get_current_user)):
+    """Server-sent events for an extraction job: one `status` event per change, closing once it finishes"""
+    job = await get_own_fssai_job(job_id, current_user.id)
+    
+    async def events():
+        nonlocal job
+        last = None
+        deadline = asyncio.get_running_loop().time() + FSSAI_JOB_TIMEOUT_SECONDS * (FSSAI_JOB_MAX_ATTEMPTS + 1) + 60
+        while True:
+            state = (job["status"], job["attempts"])
+            if state != last:
+                last = state
+                yield b"event: status\ndata: " + orjson.dumps(job) + b"\n\n"
+            if job["status"] in FSSAI_JOB_TERMINAL or asyncio.get_running_loop().time() > deadline:
+                return
+            await asyncio.sleep(1)
+            job = await db.fssai_jobs.find_one({"id": job_id}, FSSAI_JOB_PROJECTION) or job
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 @api_router.post("/fssai/request-assistance")
-async def request_fssai_assistance(current_user: User = Depends(get_current_user)):
+async def request_fssai_assistance(current_user: Principal = Depends(get_current_user)):
     """Request Foodambo's FSSAI assistance service (₹999)"""
     store = await db.stores.find_one({"user_id": current_user.id}, {"_id": 0})
     if not store:
@@ -904,7 +2016,7 @@ async def request_fssai_assistance(current_user: User = Depends(get_current_user
     
     await db.stores.update_one(
         {"user_id": current_user.id},
-        {"$set": {"fssai_assistance_requested": True}}
+        revised({"$set": {"fssai_assistance_requested": True}})
     )
     
     return {
@@ -914,7 +2026,7 @@ async def request_fssai_assistance(current_user: User = Depends(get_current_user
     }
 
 @api_router.post("/products")
-async def create_product(product_data: ProductCreate, current_user: User = Depends(get_current_user)):
+async def create_product(product_data: ProductCreate, current_user: Principal = Depends(get_current_user)):
     store = await db.stores.find_one({"user_id": current_user.id}, {"_id": 0})
     if not store:
         raise HTTPException(status_code=404, detail="Store not found")
@@ -922,11 +2034,10 @@ async def create_product(product_data: ProductCreate, current_user: User = Depen
     product = Product(
         seller_id=current_user.id,
         store_id=store["id"],
+        thumbnail=await thumbnail_of(product_data.photos),
         **product_data.model_dump()
     )
-    product_dict = product.model_dump()
-    product_dict['created_at'] = product_dict['created_at'].isoformat()
-    await db.products.insert_one(product_dict)
+    await db.products.insert_one(to_document(product))
     
     return product
 
@@ -938,7 +2049,9 @@ async def get_products(
     radius_km: float = 2.0,
     exclude_seller_id: Optional[str] = None,
     search: Optional[str] = None,
-    party_orders_only: Optional[bool] = None
+    party_orders_only: Optional[bool] = None,
+    fields: Optional[str] = None,
+    loaders: Loaders = Depends(get_loaders)
 ):
     query = {"active": True}
     if exclude_seller_id:
@@ -954,12 +2067,13 @@ async def get_products(
             {"description": {"$regex": search, "$options": "i"}}
         ]
     
-    products = await db.products.find(query, {"_id": 0}).to_list(1000)
+    projection = list_projection(PRODUCT_LIST_PROJECTION, fields, required=("id", "store_id", "category"))
+    products = await db.products.find(query, projection).to_list(1000)
     
     if latitude and longitude:
         products_with_distance = []
-        for product in products:
-            store = await db.stores.find_one({"id": product["store_id"]}, {"_id": 0})
+        stores = await loaders.stores.load_many(product["store_id"] for product in products)
+        for product, store in zip(products, stores):
             if store and store.get("location") and store.get("store_active", True):
                 distance = calculate_distance(
                     latitude, longitude,
@@ -977,51 +2091,25 @@ async def get_products(
         cat_list = categories.split(",")
         products = [p for p in products if p["category"] in cat_list]
     
-    return products
-
-@api_router.get("/stores/search")
-async def search_stores(
-    latitude: Optional[float] = None,
-    longitude: Optional[float] = None,
-    search: Optional[str] = None,
-    radius_km: float = 2.0
-):
-    query = {"store_active": True}
-    
-    if search:
-        query["store_name"] = {"$regex": search, "$options": "i"}
-    
-    stores = await db.stores.find(query, {"_id": 0}).to_list(1000)
-    
-    if latitude and longitude:
-        stores_with_distance = []
-        for store in stores:
-            if store.get("location"):
-                distance = calculate_distance(
-                    latitude, longitude,
-                    store["location"]["latitude"],
-                    store["location"]["longitude"]
-                )
-                if distance <= radius_km:
-                    store["distance"] = round(distance, 2)
-                    # Count active products
-                    product_count = await db.products.count_documents({
-                        "store_id": store["id"],
-                        "active": True
-                    })
-                    store["product_count"] = product_count
-                    stores_with_distance.append(store)
-        stores = sorted(stores_with_distance, key=lambda x: x["distance"])
-    
-    return stores
+    return FastJSONResponse(products)
 
 @api_router.get("/products/my")
-async def get_my_products(current_user: User = Depends(get_current_user)):
-    products = await db.products.find({"seller_id": current_user.id}, {"_id": 0}).to_list(1000)
-    return products
+async def get_my_products(request: Request, fields: Optional[str] = None, current_user: Principal = Depends(get_current_user)):
+    projection = list_projection(PRODUCT_LIST_PROJECTION, fields)
+    query = {"seller_id": current_user.id}
+    # Revisions alone decide the ETag; the listing is only read when it changed
+    revisions = await db.products.find(query, {"_id": 0, "id": 1, "version": 1, "updated_at": 1, "created_at": 1}).to_list(1000)
+    etag = weak_etag(fields, *(document_revision(doc) for doc in revisions))
+    if etag_matches(request, etag):
+        return conditional_response(request, etag, OWNER_CACHE_CONTROL, b"")
+    products = await db.products.find(query, projection).to_list(1000)
+    return conditional_response(
+        request, etag, OWNER_CACHE_CONTROL,
+        orjson.dumps(products, default=orjson_default, option=orjson.OPT_NON_STR_KEYS)
+    )
 
 @api_router.post("/orders/{order_id}/cancel")
-async def cancel_order(order_id: str, current_user: User = Depends(get_current_user)):
+async def cancel_order(order_id: str, current_user: Principal = Depends(get_current_user)):
     order = await db.orders.find_one({"id": order_id}, {"_id": 0})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -1037,14 +2125,27 @@ async def cancel_order(order_id: str, current_user: User = Depends(get_current_u
     if order["status"] == "accepted":
         cancellation_charge = 50.0
     
-    await db.orders.update_one(
-        {"id": order_id},
+    now = datetime.now(timezone.utc)
+    result = await db.orders.update_one(
+        {"id": order_id, "status": order["status"]},
         {"$set": {
             "status": "cancelled",
-            "cancelled_at": datetime.now(timezone.utc).isoformat(),
-            "cancellation_charge": cancellation_charge
+            "cancelled_at": now,
+            "cancellation_charge": cancellation_charge,
+            "updated_at": now
         }}
     )
+    if not result.modified_count:
+        raise HTTPException(status_code=409, detail="Order status changed, please retry")
+    
+    if cancellation_charge:
+        await record_transaction(
+            current_user.id,
+            "debit",
+            cancellation_charge,
+            f"Cancellation charge for order {order_id[:8]}",
+            reference=f"cancellation:{order_id}"
+        )
     
     return {"success": True, "cancellation_charge": cancellation_charge}
 
@@ -1052,33 +2153,46 @@ async def cancel_order(order_id: str, current_user: User = Depends(get_current_u
     return products
 
 @api_router.get("/products/{product_id}")
-async def get_product(product_id: str):
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
-    if not product:
+async def get_product(product_id: str, request: Request):
+    read = await cached_public_read(
+        "product", product_id,
+        lambda: db.products.find_one({"id": product_id}, PRODUCT_DETAIL_PROJECTION),
+        etag_of=document_etag
+    )
+    if read is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    return conditional_response(request, read.etag, CATALOG_CACHE_CONTROL, read.body)
 
 @api_router.put("/products/{product_id}")
-async def update_product(product_id: str, product_data: ProductCreate, current_user: User = Depends(get_current_user)):
+async def update_product(product_id: str, product_data: ProductCreate, current_user: Principal = Depends(get_current_user)):
     product = await db.products.find_one({"id": product_id, "seller_id": current_user.id}, {"_id": 0})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    await db.products.update_one({"id": product_id}, {"$set": product_data.model_dump()})
+    update = product_data.model_dump()
+    if update["photos"][:1] != product.get("photos", [])[:1] or "thumbnail" not in product:
+        update["thumbnail"] = await thumbnail_of(update["photos"])
+    await db.products.update_one({"id": product_id}, revised({"$set": update}))
+    invalidate_public_read("product", product_id)
     return {"success": True}
 
 @api_router.delete("/products/{product_id}")
-async def delete_product(product_id: str, current_user: User = Depends(get_current_user)):
+async def delete_product(product_id: str, current_user: Principal = Depends(get_current_user)):
     product = await db.products.find_one({"id": product_id, "seller_id": current_user.id}, {"_id": 0})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    await db.products.update_one({"id": product_id}, {"$set": {"active": False}})
+    await db.products.update_one({"id": product_id}, revised({"$set": {"active": False}}))
+    invalidate_public_read("product", product_id)
     return {"success": True}
 
 @api_router.post("/orders")
-async def create_order(order_data: OrderCreate, current_user: User = Depends(get_current_user)):
-    product = await db.products.find_one({"id": order_data.product_id}, {"_id": 0})
+async def create_order(
+    order_data: OrderCreate,
+    current_user: Principal = Depends(get_current_user),
+    loaders: Loaders = Depends(get_loaders)
+):
+    product = await loaders.products.load(order_data.product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
@@ -1123,58 +2237,53 @@ async def create_order(order_data: OrderCreate, current_user: User = Depends(get
         party_package=order_data.party_package,
         expires_at=expires_at
     )
-    order_dict = order.model_dump()
-    order_dict['created_at'] = order_dict['created_at'].isoformat()
-    if order_dict.get('accepted_at'):
-        order_dict['accepted_at'] = order_dict['accepted_at'].isoformat()
-    if order_dict.get('completed_at'):
-        order_dict['completed_at'] = order_dict['completed_at'].isoformat()
-    if order_dict.get('expires_at'):
-        order_dict['expires_at'] = order_dict['expires_at'].isoformat()
-    if order_dict.get('cancelled_at'):
-        order_dict['cancelled_at'] = order_dict['cancelled_at'].isoformat()
-    await db.orders.insert_one(order_dict)
+    await db.orders.insert_one(to_document(order))
     
     return order
 
-@api_router.get("/orders/my")
-async def get_my_orders(current_user: User = Depends(get_current_user)):
-    orders = await db.orders.find({"buyer_id": current_user.id}, {"_id": 0}).to_list(1000)
-    
-    # Auto-expire pending orders
+# Pending orders past expires_at are flipped to "expired" by the expire_orders
+# sweep. Listings show the right status straight away and nudge the sweep
+# instead of writing each order inline.
+
+async def mark_expired_orders(orders: List[Dict[str, Any]]):
     now = datetime.now(timezone.utc)
+    stale = False
     for order in orders:
-        if order["status"] == "pending" and order.get("expires_at"):
-            expires_at = datetime.fromisoformat(order["expires_at"].replace('Z', '+00:00'))
-            if now > expires_at:
-                await db.orders.update_one(
-                    {"id": order["id"]},
-                    {"$set": {"status": "expired"}}
-                )
-                order["status"] = "expired"
+        if order["status"] == "pending" and order.get("expires_at") and now > to_datetime(order["expires_at"]):
+            order["status"] = "expired"
+            stale = True
+    if stale:
+        await enqueue_task("expire_orders", dedupe_key="expire_orders")
+
+@task_handler("expire_orders", queue="maintenance", max_attempts=3)
+async def expire_orders(payload: Dict[str, Any], task: Dict[str, Any]):
+    now = datetime.now(timezone.utc)
+    result = await db.orders.update_many(
+        {"status": "pending", "expires_at": {"$lt": now}},
+        {"$set": {"status": "expired", "updated_at": now}}
+    )
+    if result.modified_count:
+        logger.info(f"Expired {result.modified_count} pending orders")
+
+async def schedule_order_expiry():
+    await enqueue_task("expire_orders", dedupe_key="expire_orders")
+
+@api_router.get("/orders/my")
+async def get_my_orders(current_user: Principal = Depends(get_current_user)):
+    orders = await db.orders.find({"buyer_id": current_user.id}, {"_id": 0}).to_list(1000)
     
-    return orders
+    await mark_expired_orders(orders)
+    return FastJSONResponse(orders)
 
 @api_router.get("/orders/seller")
-async def get_seller_orders(current_user: User = Depends(get_current_user)):
+async def get_seller_orders(current_user: Principal = Depends(get_current_user)):
     orders = await db.orders.find({"seller_id": current_user.id}, {"_id": 0}).to_list(1000)
     
-    # Auto-expire pending orders
-    now = datetime.now(timezone.utc)
-    for order in orders:
-        if order["status"] == "pending" and order.get("expires_at"):
-            expires_at = datetime.fromisoformat(order["expires_at"].replace('Z', '+00:00'))
-            if now > expires_at:
-                await db.orders.update_one(
-                    {"id": order["id"]},
-                    {"$set": {"status": "expired"}}
-                )
-                order["status"] = "expired"
-    
-    return orders
+    await mark_expired_orders(orders)
+    return FastJSONResponse(orders)
 
 @api_router.put("/orders/{order_id}/status")
-async def update_order_status(order_id: str, status: str, current_user: User = Depends(get_current_user)):
+async def update_order_status(order_id: str, status: str, current_user: Principal = Depends(get_current_user)):
     order = await db.orders.find_one({"id": order_id}, {"_id": 0})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -1183,18 +2292,18 @@ async def update_order_status(order_id: str, status: str, current_user: User = D
         raise HTTPException(status_code=403, detail="Not authorized")
     
     now = datetime.now(timezone.utc)
-    update_data = {"status": status}
+    update_data = {"status": status, "updated_at": now}
     if status == "accepted":
-        update_data["accepted_at"] = now.isoformat()
+        update_data["accepted_at"] = now
     elif status == "completed":
-        update_data["completed_at"] = now.isoformat()
-        update_data["delivered_at"] = now.isoformat()  # Track delivery time for chat expiry
+        update_data["completed_at"] = now
+        update_data["delivered_at"] = now  # Track delivery time for chat expiry
     
     await db.orders.update_one({"id": order_id}, {"$set": update_data})
     return {"success": True}
 
 @api_router.post("/chat/messages")
-async def send_message(msg_data: ChatMessageCreate, current_user: User = Depends(get_current_user)):
+async def send_message(msg_data: ChatMessageCreate, current_user: Principal = Depends(get_current_user)):
     message = ChatMessage(
         order_id=msg_data.order_id,
         sender_id=current_user.id,
@@ -1202,13 +2311,11 @@ async def send_message(msg_data: ChatMessageCreate, current_user: User = Depends
         message=msg_data.message,
         photo=msg_data.photo
     )
-    msg_dict = message.model_dump()
-    msg_dict['timestamp'] = msg_dict['timestamp'].isoformat()
-    await db.chat_messages.insert_one(msg_dict)
+    await db.chat_messages.insert_one(to_document(message))
     return message
 
 @api_router.get("/chat/messages/{order_id}")
-async def get_messages(order_id: str, current_user: User = Depends(get_current_user)):
+async def get_messages(order_id: str, current_user: Principal = Depends(get_current_user)):
     # Check if chat is still active (within 4 hours of delivery)
     order = await db.orders.find_one({"id": order_id}, {"_id": 0})
     if not order:
@@ -1220,67 +2327,296 @@ async def get_messages(order_id: str, current_user: User = Depends(get_current_u
     
     chat_expired = False
     if order.get("delivered_at"):
-        delivered_at = datetime.fromisoformat(order["delivered_at"]) if isinstance(order["delivered_at"], str) else order["delivered_at"]
+        delivered_at = to_datetime(order["delivered_at"])
         hours_since_delivery = (datetime.now(timezone.utc) - delivered_at).total_seconds() / 3600
         if hours_since_delivery > 4:
             chat_expired = True
     
     messages = await db.chat_messages.find({"order_id": order_id}, {"_id": 0}).sort("timestamp", 1).to_list(1000)
-    return {
+    return FastJSONResponse({
         "messages": messages,
         "chat_expired": chat_expired,
         "order_status": order["status"]
-    }
+    })
+
+# ====== AI DESCRIPTIONS ======
+# Generated descriptions are cached on the normalized prompt: an in-memory LRU
+# in front of the description_cache collection, which Mongo expires after
+# DESCRIPTION_CACHE_TTL_DAYS. LLM calls share one semaphore so a batch cannot
+# flood the provider, and each call is bounded by DESCRIPTION_TIMEOUT_SECONDS.
+
+DESCRIPTION_MODEL = ("openai", "gpt-5-mini")
+DESCRIPTION_BATCH_MAX = 25
+DESCRIPTION_SYSTEM_MESSAGE = "You are a food description expert specializing in Indian homemade cuisine. Create authentic, mouth-watering descriptions that highlight the traditional aspects and authentic flavors."
+
+description_cache = TTLCache(maxsize=DESCRIPTION_CACHE_SIZE, ttl=DESCRIPTION_CACHE_TTL_DAYS * 86400)
+description_semaphore = asyncio.Semaphore(DESCRIPTION_CONCURRENCY)
+
+class DescriptionRequest(BaseModel):
+    title: str = ""
+    category: str = ""
+    is_veg: bool = True
+    spice_level: Optional[str] = ""
+
+    def normalized(self) -> Dict[str, Any]:
+        return {
+            "title": " ".join(self.title.split()),
+            "category": self.category.strip().lower(),
+            "is_veg": self.is_veg,
+            "spice_level": (self.spice_level or "").strip().lower()
+        }
+
+class DescriptionBatchRequest(BaseModel):
+    items: List[DescriptionRequest]
+
+def description_cache_key(prompt_fields: Dict[str, Any]) -> str:
+    """Stable key for a normalized prompt; titles compare case-insensitively"""
+    key_fields = {**prompt_fields, "title": prompt_fields["title"].casefold(), "model": "/".join(DESCRIPTION_MODEL)}
+    return hashlib.sha256(json.dumps(key_fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+def description_prompt(prompt_fields: Dict[str, Any]) -> str:
+    veg_text = "vegetarian" if prompt_fields["is_veg"] else "non-vegetarian"
+    spice_text = f", {prompt_fields['spice_level']} spice level" if prompt_fields["spice_level"] else ""
+    return f"Write a 2-3 sentence authentic description for '{prompt_fields['title']}', a {veg_text} {prompt_fields['category']} dish{spice_text}. Focus on traditional preparation, authentic flavors, and what makes it special. Keep it appetizing and concise."
+
+async def cached_description(key: str) -> Optional[str]:
+    description = description_cache.get(key)
+    if description is None:
+        doc = await db.description_cache.find_one({"key": key}, {"_id": 0, "description": 1})
+        if doc:
+            description = description_cache[key] = doc["description"]
+    CACHE_REQUESTS.labels("description", "misses" if description is None else "hits").inc()
+    return description
+
+async def describe_product(item: DescriptionRequest, user_id: str) -> Dict[str, Any]:
+    """Return {"description", "cached"} for one listing, calling the LLM only on a cache miss"""
+    prompt_fields = item.normalized()
+    key = description_cache_key(prompt_fields)
+    description = await cached_description(key)
+    if description is not None:
+        return {"description": description, "cached": True}
+    
+    chat = LlmChat(
+        api_key=EMERGENT_LLM_KEY,
+        session_id=f"desc-gen-{user_id}-{uuid.uuid4()}",
+        system_message=DESCRIPTION_SYSTEM_MESSAGE
+    ).with_model(*DESCRIPTION_MODEL)
+    async with description_semaphore:
+        response = await asyncio.wait_for(
+            chat.send_message(UserMessage(text=description_prompt(prompt_fields))),
+            timeout=DESCRIPTION_TIMEOUT_SECONDS
+        )
+    # Convert response to string to avoid ObjectId serialization issues
+    description = str(response) if response else ""
+    
+    if description:
+        description_cache[key] = description
+        await db.description_cache.update_one(
+            {"key": key},
+            {"$set": {**prompt_fields, "key": key, "description": description, "created_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+    return {"description": description, "cached": False}
+
+def require_llm_key():
+    if not EMERGENT_LLM_KEY:
+        raise HTTPException(status_code=500, detail="EMERGENT_LLM_KEY not configured")
 
 @api_router.post("/ai/generate-description")
 async def generate_description(
-    data: dict,
-    current_user: User = Depends(get_current_user)
+    data: DescriptionRequest,
+    current_user: Principal = Depends(get_current_user)
 ):
     """Generate AI-powered product description"""
-    title = data.get("title", "")
-    category = data.get("category", "")
-    is_veg = data.get("is_veg", True)
-    spice_level = data.get("spice_level", "")
-    
-    if not title:
+    if not data.title.strip():
         raise HTTPException(status_code=400, detail="Title is required")
-    
-    # Get Emergent LLM key from environment
-    api_key = os.getenv("EMERGENT_LLM_KEY")
-    if not api_key:
-        raise HTTPException(status_code=500, detail="EMERGENT_LLM_KEY not configured")
-    
-    # Create a chat instance
-    chat = LlmChat(
-        api_key=api_key,
-        session_id=f"desc-gen-{current_user.id}-{uuid.uuid4()}",
-        system_message="You are a food description expert specializing in Indian homemade cuisine. Create authentic, mouth-watering descriptions that highlight the traditional aspects and authentic flavors."
-    ).with_model("openai", "gpt-5-mini")
-    
-    # Create prompt based on product details
-    veg_text = "vegetarian" if is_veg else "non-vegetarian"
-    spice_text = f", {spice_level} spice level" if spice_level else ""
-    
-    prompt = f"Write a 2-3 sentence authentic description for '{title}', a {veg_text} {category} dish{spice_text}. Focus on traditional preparation, authentic flavors, and what makes it special. Keep it appetizing and concise."
-    
-    user_message = UserMessage(text=prompt)
+    require_llm_key()
     
     try:
-        response = await chat.send_message(user_message)
-        # Convert response to string to avoid ObjectId serialization issues
-        description_text = str(response) if response else ""
-        return {"description": description_text}
+        return await describe_product(data, current_user.id)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="AI generation timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI generation failed: {str(e)}")
 
+@api_router.post("/ai/generate-descriptions")
+async def generate_descriptions(
+    data: DescriptionBatchRequest,
+    current_user: Principal = Depends(get_current_user)
+):
+    """Generate descriptions for several draft listings at once.
+
+    Identical prompts in one batch share a single generation. Results come
+    back in request order; a failed item carries an error instead of failing
+    the whole batch.
+    """
+    if not data.items:
+        raise HTTPException(status_code=400, detail="No items to describe")
+    if len(data.items) > DESCRIPTION_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {DESCRIPTION_BATCH_MAX} items per batch")
+    if any(not item.title.strip() for item in data.items):
+        raise HTTPException(status_code=400, detail="Title is required for every item")
+    require_llm_key()
+    
+    unique = {}
+    for item in data.items:
+        unique.setdefault(description_cache_key(item.normalized()), item)
+    keys = list(unique)
+    outcomes = await asyncio.gather(
+        *(describe_product(unique[key], current_user.id) for key in keys),
+        return_exceptions=True
+    )
+    by_key = dict(zip(keys, outcomes))
+    
+    results = []
+    for index, item in enumerate(data.items):
+        outcome = by_key[description_cache_key(item.normalized())]
+        if isinstance(outcome, asyncio.TimeoutError):
+            results.append({"index": index, "description": None, "cached": False, "error": "AI generation timed out"})
+        elif isinstance(outcome, Exception):
+            results.append({"index": index, "description": None, "cached": False, "error": f"AI generation failed: {str(outcome)}"})
+        else:
+            results.append({"index": index, **outcome, "error": None})
+    return {"results": results}
+
+# ====== STORE RATINGS ======
+# Stores carry rating_sum, total_reviews and a per-star histogram that are
+# bumped atomically on every review; `rating` is derived from them.
+
+RATING_RECOMPUTE_ATTEMPTS = 3
+
+def derive_rating(rating_sum: int, total_reviews: int) -> float:
+    return round(rating_sum / total_reviews, 1) if total_reviews else 0.0
+
+async def apply_store_rating(store_id: str, rating: int):
+    """Fold one new review into the store's rating aggregates in constant time"""
+    store = await db.stores.find_one_and_update(
+        # Stores saved before the aggregates existed have no rating_sum to add to
+        {"id": store_id, "rating_sum": {"$exists": True}},
+        revised({"$inc": {
+            "rating_sum": rating,
+            "total_reviews": 1,
+            f"rating_histogram.{rating}": 1
+        }}),
+        projection={"_id": 0, "rating_sum": 1, "total_reviews": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if not store:
+        # The review is already saved, so rebuilding from reviews includes it
+        legacy = await db.stores.find_one({"id": store_id}, {"_id": 0, "id": 1, "version": 1})
+        if legacy:
+            await recompute_ratings_for([legacy])
+        return
+    
+    # Only the writer that saw the latest total sets the derived rating, so a
+    # slower concurrent review can never overwrite it with a stale average.
+    await db.stores.update_one(
+        {"id": store_id, "total_reviews": store["total_reviews"]},
+        revised({"$set": {"rating": derive_rating(store["rating_sum"], store["total_reviews"])}})
+    )
+
+@task_handler("recompute_ratings", queue="maintenance", max_attempts=3, timeout_seconds=600)
+async def recompute_ratings_task(payload: Dict[str, Any], task: Dict[str, Any]):
+    await recompute_store_ratings(batch_size=payload.get("batch_size", 500))
+
+async def recompute_store_ratings(batch_size: int = 500, only_missing: bool = False) -> int:
+    """Rebuild every store's rating aggregates from the reviews collection, or
+    with `only_missing` just those of stores that have none yet.
+    
+    Stores are walked in `id` order one batch at a time, with one grouped
+    aggregation over that batch's reviews and one bulk write per batch.
+    Every write is guarded by the store version read before aggregating, so
+    a review folded in meanwhile by apply_store_rating is never overwritten;
+    those stores are recomputed, up to RATING_RECOMPUTE_ATTEMPTS times.
+    """
+    processed = skipped = 0
+    last_id = None
+    while True:
+        query = {"rating_sum": {"$exists": False}} if only_missing else {}
+        if last_id:
+            query["id"] = {"$gt": last_id}
+        stores = await db.stores.find(query, {"_id": 0, "id": 1, "version": 1}).sort("id", 1).limit(batch_size).to_list(batch_size)
+        if not stores:
+            break
+        
+        missed = await recompute_ratings_for(stores)
+        skipped += missed
+        processed += len(stores) - missed
+        last_id = stores[-1]["id"]
+    
+    if skipped:
+        logger.warning(f"Store ratings kept changing during recompute, skipped {skipped} stores")
+    if processed or not only_missing:
+        logger.info(f"Recomputed ratings for {processed} stores")
+    return processed
+
+async def recompute_ratings_for(stores: List[Dict[str, Any]]) -> int:
+    """Recompute the given {id, version} stores, retrying those a concurrent
+    review bumped; returns how many still missed after the last attempt"""
+    versions = {s["id"]: s.get("version") for s in stores}
+    for _ in range(RATING_RECOMPUTE_ATTEMPTS):
+        versions = await recompute_ratings_batch(versions)
+        if not versions:
+            break
+    return len(versions)
+
+async def seed_store_ratings():
+    """Give stores saved before rating aggregates existed their rating_sum
+    and histogram, so apply_store_rating can fold reviews into them"""
+    try:
+        await recompute_store_ratings(only_missing=True)
+    except Exception as e:
+        logger.error(f"Rating aggregate seeding failed: {str(e)}")
+
+async def recompute_ratings_batch(versions: Dict[str, Any]) -> Dict[str, Any]:
+    """Write recomputed aggregates for {store_id: version read beforehand};
+    returns the current versions of the stores whose write did not land"""
+    store_ids = list(versions)
+    now = datetime.now(timezone.utc)
+    group = {"_id": "$store_id", "rating_sum": {"$sum": "$rating"}, "total_reviews": {"$sum": 1}}
+    for star in RATING_STARS:
+        group[f"star_{star}"] = {"$sum": {"$cond": [{"$eq": ["$rating", star]}, 1, 0]}}
+    totals = {
+        row["_id"]: row
+        async for row in db.reviews.aggregate([
+            {"$match": {"store_id": {"$in": store_ids}}},
+            {"$group": group}
+        ])
+    }
+    
+    operations = []
+    for store_id in store_ids:
+        row = totals.get(store_id, {})
+        rating_sum = row.get("rating_sum", 0)
+        total_reviews = row.get("total_reviews", 0)
+        operations.append(UpdateOne({"id": store_id, "version": versions[store_id]}, revised({"$set": {
+            "rating_sum": rating_sum,
+            "total_reviews": total_reviews,
+            "rating_histogram": {str(star): row.get(f"star_{star}", 0) for star in RATING_STARS},
+            "rating": derive_rating(rating_sum, total_reviews),
+            "ratings_recomputed_at": now
+        }}, now)))
+    result = await db.stores.bulk_write(operations, ordered=False)
+    if result.matched_count == len(operations):
+        return {}
+    
+    missed = await db.stores.find(
+        {"id": {"$in": store_ids}, "ratings_recomputed_at": {"$ne": now}},
+        {"_id": 0, "id": 1, "version": 1}
+    ).to_list(len(store_ids))
+    return {s["id"]: s.get("version") for s in missed}
+
 @api_router.post("/reviews")
-async def create_review(review_data: ReviewCreate, current_user: User = Depends(get_current_user)):
-    order = await db.orders.find_one({"id": review_data.order_id, "buyer_id": current_user.id}, {"_id": 0})
-    if not order:
+async def create_review(
+    review_data: ReviewCreate,
+    current_user: Principal = Depends(get_current_user),
+    loaders: Loaders = Depends(get_loaders)
+):
+    order = await loaders.orders.load(review_data.order_id)
+    if not order or order["buyer_id"] != current_user.id:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    product = await db.products.find_one({"id": order["product_id"]}, {"_id": 0})
+    product = await loaders.products.load(order["product_id"])
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
@@ -1290,47 +2626,257 @@ async def create_review(review_data: ReviewCreate, current_user: User = Depends(
         buyer_id=current_user.id,
         rating=review_data.rating,
         comment=review_data.comment,
-        photos=review_data.photos
+        photos=review_data.photos,
+        thumbnail=await thumbnail_of(review_data.photos),
+        has_photos=bool(review_data.photos)
     )
-    review_dict = review.model_dump()
-    review_dict['created_at'] = review_dict['created_at'].isoformat()
-    await db.reviews.insert_one(review_dict)
+    await db.reviews.insert_one(to_document(review))
     
-    reviews = await db.reviews.find({"store_id": product["store_id"]}, {"_id": 0}).to_list(1000)
-    avg_rating = sum([r["rating"] for r in reviews]) / len(reviews) if reviews else 0
-    await db.stores.update_one(
-        {"id": product["store_id"]},
-        {"$set": {"rating": round(avg_rating, 1), "total_reviews": len(reviews)}}
-    )
+    await apply_store_rating(product["store_id"], review.rating)
     
     return review
 
 @api_router.get("/reviews/store/{store_id}")
-async def get_store_reviews(store_id: str):
-    reviews = await db.reviews.find({"store_id": store_id}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    return reviews
+async def get_store_reviews(
+    store_id: str,
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    with_photos_only: bool = False,
+    fields: Optional[str] = None
+):
+    """Newest-first page of a store's reviews, plus the rating summary on the first page"""
+    limit = max(1, min(limit, 100))
+    key = f"{store_id}|{cursor}|{limit}|{with_photos_only}|{fields}"
+    read = await cached_public_read(
+        "store_reviews", key,
+        lambda: store_reviews_page(store_id, cursor, limit, with_photos_only, fields)
+    )
+    return conditional_response(request, read.etag, REVIEWS_CACHE_CONTROL, read.body)
 
-@api_router.post("/wallet/transactions")
-async def create_transaction(transaction_type: str, amount: float, description: str, current_user: User = Depends(get_current_user)):
+async def store_reviews_page(store_id: str, cursor: Optional[str], limit: int, with_photos_only: bool, fields: Optional[str]) -> Dict[str, Any]:
+    query = {"store_id": store_id}
+    if with_photos_only:
+        query["has_photos"] = True
+    if cursor:
+        created_at, last_id = decode_cursor(cursor, 2)
+        query.update(keyset_after("created_at", created_at, last_id))
+    
+    projection = list_projection(REVIEW_LIST_PROJECTION, fields, required=("id", "created_at"))
+    reviews = await db.reviews.find(query, projection).sort([("created_at", -1), ("id", -1)]).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(reviews) > limit:
+        reviews = reviews[:limit]
+        next_cursor = encode_cursor(reviews[-1]["created_at"], reviews[-1]["id"])
+    
+    response = {"reviews": reviews, "next_cursor": next_cursor}
+    if not cursor:
+        store = await db.stores.find_one(
+            {"id": store_id},
+            {"_id": 0, "rating": 1, "total_reviews": 1, "rating_histogram": 1}
+        ) or {}
+        response["summary"] = {
+            "average": store.get("rating", 0.0),
+            "total_reviews": store.get("total_reviews", 0),
+            "histogram": {**empty_rating_histogram(), **store.get("rating_histogram", {})}
+        }
+    return response
+
+# ====== WALLET ======
+# `transactions` is an append-only ledger; each user's `wallets` document
+# carries the running balance, bumped with $inc right after the ledger entry
+# is written, so balance reads never scan history. Entries that stand for a
+# business event carry a `reference` (unique per user) so retries cannot
+# book them twice. A wallet is created, seeded from any older ledger entries,
+# before the first new entry is written, so no entry can fall between the
+# seed and the $inc; rebuild_wallets() corrects any that drift anyway.
+
+WALLET_PROJECTION = {"_id": 0, "user_id": 1, "balance": 1, "credits": 1, "debits": 1, "transaction_count": 1, "updated_at": 1}
+WALLET_TOTALS = ("balance", "credits", "debits", "transaction_count")
+WALLET_REPAIR_SETTLE_SECONDS = 2
+TRANSACTION_TYPES = ("credit", "debit")
+
+def ledger_totals_pipeline(match: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": "$user_id",
+            "credits": {"$sum": {"$cond": [{"$eq": ["$transaction_type", "credit"]}, "$amount", 0]}},
+            "debits": {"$sum": {"$cond": [{"$eq": ["$transaction_type", "debit"]}, "$amount", 0]}},
+            "transaction_count": {"$sum": 1}
+        }},
+        {"$set": {"balance": {"$subtract": ["$credits", "$debits"]}}}
+    ]
+
+async def ensure_wallet(user_id: str) -> Dict[str, Any]:
+    wallet = await db.wallets.find_one({"user_id": user_id}, WALLET_PROJECTION)
+    if wallet:
+        return wallet
+    totals = await first_row(db.transactions.aggregate(ledger_totals_pipeline({"user_id": user_id})))
+    try:
+        await db.wallets.insert_one({
+            "user_id": user_id,
+            "balance": totals.get("balance", 0.0),
+            "credits": totals.get("credits", 0.0),
+            "debits": totals.get("debits", 0.0),
+            "transaction_count": totals.get("transaction_count", 0),
+            "updated_at": datetime.now(timezone.utc)
+        })
+    except DuplicateKeyError:
+        pass  # seeded concurrently
+    return await db.wallets.find_one({"user_id": user_id}, WALLET_PROJECTION)
+
+async def record_transaction(user_id: str, transaction_type: str, amount: float, description: str,
+                             reference: Optional[str] = None) -> Transaction:
+    """Append a ledger entry and fold it into the user's balance"""
+    await ensure_wallet(user_id)
     transaction = Transaction(
-        user_id=current_user.id,
+        user_id=user_id,
         transaction_type=transaction_type,
         amount=amount,
-        description=description
+        description=description,
+        reference=reference
+    )
+    try:
+        await db.transactions.insert_one(to_document(transaction))
+    except DuplicateKeyError:
+        existing = await db.transactions.find_one({"user_id": user_id, "reference": reference}, {"_id": 0})
+        return Transaction(**existing)
+    
+    credit = amount if transaction_type == "credit" else 0.0
+    debit = amount if transaction_type == "debit" else 0.0
+    await db.wallets.update_one(
+        {"user_id": user_id},
+        {
+            "$inc": {"balance": credit - debit, "credits": credit, "debits": debit, "transaction_count": 1},
+            "$set": {"updated_at": transaction.created_at}
+        }
     )
-    trans_dict = transaction.model_dump()
-    trans_dict['created_at'] = trans_dict['created_at'].isoformat()
-    await db.transactions.insert_one(trans_dict)
     return transaction
 
+def wallet_view(wallet: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "balance": round(wallet.get("balance", 0.0), 2),
+        "credits": round(wallet.get("credits", 0.0), 2),
+        "debits": round(wallet.get("debits", 0.0), 2),
+        "transaction_count": wallet.get("transaction_count", 0),
+        "updated_at": wallet.get("updated_at")
+    }
+
+async def wallet_drift(wallets: List[Dict[str, Any]]) -> Dict[str, tuple]:
+    """{user_id: (wallet, ledger minus wallet)} for the wallets that disagree with their ledger"""
+    user_ids = [w["user_id"] for w in wallets]
+    ledger = {
+        row["_id"]: row
+        async for row in db.transactions.aggregate(ledger_totals_pipeline({"user_id": {"$in": user_ids}}))
+    }
+    drift = {}
+    for wallet in wallets:
+        totals = ledger.get(wallet["user_id"], {})
+        delta = {field: totals.get(field, 0) - (wallet.get(field) or 0) for field in WALLET_TOTALS}
+        # Summed in a different order, float totals differ below a paisa
+        if any(round(value, 2) for value in delta.values()):
+            drift[wallet["user_id"]] = (wallet, delta)
+    return drift
+
+def same_drift(a: Dict[str, float], b: Dict[str, float]) -> bool:
+    return all(round(a[field] - b[field], 2) == 0 for field in WALLET_TOTALS)
+
+async def rebuild_wallets(batch_size: int = 500, settle_seconds: float = WALLET_REPAIR_SETTLE_SECONDS) -> int:
+    """Bring every wallet back in line with the ledger; returns how many were corrected.
+    
+    Users with ledger entries but no wallet get one seeded. Wallets are then
+    compared with their ledger totals batch by batch, wallets without any
+    entries included. A mismatch can also be a transaction caught between its
+    ledger insert and its $inc, so a wallet is only corrected if the same
+    drift is still there after `settle_seconds` with the wallet untouched.
+    The correction is an $inc of the difference, guarded on the values read,
+    so a transaction booked in the meantime is never overwritten.
+    """
+    repaired = 0
+    async for row in db.transactions.aggregate([
+        {"$group": {"_id": "$user_id"}},
+        {"$lookup": {"from": "wallets", "localField": "_id", "foreignField": "user_id", "as": "wallet"}},
+        {"$match": {"wallet": {"$size": 0}}}
+    ]):
+        await ensure_wallet(row["_id"])
+        repaired += 1
+    
+    last_user_id = None
+    while True:
+        query = {"user_id": {"$gt": last_user_id}} if last_user_id else {}
+        wallets = await db.wallets.find(query, WALLET_PROJECTION).sort("user_id", 1).limit(batch_size).to_list(batch_size)
+        if not wallets:
+            break
+        last_user_id = wallets[-1]["user_id"]
+        
+        drift = await wallet_drift(wallets)
+        if not drift:
+            continue
+        await asyncio.sleep(settle_seconds)
+        current = await db.wallets.find({"user_id": {"$in": list(drift)}}, WALLET_PROJECTION).to_list(len(drift))
+        unchanged = [
+            w for w in current
+            if all(w.get(field) == drift[w["user_id"]][0].get(field) for field in WALLET_TOTALS)
+        ]
+        settled = await wallet_drift(unchanged)
+        
+        now = datetime.now(timezone.utc)
+        operations = [
+            UpdateOne(
+                {"user_id": user_id, **{field: wallet.get(field) for field in WALLET_TOTALS}},
+                {"$inc": delta, "$set": {"updated_at": now}}
+            )
+            for user_id, (wallet, delta) in settled.items()
+            if same_drift(delta, drift[user_id][1])
+        ]
+        if operations:
+            result = await db.wallets.bulk_write(operations, ordered=False)
+            repaired += result.modified_count
+    return repaired
+
+@task_handler("rebuild_wallets", queue="maintenance", max_attempts=3, timeout_seconds=600)
+async def rebuild_wallets_task(payload: Dict[str, Any], task: Dict[str, Any]):
+    repaired = await rebuild_wallets()
+    logger.info(f"Repaired {repaired} wallets from the ledger")
+
+@api_router.post("/wallet/transactions")
+async def create_transaction(transaction_type: str, amount: float, description: str, current_user: Principal = Depends(get_current_user)):
+    if transaction_type not in TRANSACTION_TYPES:
+        raise HTTPException(status_code=400, detail="transaction_type must be 'credit' or 'debit'")
+    if amount <= 0:
+        raise HTTPException(status_code=400, detail="Amount must be positive")
+    return await record_transaction(current_user.id, transaction_type, amount, description)
+
+@api_router.get("/wallet/balance")
+async def get_wallet_balance(current_user: Principal = Depends(get_current_user)):
+    return wallet_view(await ensure_wallet(current_user.id))
+
 @api_router.get("/wallet/transactions/my")
-async def get_my_transactions(current_user: User = Depends(get_current_user)):
-    transactions = await db.transactions.find({"user_id": current_user.id}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    return transactions
+async def get_my_transactions(
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    current_user: Principal = Depends(get_current_user)
+):
+    """Newest-first page of the caller's ledger"""
+    limit = max(1, min(limit, 100))
+    query = {"user_id": current_user.id}
+    if cursor:
+        created_at, last_id = decode_cursor(cursor, 2)
+        query.update(keyset_after("created_at", created_at, last_id))
+    
+    transactions = await db.transactions.find(query, {"_id": 0}).sort([("created_at", -1), ("id", -1)]).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        next_cursor = encode_cursor(transactions[-1]["created_at"], transactions[-1]["id"])
+    return FastJSONResponse({"transactions": transactions, "next_cursor": next_cursor})
 
 # Razorpay Payment & Subscription Endpoints
 @api_router.post("/payments/create-order")
-async def create_payment_order(payment_order: PaymentOrder, current_user: User = Depends(get_current_user)):
+async def create_payment_order(payment_order: PaymentOrder, current_user: Principal = Depends(get_current_user)):
     """Create Razorpay order for activation, monthly, or yearly subscription"""
     if not razorpay_client:
         raise HTTPException(status_code=503, detail="Payment service not configured")
@@ -1367,9 +2913,7 @@ async def create_payment_order(payment_order: PaymentOrder, current_user: User =
             status="pending",
             razorpay_order_id=razorpay_order["id"]
         )
-        sub_dict = subscription.model_dump()
-        sub_dict['created_at'] = sub_dict['created_at'].isoformat()
-        await db.subscriptions.insert_one(sub_dict)
+        await db.subscriptions.insert_one(to_document(subscription))
         
         return {
             "order_id": razorpay_order["id"],
@@ -1381,8 +2925,37 @@ async def create_payment_order(payment_order: PaymentOrder, current_user: User =
         logger.error(f"Payment order creation failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to create payment order: {str(e)}")
 
+def subscription_user_update(plan_type: str, now: datetime) -> Dict[str, Any]:
+    """User fields to set once a payment for `plan_type` has gone through"""
+    user_update = {}
+    
+    if plan_type == "activation":
+        user_update["activation_paid"] = True
+    elif plan_type == "monthly":
+        # Monthly subscription expires at end of current month + 14 days grace period
+        end_of_month = (now.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        grace_period_end = end_of_month + timedelta(days=14)
+        user_update.update({
+            "subscription_plan": "monthly",
+            "subscription_status": "active",
+            "subscription_started_at": now,
+            "subscription_expires_at": grace_period_end,
+            "seller_active": True
+        })
+    elif plan_type == "yearly":
+        # Yearly subscription expires after 1 year + 14 days grace period
+        expires_at = now + timedelta(days=365 + 14)
+        user_update.update({
+            "subscription_plan": "yearly",
+            "subscription_status": "active",
+            "subscription_started_at": now,
+            "subscription_expires_at": expires_at,
+            "seller_active": True
+        })
+    return user_update
+
 @api_router.post("/payments/verify")
-async def verify_payment(payment_verification: PaymentVerification, current_user: User = Depends(get_current_user)):
+async def verify_payment(payment_verification: PaymentVerification, current_user: Principal = Depends(get_current_user)):
     """Verify Razorpay payment and update subscription status"""
     if not razorpay_client:
         raise HTTPException(status_code=503, detail="Payment service not configured")
@@ -1407,47 +2980,27 @@ async def verify_payment(payment_verification: PaymentVerification, current_user
         now = datetime.now(timezone.utc)
         plan_type = subscription["plan_type"]
         
-        # Update subscription status
-        await db.subscriptions.update_one(
-            {"razorpay_order_id": payment_verification.razorpay_order_id},
+        # Update subscription status (unless the webhook already did)
+        result = await db.subscriptions.update_one(
+            {"razorpay_order_id": payment_verification.razorpay_order_id, "status": {"$ne": "paid"}},
             {
                 "$set": {
                     "status": "paid",
                     "razorpay_payment_id": payment_verification.razorpay_payment_id,
                     "razorpay_signature": payment_verification.razorpay_signature,
-                    "payment_date": now.isoformat()
+                    "payment_date": now,
+                    "updated_at": now
                 }
             }
         )
         
         # Update user subscription status
-        user_update = {}
-        
-        if plan_type == "activation":
-            user_update["activation_paid"] = True
-        elif plan_type == "monthly":
-            # Monthly subscription expires at end of current month + 14 days grace period
-            end_of_month = (now.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-            grace_period_end = end_of_month + timedelta(days=14)
-            user_update.update({
-                "subscription_plan": "monthly",
-                "subscription_status": "active",
-                "subscription_started_at": now.isoformat(),
-                "subscription_expires_at": grace_period_end.isoformat(),
-                "seller_active": True
-            })
-        elif plan_type == "yearly":
-            # Yearly subscription expires after 1 year + 14 days grace period
-            expires_at = now + timedelta(days=365 + 14)
-            user_update.update({
-                "subscription_plan": "yearly",
-                "subscription_status": "active",
-                "subscription_started_at": now.isoformat(),
-                "subscription_expires_at": expires_at.isoformat(),
-                "seller_active": True
-            })
-        
-        await db.users.update_one({"id": current_user.id}, {"$set": user_update})
+        if result.modified_count:
+            user_update = subscription_user_update(plan_type, now)
+            if user_update:
+                await db.users.update_one({"id": current_user.id}, {"$set": user_update})
+            if user_update.get("seller_active"):
+                await reactivate_lapsed_listings([current_user.id])
         
         # Fetch updated user
         updated_user = await db.users.find_one({"id": current_user.id}, {"_id": 0})
@@ -1464,42 +3017,246 @@ async def verify_payment(payment_verification: PaymentVerification, current_user
         logger.error(f"Payment verification failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Payment verification failed: {str(e)}")
 
-@api_router.get("/subscription/status")
-async def get_subscription_status(current_user: User = Depends(get_current_user)):
-    """Get current subscription status and check for expiry"""
+# ====== RAZORPAY WEBHOOKS ======
+# The webhook only verifies the signature, stores the raw event under its
+# unique id (redeliveries hit the unique index and are acknowledged as
+# duplicates) and nudges the process_payment_events task. That task drains
+# pending events PAYMENT_EVENT_BATCH_SIZE at a time: one $in read of the
+# matching subscriptions, then bulk writes to subscriptions and users.
+
+PAYMENT_EVENT_CLAIM_SECONDS = 600
+PAYMENT_EVENT_OUTCOMES = {"payment.captured": "paid", "order.paid": "paid", "payment.failed": "failed"}
+
+def verify_webhook_signature(body: bytes, signature: Optional[str]) -> bool:
+    expected = hmac.new(RAZORPAY_WEBHOOK_SECRET.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return bool(signature) and hmac.compare_digest(expected, signature)
+
+def payment_entity(event: Dict[str, Any]) -> Dict[str, Any]:
+    return ((event.get("payload") or {}).get("payment") or {}).get("entity") or {}
+
+@api_router.post("/payments/webhook")
+async def razorpay_webhook(
+    request: Request,
+    x_razorpay_signature: Optional[str] = Header(None),
+    x_razorpay_event_id: Optional[str] = Header(None)
+):
+    """Accept a Razorpay webhook; processing happens in the background"""
+    if not RAZORPAY_WEBHOOK_SECRET:
+        raise HTTPException(status_code=503, detail="Webhooks not configured")
+    
+    body = await request.body()
+    if not verify_webhook_signature(body, x_razorpay_signature):
+        raise HTTPException(status_code=400, detail="Invalid webhook signature")
+    try:
+        event = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid webhook payload")
+    
+    event_id = x_razorpay_event_id or hashlib.sha256(body).hexdigest()
+    try:
+        await db.payment_events.insert_one({
+            "id": event_id,
+            "event": event.get("event"),
+            "payload": event,
+            "status": "pending",
+            "received_at": datetime.now(timezone.utc)
+        })
+    except DuplicateKeyError:
+        return {"status": "duplicate"}
+    
+    await enqueue_task("process_payment_events", dedupe_key="process_payment_events")
+    return {"status": "accepted"}
+
+async def claim_payment_events() -> List[Dict[str, Any]]:
+    """Take the next batch of pending events (or ones a crashed run left claimed)"""
     now = datetime.now(timezone.utc)
+    candidates = await db.payment_events.find(
+        {"$or": [
+            {"status": "pending"},
+            {"status": "processing", "claimed_at": {"$lt": now - timedelta(seconds=PAYMENT_EVENT_CLAIM_SECONDS)}}
+        ]},
+        {"_id": 0, "id": 1}
+    ).sort("received_at", 1).limit(PAYMENT_EVENT_BATCH_SIZE).to_list(PAYMENT_EVENT_BATCH_SIZE)
+    if not candidates:
+        return []
+    
+    claim = str(uuid.uuid4())
+    await db.payment_events.update_many(
+        {"id": {"$in": [c["id"] for c in candidates]}, "$or": [
+            {"status": "pending"},
+            {"status": "processing", "claimed_at": {"$lt": now - timedelta(seconds=PAYMENT_EVENT_CLAIM_SECONDS)}}
+        ]},
+        {"$set": {"status": "processing", "claim": claim, "claimed_at": now}}
+    )
+    return await db.payment_events.find({"claim": claim, "status": "processing"}, {"_id": 0}).to_list(None)
+
+async def apply_payment_events(events: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Apply one batch of events; returns the final status for each event id"""
+    now = datetime.now(timezone.utc)
+    outcomes = {event["id"]: "ignored" for event in events}
     
-    # Check if subscription has expired
-    if current_user.subscription_expires_at:
-        expires_at = current_user.subscription_expires_at if isinstance(current_user.subscription_expires_at, datetime) else datetime.fromisoformat(current_user.subscription_expires_at)
+    relevant = []
+    for event in events:
+        entity = payment_entity(event["payload"])
+        if event["event"] in PAYMENT_EVENT_OUTCOMES and entity.get("order_id"):
+            relevant.append((event, entity))
+    if not relevant:
+        return outcomes
+    
+    subscriptions = await db.subscriptions.find(
+        {"razorpay_order_id": {"$in": list({entity["order_id"] for _, entity in relevant})}, "status": {"$ne": "paid"}},
+        {"_id": 0, "id": 1, "user_id": 1, "plan_type": 1, "amount": 1, "razorpay_order_id": 1}
+    ).to_list(None)
+    by_order = {s["razorpay_order_id"]: s for s in subscriptions}
+    
+    subscription_writes, user_writes, renewed = [], [], []
+    for event, entity in relevant:
+        subscription = by_order.get(entity["order_id"])
+        if not subscription:
+            continue  # unknown order, or already paid through /payments/verify
+        outcome = PAYMENT_EVENT_OUTCOMES[event["event"]]
+        if outcome == "paid" and entity.get("amount") not in (None, subscription["amount"]):
+            logger.warning(f"Payment event {event['id']} amount {entity.get('amount')} does not match subscription {subscription['id']}")
+            outcomes[event["id"]] = "rejected"
+            continue
         
-        if now > expires_at:
-            # Subscription expired - deactivate store
-            await db.users.update_one(
-                {"id": current_user.id},
-                {"$set": {"subscription_status": "expired", "seller_active": False}}
+        if outcome == "paid":
+            del by_order[entity["order_id"]]  # a later event in the batch must not apply it twice
+            subscription_writes.append(UpdateOne(
+                {"id": subscription["id"], "status": {"$ne": "paid"}},
+                {"$set": {"status": "paid", "razorpay_payment_id": entity.get("id"), "payment_date": now, "updated_at": now}}
+            ))
+            user_update = subscription_user_update(subscription["plan_type"], now)
+            if user_update:
+                user_writes.append(UpdateOne({"id": subscription["user_id"]}, {"$set": user_update}))
+            if user_update.get("seller_active"):
+                renewed.append(subscription["user_id"])
+        else:
+            subscription_writes.append(UpdateOne(
+                {"id": subscription["id"], "status": "pending"},
+                {"$set": {"status": "failed", "razorpay_payment_id": entity.get("id"), "updated_at": now}}
+            ))
+        outcomes[event["id"]] = "processed"
+    
+    # Users first: their $sets are safe to repeat, while a subscription once
+    # marked paid is skipped above, so a retry after a failed users write
+    # would never activate the seller
+    if user_writes:
+        await db.users.bulk_write(user_writes, ordered=False)
+    if subscription_writes:
+        await db.subscriptions.bulk_write(subscription_writes, ordered=False)
+    await reactivate_lapsed_listings(renewed)
+    return outcomes
+
+@task_handler("process_payment_events", queue="payments", max_attempts=8, timeout_seconds=120, retry_base_seconds=5)
+async def process_payment_events(payload: Dict[str, Any], task: Dict[str, Any]):
+    while True:
+        events = await claim_payment_events()
+        if not events:
+            return
+        try:
+            outcomes = await apply_payment_events(events)
+        except Exception:
+            await db.payment_events.update_many(
+                {"id": {"$in": [e["id"] for e in events]}, "status": "processing"},
+                {"$set": {"status": "pending"}, "$unset": {"claim": "", "claimed_at": ""}}
             )
-            current_user.subscription_status = "expired"
-            current_user.seller_active = False
-        elif now > (expires_at - timedelta(days=14)):
-            # In grace period
-            await db.users.update_one(
-                {"id": current_user.id},
-                {"$set": {"subscription_status": "grace_period"}}
+            raise
+        now = datetime.now(timezone.utc)
+        by_status: Dict[str, List[str]] = {}
+        for event_id, outcome in outcomes.items():
+            by_status.setdefault(outcome, []).append(event_id)
+        for outcome, ids in by_status.items():
+            await db.payment_events.update_many(
+                {"id": {"$in": ids}},
+                {"$set": {"status": outcome, "processed_at": now}}
             )
-            current_user.subscription_status = "grace_period"
+        logger.info(f"Processed {len(events)} payment events: { {k: len(v) for k, v in by_status.items()} }")
+
+SUBSCRIPTION_STATUS_FIELDS = [
+    "activation_paid", "subscription_plan", "subscription_status",
+    "subscription_expires_at", "seller_active", "is_seller"
+]
+
+@api_router.get("/subscription/status")
+async def get_subscription_status(current_user: Principal = Depends(get_current_user)):
+    """Get current subscription status (kept current by the lifecycle sweep)"""
+    profile = await load_user_profile(current_user, SUBSCRIPTION_STATUS_FIELDS)
     
     return {
-        "activation_paid": current_user.activation_paid,
-        "subscription_plan": current_user.subscription_plan,
-        "subscription_status": current_user.subscription_status,
-        "subscription_expires_at": current_user.subscription_expires_at,
-        "seller_active": current_user.seller_active,
-        "is_seller": current_user.is_seller
+        "activation_paid": profile.get("activation_paid", False),
+        "subscription_plan": profile.get("subscription_plan"),
+        "subscription_status": profile.get("subscription_status", "inactive"),
+        "subscription_expires_at": profile.get("subscription_expires_at"),
+        "seller_active": profile.get("seller_active", False),
+        "is_seller": profile.get("is_seller", False)
     }
 
+# ====== SUBSCRIPTION LIFECYCLE ======
+# Every SUBSCRIPTION_SWEEP_SECONDS a sweep moves sellers active -> grace_period
+# (inside the last SUBSCRIPTION_GRACE_DAYS before subscription_expires_at) ->
+# expired, one update_many per transition. Expiring sellers have their stores
+# and products switched off in bulk, tagged so a renewal can switch back on
+# exactly what the sweep turned off.
+
+SUBSCRIPTION_GRACE_DAYS = 14
+LAPSED_REASON = "subscription_expired"
+
+@task_handler("sweep_subscriptions", queue="maintenance", max_attempts=3, timeout_seconds=300)
+async def sweep_subscriptions(payload: Dict[str, Any], task: Dict[str, Any]):
+    now = datetime.now(timezone.utc)
+    
+    graced = await db.users.update_many(
+        {
+            "subscription_status": "active",
+            "subscription_expires_at": {"$gt": now, "$lte": now + timedelta(days=SUBSCRIPTION_GRACE_DAYS)}
+        },
+        {"$set": {"subscription_status": "grace_period"}}
+    )
+    
+    lapsing_query = {"subscription_status": {"$in": ["active", "grace_period"]}, "subscription_expires_at": {"$lte": now}}
+    expired = 0
+    while True:
+        batch = await db.users.find(lapsing_query, {"_id": 0, "id": 1}).limit(SUBSCRIPTION_SWEEP_BATCH_SIZE).to_list(SUBSCRIPTION_SWEEP_BATCH_SIZE)
+        if not batch:
+            break
+        user_ids = [u["id"] for u in batch]
+        # Listings go first: if the sweep dies here the users are still picked up next run
+        await db.stores.update_many(
+            {"user_id": {"$in": user_ids}, "store_active": True},
+            revised({"$set": {"store_active": False, "deactivated_reason": LAPSED_REASON}}, now)
+        )
+        await db.products.update_many(
+            {"seller_id": {"$in": user_ids}, "active": True},
+            revised({"$set": {"active": False, "deactivated_reason": LAPSED_REASON}}, now)
+        )
+        result = await db.users.update_many(
+            {"id": {"$in": user_ids}, **lapsing_query},
+            {"$set": {"subscription_status": "expired", "seller_active": False}}
+        )
+        expired += result.modified_count
+    
+    if graced.modified_count or expired:
+        logger.info(f"Subscription sweep: {graced.modified_count} entered grace period, {expired} expired")
+
+async def reactivate_lapsed_listings(user_ids: List[str]):
+    """Undo the sweep's deactivation for sellers who have paid again"""
+    if not user_ids:
+        return
+    await db.stores.update_many(
+        {"user_id": {"$in": user_ids}, "deactivated_reason": LAPSED_REASON},
+        revised({"$set": {"store_active": True}, "$unset": {"deactivated_reason": ""}})
+    )
+    await db.products.update_many(
+        {"seller_id": {"$in": user_ids}, "deactivated_reason": LAPSED_REASON},
+        revised({"$set": {"active": True}, "$unset": {"deactivated_reason": ""}})
+    )
+
+async def schedule_subscription_sweep():
+    await enqueue_task("sweep_subscriptions", dedupe_key="sweep_subscriptions")
+
 @api_router.get("/subscription/history")
-async def get_subscription_history(current_user: User = Depends(get_current_user)):
+async def get_subscription_history(current_user: Principal = Depends(get_current_user)):
     """Get subscription payment history"""
     subscriptions = await db.subscriptions.find(
         {"user_id": current_user.id},
@@ -1509,215 +3266,471 @@ async def get_subscription_history(current_user: User = Depends(get_current_user
 
 # ==================== ADMIN ENDPOINTS ====================
 
-@api_router.get("/admin/analytics")
-async def get_admin_analytics(admin: User = Depends(get_admin_user)):
-    """Get dashboard analytics for admin"""
-    
-    # Total users
-    total_users = await db.users.count_documents({})
-    
-    # Active sellers (users with stores)
-    active_sellers = await db.stores.count_documents({})
+# Filtered admin totals are exact but only recounted every ADMIN_COUNT_TTL_SECONDS
+admin_count_cache = TTLCache(maxsize=1024, ttl=ADMIN_COUNT_TTL_SECONDS)
+
+async def admin_total(collection, query: Dict[str, Any]) -> int:
+    if not query:
+        return await collection.estimated_document_count()
+    key = (collection.name, json.dumps(query, sort_keys=True, default=str))
+    total = admin_count_cache.get(key)
+    CACHE_REQUESTS.labels("admin_count", "misses" if total is None else "hits").inc()
+    if total is None:
+        total = await collection.count_documents(query)
+        admin_count_cache[key] = total
+    return total
+
+async def admin_page(collection, query: Dict[str, Any], projection: Dict[str, Any], cursor: Optional[str], page: int, limit: int) -> Dict[str, Any]:
+    """Newest-first page of an admin listing keyed on (created_at, id).
+    
+    Clients walk pages with `next_cursor`; `page` is only honoured (via skip)
+    when no cursor is sent, for callers that still jump to a page number.
+    """
+    limit = max(1, min(limit, 200))
+    find_query = query
+    skip = 0
+    if cursor:
+        created_at, last_id = decode_cursor(cursor, 2)
+        after = keyset_after("created_at", created_at, last_id)
+        find_query = {"$and": [query, after]} if query else after
+    else:
+        skip = (max(page, 1) - 1) * limit
     
-    # Total active listings
-    active_listings = await db.products.count_documents({"active": True})
+    rows, total = await asyncio.gather(
+        collection.find(find_query, projection).sort([("created_at", -1), ("id", -1)]).skip(skip).limit(limit + 1).to_list(limit + 1),
+        admin_total(collection, query)
+    )
     
-    # Orders statistics
-    total_orders = await db.orders.count_documents({})
-    pending_orders = await db.orders.count_documents({"status": "pending"})
-    completed_orders = await db.orders.count_documents({"status": "completed"})
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].get("created_at"), rows[-1]["id"])
     
-    # Revenue calculation (subscriptions)
-    subscriptions = await db.subscriptions.find(
-        {"status": "success"},
-        {"_id": 0, "amount": 1}
-    ).to_list(10000)
-    total_revenue = sum(sub.get("amount", 0) for sub in subscriptions)
-    
-    # Top stores by rating
-    top_stores = await db.stores.find(
-        {"rating": {"$gt": 0}},
-        {"_id": 0, "store_name": 1, "rating": 1, "total_reviews": 1}
-    ).sort("rating", -1).limit(5).to_list(5)
-    
-    # Recent users (last 7 days)
+    return {
+        "rows": rows,
+        "next_cursor": next_cursor,
+        "total": total,
+        "pages": (total + limit - 1) // limit
+    }
+
+# Latest dashboard snapshot, refreshed by a background loop started on startup
+analytics_snapshot: Dict[str, Any] = {}
+
+async def first_row(cursor) -> Dict[str, Any]:
+    rows = await cursor.to_list(1)
+    return rows[0] if rows else {}
+
+async def compute_admin_analytics() -> Dict[str, Any]:
+    """Build the admin dashboard with one aggregation per collection, run concurrently"""
     seven_days_ago = datetime.now(timezone.utc) - timedelta(days=7)
-    new_users_week = await db.users.count_documents(
-        {"created_at": {"$gte": seven_days_ago}}
-    )
     
-    # Users by subscription status
-    active_subscriptions = await db.users.count_documents(
-        {"subscription_status": "active"}
-    )
-    grace_period_subscriptions = await db.users.count_documents(
-        {"subscription_status": "grace_period"}
-    )
-    expired_subscriptions = await db.users.count_documents(
-        {"subscription_status": "expired"}
+    users_pipeline = [{"$facet": {
+        "total": [{"$count": "n"}],
+        "new_this_week": [
+            {"$match": {"created_at": {"$gte": seven_days_ago}}},
+            {"$count": "n"}
+        ],
+        "by_subscription_status": [{"$group": {"_id": "$subscription_status", "n": {"$sum": 1}}}]
+    }}]
+    stores_pipeline = [{"$facet": {
+        "total": [{"$count": "n"}],
+        "top": [
+            {"$match": {"rating": {"$gt": 0}}},
+            {"$sort": {"rating": -1}},
+            {"$limit": 5},
+            {"$project": {"_id": 0, "store_name": 1, "rating": 1, "total_reviews": 1}}
+        ]
+    }}]
+    products_pipeline = [
+        {"$match": {"active": True}},
+        {"$count": "n"}
+    ]
+    orders_pipeline = [{"$group": {"_id": "$status", "n": {"$sum": 1}}}]
+    revenue_pipeline = [
+        {"$match": {"status": "paid"}},
+        {"$group": {"_id": None, "amount": {"$sum": "$amount"}}}
+    ]
+    
+    users, stores, products, orders_by_status, revenue = await asyncio.gather(
+        first_row(db.users.aggregate(users_pipeline)),
+        first_row(db.stores.aggregate(stores_pipeline)),
+        first_row(db.products.aggregate(products_pipeline)),
+        db.orders.aggregate(orders_pipeline).to_list(None),
+        first_row(db.subscriptions.aggregate(revenue_pipeline))
     )
     
+    def facet_count(facet: Dict[str, Any], name: str) -> int:
+        rows = facet.get(name) or []
+        return rows[0]["n"] if rows else 0
+    
+    subscription_counts = {row["_id"]: row["n"] for row in users.get("by_subscription_status", [])}
+    order_counts = {row["_id"]: row["n"] for row in orders_by_status}
+    
     return {
-        "total_users": total_users,
-        "active_sellers": active_sellers,
-        "active_listings": active_listings,
-        "total_orders": total_orders,
-        "pending_orders": pending_orders,
-        "completed_orders": completed_orders,
-        "total_revenue": total_revenue,
-        "top_stores": top_stores,
-        "new_users_this_week": new_users_week,
+        "total_users": facet_count(users, "total"),
+        "active_sellers": facet_count(stores, "total"),
+        "active_listings": products.get("n", 0),
+        "total_orders": sum(order_counts.values()),
+        "pending_orders": order_counts.get("pending", 0),
+        "completed_orders": order_counts.get("completed", 0),
+        # Subscription amounts are stored in paise; the dashboard shows rupees
+        "total_revenue": revenue.get("amount", 0) / 100,
+        "top_stores": stores.get("top", []),
+        "new_users_this_week": facet_count(users, "new_this_week"),
         "subscription_stats": {
-            "active": active_subscriptions,
-            "grace_period": grace_period_subscriptions,
-            "expired": expired_subscriptions
-        }
+            "active": subscription_counts.get("active", 0),
+            "grace_period": subscription_counts.get("grace_period", 0),
+            "expired": subscription_counts.get("expired", 0)
+        },
+        "generated_at": datetime.now(timezone.utc).isoformat()
     }
 
+async def refresh_admin_analytics():
+    analytics_snapshot.update(await compute_admin_analytics())
+
+@api_router.get("/admin/analytics")
+async def get_admin_analytics(admin: Principal = Depends(get_admin_user)):
+    """Get dashboard analytics for admin from the latest snapshot"""
+    if not analytics_snapshot:
+        await refresh_admin_analytics()
+    return analytics_snapshot
+
+# Filters shared by the admin listings and exports
+
+def timestamp_range(field: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, Any]:
+    """[start, end) window on a native datetime `field`"""
+    bounds = {}
+    if start:
+        bounds["$gte"] = as_utc(start)
+    if end:
+        bounds["$lt"] = as_utc(end)
+    return {field: bounds} if bounds else {}
+
+def created_at_range(created_from: Optional[datetime] = None, created_to: Optional[datetime] = None) -> Dict[str, Any]:
+    return timestamp_range("created_at", created_from, created_to)
+
+def admin_filter(*clauses: Dict[str, Any]) -> Dict[str, Any]:
+    clauses = [c for c in clauses if c]
+    if not clauses:
+        return {}
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+def admin_users_query(search: Optional[str] = None, status: Optional[str] = None, created_from: Optional[datetime] = None, created_to: Optional[datetime] = None) -> Dict[str, Any]:
+    search_clause = {}
+    if search:
+        search_clause = {"$or": [
+            {"name": {"$regex": search, "$options": "i"}},
+            {"email": {"$regex": search, "$options": "i"}},
+            {"phone": {"$regex": search, "$options": "i"}}
+        ]}
+    return admin_filter(
+        search_clause,
+        {"subscription_status": status} if status else {},
+        created_at_range(created_from, created_to)
+    )
+
+def admin_stores_query(search: Optional[str] = None, fssai_pending: Optional[bool] = None, created_from: Optional[datetime] = None, created_to: Optional[datetime] = None) -> Dict[str, Any]:
+    query = {}
+    if search:
+        query["store_name"] = {"$regex": search, "$options": "i"}
+    if fssai_pending:
+        query["fssai_submitted_at"] = {"$ne": None}
+        query["fssai_verified"] = False
+    return admin_filter(query, created_at_range(created_from, created_to))
+
+def admin_products_query(search: Optional[str] = None, category: Optional[str] = None, created_from: Optional[datetime] = None, created_to: Optional[datetime] = None) -> Dict[str, Any]:
+    search_clause = {}
+    if search:
+        search_clause = {"$or": [
+            {"title": {"$regex": search, "$options": "i"}},
+            {"description": {"$regex": search, "$options": "i"}}
+        ]}
+    return admin_filter(
+        search_clause,
+        {"category": category} if category else {},
+        created_at_range(created_from, created_to)
+    )
+
+def admin_orders_query(status: Optional[str] = None, created_from: Optional[datetime] = None, created_to: Optional[datetime] = None) -> Dict[str, Any]:
+    return admin_filter(
+        {"status": status} if status else {},
+        created_at_range(created_from, created_to)
+    )
+
+def admin_subscriptions_query(status: Optional[str] = None, created_from: Optional[datetime] = None, created_to: Optional[datetime] = None) -> Dict[str, Any]:
+    return admin_filter(
+        {"status": status} if status else {},
+        created_at_range(created_from, created_to)
+    )
+
+# Foreign-key joins shared by the admin listings and exports; one query per collection per batch
+
+async def enrich_admin_stores(stores: List[Dict[str, Any]]):
+    users = await load_by_ids(db.users, [s["user_id"] for s in stores], ["name", "email", "phone", "subscription_status"])
+    for store in stores:
+        user = users.get(store["user_id"])
+        if user:
+            store["user"] = {k: v for k, v in user.items() if k != "id"}
+
+async def enrich_admin_products(products: List[Dict[str, Any]]):
+    stores = await load_by_ids(db.stores, [p["store_id"] for p in products], ["store_name"])
+    for product in products:
+        store = stores.get(product["store_id"])
+        if store:
+            product["store_name"] = store.get("store_name")
+
+async def enrich_admin_orders(orders: List[Dict[str, Any]]):
+    users, products = await asyncio.gather(
+        load_by_ids(db.users, [o["buyer_id"] for o in orders] + [o["seller_id"] for o in orders], ["name", "email"]),
+        load_by_ids(db.products, [o["product_id"] for o in orders], ["title"])
+    )
+    for order in orders:
+        buyer = users.get(order["buyer_id"])
+        seller = users.get(order["seller_id"])
+        product = products.get(order["product_id"])
+        
+        if buyer:
+            order["buyer_name"] = buyer.get("name")
+        if seller:
+            order["seller_name"] = seller.get("name")
+        if product:
+            order["product_title"] = product.get("title")
+
+async def enrich_admin_subscriptions(subscriptions: List[Dict[str, Any]]):
+    users = await load_by_ids(db.users, [s["user_id"] for s in subscriptions], ["name"])
+    for subscription in subscriptions:
+        user = users.get(subscription["user_id"])
+        if user:
+            subscription["user_name"] = user.get("name")
+
 @api_router.get("/admin/users")
 async def get_all_users(
-    admin: User = Depends(get_admin_user),
+    admin: Principal = Depends(get_admin_user),
     search: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
     page: int = 1,
     limit: int = 50
 ):
     """Get all users with pagination and search"""
-    query = {}
-    
-    if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"email": {"$regex": search, "$options": "i"}},
-            {"phone": {"$regex": search, "$options": "i"}}
-        ]
+    query = admin_users_query(search, created_from=created_from, created_to=created_to)
+    projection = {"_id": 0, **{field: 0 for field in USER_PRIVATE_FIELDS}}
+    result = await admin_page(db.users, query, projection, cursor, page, limit)
     
-    skip = (page - 1) * limit
-    users = await db.users.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(limit)
-    total = await db.users.count_documents(query)
-    
-    return {
-        "users": users,
-        "total": total,
+    return FastJSONResponse({
+        "users": result["rows"],
+        "total": result["total"],
         "page": page,
-        "pages": (total + limit - 1) // limit
-    }
+        "pages": result["pages"],
+        "next_cursor": result["next_cursor"]
+    })
 
 @api_router.get("/admin/stores")
 async def get_all_stores(
-    admin: User = Depends(get_admin_user),
+    admin: Principal = Depends(get_admin_user),
     search: Optional[str] = None,
     fssai_pending: Optional[bool] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
     page: int = 1,
     limit: int = 50
 ):
     """Get all stores with filters"""
-    query = {}
-    
-    if search:
-        query["store_name"] = {"$regex": search, "$options": "i"}
-    
-    if fssai_pending:
-        query["fssai_submitted_at"] = {"$ne": None}
-        query["fssai_verified"] = False
+    query = admin_stores_query(search, fssai_pending, created_from, created_to)
+    result = await admin_page(db.stores, query, {"_id": 0}, cursor, page, limit)
+    stores = result["rows"]
+    await enrich_admin_stores(stores)
     
-    skip = (page - 1) * limit
-    stores = await db.stores.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(limit)
-    
-    # Enrich with user info
-    for store in stores:
-        user = await db.users.find_one({"id": store["user_id"]}, {"_id": 0, "name": 1, "email": 1, "phone": 1, "subscription_status": 1})
-        if user:
-            store["user"] = user
-    
-    total = await db.stores.count_documents(query)
-    
-    return {
+    return FastJSONResponse({
         "stores": stores,
-        "total": total,
+        "total": result["total"],
         "page": page,
-        "pages": (total + limit - 1) // limit
-    }
+        "pages": result["pages"],
+        "next_cursor": result["next_cursor"]
+    })
 
 @api_router.get("/admin/products")
 async def get_all_products(
-    admin: User = Depends(get_admin_user),
+    admin: Principal = Depends(get_admin_user),
     search: Optional[str] = None,
     category: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
     page: int = 1,
     limit: int = 50
 ):
     """Get all products with filters"""
-    query = {}
+    query = admin_products_query(search, category, created_from, created_to)
+    projection = list_projection(PRODUCT_LIST_PROJECTION, fields, required=("id", "store_id", "created_at"))
+    result = await admin_page(db.products, query, projection, cursor, page, limit)
+    products = result["rows"]
+    await enrich_admin_products(products)
     
-    if search:
-        query["$or"] = [
-            {"title": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}}
-        ]
-    
-    if category:
-        query["category"] = category
-    
-    skip = (page - 1) * limit
-    products = await db.products.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(limit)
-    
-    # Enrich with store info
-    for product in products:
-        store = await db.stores.find_one({"id": product["store_id"]}, {"_id": 0, "store_name": 1})
-        if store:
-            product["store_name"] = store.get("store_name")
-    
-    total = await db.products.count_documents(query)
-    
-    return {
+    return FastJSONResponse({
         "products": products,
-        "total": total,
+        "total": result["total"],
         "page": page,
-        "pages": (total + limit - 1) // limit
-    }
+        "pages": result["pages"],
+        "next_cursor": result["next_cursor"]
+    })
 
 @api_router.get("/admin/orders")
 async def get_all_orders(
-    admin: User = Depends(get_admin_user),
+    admin: Principal = Depends(get_admin_user),
     status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
     page: int = 1,
     limit: int = 50
 ):
     """Get all orders with filters"""
-    query = {}
-    
-    if status:
-        query["status"] = status
+    query = admin_orders_query(status, created_from, created_to)
+    result = await admin_page(db.orders, query, {"_id": 0}, cursor, page, limit)
+    orders = result["rows"]
+    await enrich_admin_orders(orders)
     
-    skip = (page - 1) * limit
-    orders = await db.orders.find(query, {"_id": 0}).skip(skip).limit(limit).sort("created_at", -1).to_list(limit)
-    
-    # Enrich with buyer, seller, and product info
-    for order in orders:
-        buyer = await db.users.find_one({"id": order["buyer_id"]}, {"_id": 0, "name": 1, "email": 1})
-        seller = await db.users.find_one({"id": order["seller_id"]}, {"_id": 0, "name": 1, "email": 1})
-        product = await db.products.find_one({"id": order["product_id"]}, {"_id": 0, "title": 1})
-        
-        if buyer:
-            order["buyer_name"] = buyer.get("name")
-        if seller:
-            order["seller_name"] = seller.get("name")
-        if product:
-            order["product_title"] = product.get("title")
-    
-    total = await db.orders.count_documents(query)
-    
-    return {
+    return FastJSONResponse({
         "orders": orders,
-        "total": total,
+        "total": result["total"],
         "page": page,
-        "pages": (total + limit - 1) // limit
-    }
+        "pages": result["pages"],
+        "next_cursor": result["next_cursor"]
+    })
+
+# ====== ADMIN EXPORTS ======
+# Exports stream straight from a Mongo cursor: rows are pulled, joined and
+# written EXPORT_BATCH_SIZE at a time, so memory stays flat for any size.
+
+EXPORT_COLUMNS = {
+    "orders": ["id", "created_at", "status", "buyer_id", "buyer_name", "seller_id", "seller_name",
+               "product_id", "product_title", "quantity", "total_price", "delivery_method", "delivery_fee",
+               "cancellation_charge", "scheduled_date", "scheduled_time", "accepted_at", "delivered_at", "cancelled_at"],
+    "users": ["id", "created_at", "name", "email", "phone", "auth_method", "is_seller", "seller_active",
+              "is_admin", "activation_paid", "subscription_plan", "subscription_status", "subscription_expires_at"],
+    "stores": ["id", "created_at", "store_name", "user_id", "user", "address", "categories", "store_active",
+               "is_pure_veg", "fssai_number", "fssai_verified", "rating", "total_reviews"],
+    "products": ["id", "created_at", "title", "category", "product_type", "price", "seller_id", "store_id",
+                 "store_name", "is_veg", "is_party_order", "active"],
+    "subscriptions": ["id", "created_at", "user_id", "user_name", "plan_type", "amount", "status",
+                      "razorpay_order_id", "razorpay_payment_id", "payment_date", "expires_at"],
+}
+
+# Columns filled in by the batch joins rather than read from the collection
+EXPORT_JOINED_COLUMNS = {
+    "orders": {"buyer_name", "seller_name", "product_title"},
+    "stores": {"user"},
+    "products": {"store_name"},
+    "subscriptions": {"user_name"},
+}
+
+EXPORT_ENRICHERS = {
+    "orders": enrich_admin_orders,
+    "stores": enrich_admin_stores,
+    "products": enrich_admin_products,
+    "subscriptions": enrich_admin_subscriptions,
+}
+
+def export_json_default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def export_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=export_json_default)
+    return value
+
+async def export_rows(kind: str, query: Dict[str, Any]):
+    """Yield export rows in joined batches of EXPORT_BATCH_SIZE"""
+    collection = db[kind]
+    columns = EXPORT_COLUMNS[kind]
+    joined = EXPORT_JOINED_COLUMNS.get(kind, set())
+    projection = {"_id": 0, **{c: 1 for c in columns if c not in joined}}
+    enrich = EXPORT_ENRICHERS.get(kind)
+    
+    batch = []
+    async for doc in collection.find(query, projection, batch_size=EXPORT_BATCH_SIZE):
+        batch.append(doc)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            if enrich:
+                await enrich(batch)
+            yield batch
+            batch = []
+    if batch:
+        if enrich:
+            await enrich(batch)
+        yield batch
+
+async def stream_ndjson(kind: str, query: Dict[str, Any]):
+    async for batch in export_rows(kind, query):
+        yield b"".join(orjson.dumps(row, default=export_json_default, option=orjson.OPT_APPEND_NEWLINE) for row in batch)
+
+async def stream_csv(kind: str, query: Dict[str, Any]):
+    columns = EXPORT_COLUMNS[kind]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    async for batch in export_rows(kind, query):
+        buffer.seek(0)
+        buffer.truncate()
+        for row in batch:
+            writer.writerow([export_value(row.get(c)) for c in columns])
+        yield buffer.getvalue()
+
+@api_router.get("/admin/export/{kind}")
+async def export_admin_data(
+    kind: str,
+    format: str = "ndjson",
+    status: Optional[str] = None,
+    search: Optional[str] = None,
+    category: Optional[str] = None,
+    fssai_pending: Optional[bool] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    admin: Principal = Depends(get_admin_user)
+):
+    """Stream orders, users, stores, products or subscriptions as NDJSON or CSV"""
+    if kind not in EXPORT_COLUMNS:
+        raise HTTPException(status_code=404, detail="Unknown export")
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Format must be ndjson or csv")
+    
+    if kind == "orders":
+        query = admin_orders_query(status, created_from, created_to)
+    elif kind == "users":
+        query = admin_users_query(search, status, created_from, created_to)
+    elif kind == "stores":
+        query = admin_stores_query(search, fssai_pending, created_from, created_to)
+    elif kind == "products":
+        query = admin_products_query(search, category, created_from, created_to)
+    else:
+        query = admin_subscriptions_query(status, created_from, created_to)
+    
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    if format == "csv":
+        body, media_type = stream_csv(kind, query), "text/csv"
+    else:
+        body, media_type = stream_ndjson(kind, query), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{kind}-{timestamp}.{format}"'}
+    )
 
 @api_router.put("/admin/users/{user_id}/toggle-active")
 async def toggle_user_active(
     user_id: str,
-    admin: User = Depends(get_admin_user)
+    admin: Principal = Depends(get_admin_user)
 ):
     """Activate or deactivate a user"""
     user = await db.users.find_one({"id": user_id}, {"_id": 0})
@@ -1736,7 +3749,7 @@ async def toggle_user_active(
 @api_router.put("/admin/stores/{store_id}/verify-fssai")
 async def verify_fssai(
     store_id: str,
-    admin: User = Depends(get_admin_user)
+    admin: Principal = Depends(get_admin_user)
 ):
     """Verify FSSAI certificate for a store"""
     store = await db.stores.find_one({"id": store_id}, {"_id": 0})
@@ -1745,20 +3758,78 @@ async def verify_fssai(
     
     await db.stores.update_one(
         {"id": store_id},
-        {"$set": {"fssai_verified": True}}
+        revised({"$set": {"fssai_verified": True}})
     )
     
     return {"success": True, "message": "FSSAI certificate verified"}
 
+@api_router.post("/admin/maintenance/recompute-ratings")
+async def recompute_ratings_admin(
+    batch_size: int = 500,
+    admin: Principal = Depends(get_admin_user)
+):
+    """Queue a rebuild of every store's rating aggregates"""
+    task_id = await enqueue_task("recompute_ratings", {"batch_size": batch_size}, dedupe_key="recompute_ratings")
+    return {"success": True, "task_id": task_id}
+
+@api_router.post("/admin/maintenance/rebuild-wallets")
+async def rebuild_wallets_admin(admin: Principal = Depends(get_admin_user)):
+    """Queue a check of every wallet balance against the ledger, correcting drift"""
+    task_id = await enqueue_task("rebuild_wallets", dedupe_key="rebuild_wallets")
+    return {"success": True, "task_id": task_id}
+
+@api_router.get("/admin/tasks/metrics")
+async def get_task_metrics(admin: Principal = Depends(get_admin_user)):
+    """Queue depth, lag and throughput for the background task queues"""
+    return FastJSONResponse(await task_queue_metrics())
+
+@api_router.get("/admin/cache/metrics")
+async def get_public_read_metrics(admin: Principal = Depends(get_admin_user)):
+    """Hit/coalesce counters of the public read cache, busiest keys first"""
+    return FastJSONResponse(public_read_metrics())
+
+@api_router.get("/admin/tasks")
+async def get_tasks(
+    admin: Principal = Depends(get_admin_user),
+    status: Optional[str] = "dead",
+    queue: Optional[str] = None,
+    name: Optional[str] = None,
+    cursor: Optional[str] = None,
+    page: int = 1,
+    limit: int = 50
+):
+    """Browse tasks, dead letters by default"""
+    query = {k: v for k, v in {"status": status, "queue": queue, "name": name}.items() if v}
+    result = await admin_page(db.tasks, query, {"_id": 0}, cursor, page, limit)
+    return FastJSONResponse({
+        "tasks": result["rows"],
+        "total": result["total"],
+        "page": page,
+        "pages": result["pages"],
+        "next_cursor": result["next_cursor"]
+    })
+
+@api_router.post("/admin/tasks/{task_id}/retry")
+async def retry_task(task_id: str, admin: Principal = Depends(get_admin_user)):
+    """Give a dead-lettered task a fresh set of attempts"""
+    now = datetime.now(timezone.utc)
+    result = await db.tasks.update_one(
+        {"id": task_id, "status": "dead"},
+        {"$set": {"status": "ready", "attempts": 0, "run_at": now, "updated_at": now}, "$unset": {"finished_at": ""}}
+    )
+    if not result.matched_count:
+        raise HTTPException(status_code=404, detail="Dead task not found")
+    return {"success": True}
+
 @api_router.delete("/admin/products/{product_id}")
 async def delete_product_admin(
     product_id: str,
-    admin: User = Depends(get_admin_user)
+    admin: Principal = Depends(get_admin_user)
 ):
     """Delete/deactivate a product listing"""
     result = await db.products.update_one(
         {"id": product_id},
-        {"$set": {"active": False}}
+        revised({"$set": {"active": False}})
     )
     
     if result.modified_count == 0:
@@ -1766,6 +3837,631 @@ async def delete_product_admin(
     
     return {"success": True, "message": "Product deactivated"}
 
+# ====== DAILY METRIC ROLLUPS ======
+# daily_metrics holds one document per (date, dimension, key): dimension is
+# "all", "category" or "store". Each run finds the days touched since the
+# last watermark and recomputes just those days from the source collections.
+
+# source collection -> (field that advances the watermark, field that dates the metric)
+ROLLUP_SOURCES = {
+    "orders": ("updated_at", "created_at"),
+    "subscriptions": ("updated_at", "payment_date"),
+    "users": ("created_at", "created_at"),
+    "stores": ("created_at", "created_at"),
+}
+
+# Writes stamped just before a run may commit just after it; leave them for the next run
+ROLLUP_SAFETY_LAG = timedelta(seconds=10)
+
+METRIC_DIMENSIONS = ("all", "category", "store")
+
+def day_key(field: str) -> Dict[str, Any]:
+    """Aggregation expression for the UTC YYYY-MM-DD of a datetime field"""
+    return {"$dateToString": {"format": "%Y-%m-%d", "date": f"${field}"}}
+
+def day_bounds(day: str):
+    start = datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+async def rollup_affected_days(source: str, since: Optional[datetime], until: datetime) -> set:
+    change_field, date_field = ROLLUP_SOURCES[source]
+    # Without a watermark every day is rebuilt, including rows written before
+    # change_field existed
+    match = timestamp_range(change_field, since, until) if since else {}
+    pipeline = [
+        {"$match": admin_filter(match, {date_field: {"$ne": None}})},
+        {"$group": {"_id": day_key(date_field)}}
+    ]
+    return {row["_id"] async for row in db[source].aggregate(pipeline)}
+
+def order_metrics_group(key: Any) -> Dict[str, Any]:
+    return {
+        "_id": key,
+        "orders": {"$sum": 1},
+        "completed_orders": {"$sum": {"$cond": [{"$eq": ["$status", "completed"]}, 1, 0]}},
+        "cancelled_orders": {"$sum": {"$cond": [{"$eq": ["$status", "cancelled"]}, 1, 0]}},
+        "gmv": {"$sum": {"$cond": [{"$eq": ["$status", "completed"]}, "$total_price", 0]}},
+        "cancellation_charges": {"$sum": {"$ifNull": ["$cancellation_charge", 0]}}
+    }
+
+def order_metrics(row: Dict[str, Any]) -> Dict[str, Any]:
+    orders = row.get("orders", 0)
+    cancelled = row.get("cancelled_orders", 0)
+    return {
+        "orders": orders,
+        "completed_orders": row.get("completed_orders", 0),
+        "cancelled_orders": cancelled,
+        "gmv": row.get("gmv", 0),
+        "cancellation_charges": row.get("cancellation_charges", 0),
+        "cancellation_rate": round(cancelled / orders, 4) if orders else 0.0
+    }
+
+async def rollup_day(day: str, computed_at: datetime):
+    """Recompute every metric document for one day"""
+    start, end = day_bounds(day)
+    orders_pipeline = [
+        {"$match": created_at_range(start, end)},
+        {"$lookup": {"from": "products", "localField": "product_id", "foreignField": "id", "as": "product"}},
+        {"$set": {
+            "category": {"$arrayElemAt": ["$product.category", 0]},
+            "store_id": {"$arrayElemAt": ["$product.store_id", 0]}
+        }},
+        {"$facet": {
+            "all": [{"$group": order_metrics_group(None)}],
+            "category": [{"$group": order_metrics_group("$category")}],
+            "store": [{"$group": order_metrics_group("$store_id")}]
+        }}
+    ]
+    revenue_pipeline = [
+        {"$match": admin_filter({"status": "paid"}, timestamp_range("payment_date", start, end))},
+        {"$group": {"_id": None, "amount": {"$sum": "$amount"}, "payments": {"$sum": 1}}}
+    ]
+    orders, new_users, new_sellers, revenue = await asyncio.gather(
+        first_row(db.orders.aggregate(orders_pipeline)),
+        db.users.count_documents(created_at_range(start, end)),
+        db.stores.count_documents(created_at_range(start, end)),
+        first_row(db.subscriptions.aggregate(revenue_pipeline))
+    )
+    
+    all_row = (orders.get("all") or [{}])[0]
+    documents = [("all", "all", {
+        **order_metrics(all_row),
+        "new_users": new_users,
+        "new_sellers": new_sellers,
+        "subscription_payments": revenue.get("payments", 0),
+        # Subscription amounts are stored in paise
+        "subscription_revenue": revenue.get("amount", 0) / 100
+    })]
+    for dimension in ("category", "store"):
+        for row in orders.get(dimension, []):
+            if row["_id"] is not None:
+                documents.append((dimension, row["_id"], order_metrics(row)))
+    
+    operations = [
+        UpdateOne(
+            {"date": day, "dimension": dimension, "key": key},
+            {"$set": {**metrics, "computed_at": computed_at}},
+            upsert=True
+        )
+        for dimension, key, metrics in documents
+    ]
+    # Keys that no longer have rows for this day
+    operations.append(DeleteMany({"date": day, "computed_at": {"$lt": computed_at}}))
+    await db.daily_metrics.bulk_write(operations, ordered=True)
+
+async def run_daily_rollup():
+    """Fold rows written since the last run into daily_metrics"""
+    state = await db.rollup_state.find_one({"id": "daily_metrics"}, {"_id": 0}) or {}
+    watermarks = state.get("watermarks", {})
+    until = datetime.now(timezone.utc) - ROLLUP_SAFETY_LAG
+    
+    days = set()
+    for source in ROLLUP_SOURCES:
+        days |= await rollup_affected_days(source, as_utc(watermarks.get(source)), until)
+    
+    computed_at = datetime.now(timezone.utc)
+    for day in sorted(days):
+        await rollup_day(day, computed_at)
+    
+    await db.rollup_state.update_one(
+        {"id": "daily_metrics"},
+        {"$set": {"watermarks": {source: until for source in ROLLUP_SOURCES}, "last_run_at": computed_at}},
+        upsert=True
+    )
+    if days:
+        logger.info(f"Rolled up daily metrics for {len(days)} days")
+
+@api_router.get("/admin/metrics/daily")
+async def get_daily_metrics(
+    start: str,
+    end: str,
+    dimension: str = "all",
+    key: Optional[str] = None,
+    admin: Principal = Depends(get_admin_user)
+):
+    """Daily marketplace metrics between two YYYY-MM-DD dates (inclusive), read from the rollups"""
+    if dimension not in METRIC_DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"Dimension must be one of {', '.join(METRIC_DIMENSIONS)}")
+    try:
+        start_day, _ = day_bounds(start)
+        end_day, _ = day_bounds(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    if end_day < start_day or (end_day - start_day).days > 366:
+        raise HTTPException(status_code=400, detail="Date range must be between 1 and 366 days")
+    
+    query = {"dimension": dimension, "date": {"$gte": start, "$lte": end}}
+    if key:
+        query["key"] = key
+    metrics = await db.daily_metrics.find(query, {"_id": 0, "computed_at": 0}).sort([("date", 1), ("key", 1)]).to_list(None)
+    return {"metrics": metrics}
+
+# ====== DATETIME MIGRATION ======
+# Rewrites timestamps stored as ISO strings by older code into BSON dates.
+# Each collection is walked in _id order in batches; the last _id handled is
+# checkpointed in `migrations` so a restart resumes where it stopped.
+
+DATETIME_MIGRATION_ID = "native_datetimes"
+
+DATETIME_FIELDS = {
+    "users": ["created_at", "subscription_started_at", "subscription_expires_at", "reset_otp_expires"],
+    "stores": ["created_at", "fssai_submitted_at"],
+    "products": ["created_at"],
+    "orders": ["created_at", "updated_at", "expires_at", "accepted_at", "completed_at", "delivered_at", "cancelled_at"],
+    "subscriptions": ["created_at", "updated_at", "payment_date", "expires_at"],
+    "reviews": ["created_at"],
+    "transactions": ["created_at"],
+    "chat_messages": ["timestamp"],
+}
+
+async def migrate_datetimes(batch_size: int = DATETIME_MIGRATION_BATCH_SIZE) -> Dict[str, int]:
+    """Convert string timestamps to native dates in place; safe to re-run"""
+    state = await db.migrations.find_one({"id": DATETIME_MIGRATION_ID}, {"_id": 0}) or {}
+    if state.get("completed"):
+        return {}
+    checkpoints = state.get("checkpoints", {})
+    converted = {}
+    
+    for collection_name, fields in DATETIME_FIELDS.items():
+        collection = db[collection_name]
+        string_fields = {"$or": [{field: {"$type": "string"}} for field in fields]}
+        converted[collection_name] = 0
+        last_id = checkpoints.get(collection_name)
+        
+        while True:
+            query = admin_filter(string_fields, {"_id": {"$gt": last_id}} if last_id else {})
+            docs = await collection.find(query, {field: 1 for field in fields}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+            if not docs:
+                break
+            
+            operations = []
+            for doc in docs:
+                update = {}
+                for field in fields:
+                    if isinstance(doc.get(field), str):
+                        try:
+                            update[field] = to_datetime(doc[field])
+                        except ValueError:
+                            logger.warning(f"Unparseable {collection_name}.{field} on {doc['_id']}: {doc[field]!r}")
+                if update:
+                    operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+            if operations:
+                await collection.bulk_write(operations, ordered=False)
+            
+            converted[collection_name] += len(operations)
+            last_id = docs[-1]["_id"]
+            await db.migrations.update_one(
+                {"id": DATETIME_MIGRATION_ID},
+                {"$set": {f"checkpoints.{collection_name}": last_id}},
+                upsert=True
+            )
+    
+    await db.migrations.update_one(
+        {"id": DATETIME_MIGRATION_ID},
+        {"$set": {"completed": True, "completed_at": datetime.now(timezone.utc), "converted": converted}},
+        upsert=True
+    )
+    logger.info(f"Datetime migration converted: {converted}")
+    return converted
+
+@api_router.post("/admin/maintenance/migrate-datetimes")
+async def migrate_datetimes_admin(
+    force: bool = False,
+    admin: Principal = Depends(get_admin_user)
+):
+    """Run (or with force=true, re-run from the start) the string-to-date migration"""
+    if force:
+        await db.migrations.delete_one({"id": DATETIME_MIGRATION_ID})
+    converted = await migrate_datetimes()
+    return {"success": True, "converted": converted}
+
+# ====== RESPONSE COMPRESSION ======
+# Product feeds, store search and exports run to megabytes of JSON on mobile
+# networks. CompressionMiddleware encodes responses over COMPRESSION_MIN_BYTES
+# with brotli (when installed) or gzip, at a level chosen per route, and
+# compresses streamed bodies chunk by chunk with a sync flush so exported rows
+# still reach the client as they are produced. Already-compressed media and
+# server-sent events pass through untouched. The defaults come from
+# benchmarks/compression_benchmark.py.
+
+# (path prefix, gzip level, brotli quality); the first match wins
+COMPRESSION_LEVELS = [
+    ("/api/products", 6, 5),
+    ("/api/stores/search", 6, 5),
+    ("/api/admin/export", 4, 4),
+]
+COMPRESSION_DEFAULT_LEVELS = (5, 4)
+INCOMPRESSIBLE_TYPES = (
+    "image/", "video/", "audio/", "font/woff",
+    "application/zip", "application/gzip", "application/pdf", "application/octet-stream",
+    "text/event-stream"
+)
+
+compression_stats = {"compressed": 0, "skipped": 0, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0}
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip()] = weight
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if weights.get(encoding, weights.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+def compression_levels(path: str) -> tuple:
+    for prefix, gzip_level, brotli_quality in COMPRESSION_LEVELS:
+        if path.startswith(prefix):
+            return gzip_level, brotli_quality
+    return COMPRESSION_DEFAULT_LEVELS
+
+class StreamEncoder:
+    """Incremental br/gzip encoder; every chunk is flushed so it can be sent on its own"""
+    
+    def __init__(self, encoding: str, path: str):
+        gzip_level, brotli_quality = compression_levels(path)
+        self.brotli = encoding == "br"
+        if self.brotli:
+            self.compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            self.compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    
+    def encode(self, data: bytes, final: bool) -> bytes:
+        started = time.perf_counter()
+        if self.brotli:
+            out = self.compressor.process(data) + (self.compressor.finish() if final else self.compressor.flush())
+        else:
+            out = self.compressor.compress(data) + self.compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+        compression_stats["seconds"] += time.perf_counter() - started
+        compression_stats["bytes_in"] += len(data)
+        compression_stats["bytes_out"] += len(out)
+        return out
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, CompressionResponder(send, encoding, scope["path"], self.minimum_size).send)
+
+class CompressionResponder:
+    """Holds the response start until the first body chunk shows whether
+    the response is worth compressing, then rewrites headers accordingly"""
+    
+    def __init__(self, send, encoding: str, path: str, minimum_size: int):
+        self.downstream = send
+        self.encoding = encoding
+        self.path = path
+        self.minimum_size = minimum_size
+        self.start = None
+        self.encoder: Optional[StreamEncoder] = None
+    
+    def compressible(self, start, headers: MutableHeaders) -> bool:
+        if start["status"] in (204, 304) or "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "").lower()
+        return not content_type.startswith(INCOMPRESSIBLE_TYPES)
+    
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body":
+            await self.downstream(message)
+            return
+        
+        more_body = message.get("more_body", False)
+        if self.start is not None:
+            start, self.start = self.start, None
+            headers = MutableHeaders(raw=start["headers"])
+            if self.compressible(start, headers) and (more_body or len(message.get("body", b"")) >= self.minimum_size):
+                compression_stats["compressed"] += 1
+                headers["Content-Encoding"] = self.encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "content-length" in headers:
+                    del headers["content-length"]
+                self.encoder = StreamEncoder(self.encoding, self.path)
+            else:
+                compression_stats["skipped"] += 1
+            await self.downstream(start)
+        
+        if self.encoder is not None:
+            message = {**message, "body": self.encoder.encode(message.get("body", b""), final=not more_body)}
+        await self.downstream(message)
+
+@api_router.get("/admin/compression/metrics")
+async def get_compression_metrics(admin: Principal = Depends(get_admin_user)):
+    """How much the compression middleware saves and what it costs"""
+    stats = dict(compression_stats)
+    stats["ratio"] = round(stats["bytes_out"] / stats["bytes_in"], 4) if stats["bytes_in"] else None
+    stats["ms_per_mb"] = round(stats["seconds"] * 1000 / (stats["bytes_in"] / 1048576), 2) if stats["bytes_in"] else None
+    stats["brotli"] = brotli is not None
+    return stats
+
+# ====== METRICS ENDPOINT ======
+# MetricsMiddleware counts and times every request under the template of the
+# route that served it (read back from the scope after routing). Task queue
+# depth is refreshed on scrape; event-loop lag is sampled by a background job.
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            template = getattr(route, "path", "unmatched")
+            HTTP_REQUESTS.labels(scope["method"], template, status).inc()
+            HTTP_LATENCY.labels(scope["method"], template).observe(time.perf_counter() - started)
+
+async def sample_event_loop_lag():
+    loop = asyncio.get_running_loop()
+    expected = loop.time() + EVENT_LOOP_LAG_SAMPLE_SECONDS
+    await asyncio.sleep(EVENT_LOOP_LAG_SAMPLE_SECONDS)
+    EVENT_LOOP_LAG.observe(max(0.0, loop.time() - expected))
+
+def executor_backlog(executor) -> int:
+    work_queue = getattr(executor, "_work_queue", None)
+    return work_queue.qsize() if work_queue is not None else 0
+
+def refresh_executor_gauges():
+    loop = asyncio.get_running_loop()
+    EXECUTOR_QUEUE.labels("motor").set(executor_backlog(getattr(motor_asyncio_framework, "_EXECUTOR", None)))
+    EXECUTOR_QUEUE.labels("default").set(executor_backlog(getattr(loop, "_default_executor", None)))
+
+async def refresh_task_queue_gauges():
+    for queue, stats in (await task_queue_metrics())["queues"].items():
+        for status in ("ready", "leased", "dead"):
+            TASK_QUEUE_DEPTH.labels(queue, status).set(stats.get(status, 0))
+        TASK_QUEUE_LAG.labels(queue).set(stats.get("oldest_due_seconds", 0.0))
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    if METRICS_TOKEN and not hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    refresh_executor_gauges()
+    try:
+        await refresh_task_queue_gauges()
+    except Exception as e:
+        logger.warning(f"Task queue metrics unavailable: {str(e)}")
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+# ====== QUERY STATS ======
+# QueryStatsMiddleware gives each request a QueryStats that the Mongo command
+# listener fills in. The totals go out as a Server-Timing header
+# (`db;dur=<ms>;desc="<n> queries"`, which browser devtools display and
+# backend/query_budget.py reads in tests). A request is logged when it runs
+# more than QUERY_BUDGET commands, or when one query shape repeats
+# N_PLUS_ONE_THRESHOLD times, the signature of a lookup inside a loop.
+
+def server_timing(stats: QueryStats, started: float) -> str:
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    return f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries", app;dur={elapsed_ms:.1f}'
+
+def report_query_stats(scope, stats: QueryStats, started: float):
+    repeated = [(shape, n) for shape, n in stats.shapes.most_common(3) if n >= N_PLUS_ONE_THRESHOLD]
+    if stats.count <= QUERY_BUDGET and not repeated:
+        return
+    route = getattr(scope.get("route"), "path", scope["path"])
+    summary = "; ".join(f"{n}x {shape}" for shape, n in repeated) or "no repeated shapes"
+    logger.warning(
+        f"{scope['method']} {route} ran {stats.count} queries (budget {QUERY_BUDGET}) "
+        f"in {stats.seconds * 1000:.1f} ms of {(time.perf_counter() - started) * 1000:.1f} ms: {summary}"
+    )
+
+class QueryStatsMiddleware:
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = QueryStats(scope)
+        token = current_query_stats.set(stats)
+        started = time.perf_counter()
+        
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(raw=message["headers"]).append("Server-Timing", server_timing(stats, started))
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_query_stats.reset(token)
+            report_query_stats(scope, stats, started)
+
+# ====== SLOW QUERY LOG ======
+# The command listener hands any command slower than SLOW_QUERY_MS to
+# record_slow_query(), on whichever Motor thread ran it; that only buffers the
+# shape, collection, duration and issuing route. flush_slow_queries() then
+# runs on the loop: it explains each new shape once per
+# SLOW_QUERY_EXPLAIN_TTL_SECONDS (plan stages, COLLSCAN vs IXSCAN, docs and
+# keys examined vs returned) and appends the entries to the capped
+# slow_queries collection. Literal query values are never stored.
+
+EXPLAINABLE_COMMANDS = ("find", "aggregate", "count", "distinct", "findAndModify", "update", "delete")
+# Session/transport fields pymongo adds to a command; explain rejects them
+COMMAND_ENVELOPE_FIELDS = (
+    "lsid", "txnNumber", "autocommit", "startTransaction", "writeConcern",
+    "$db", "$clusterTime", "$readPreference"
+)
+
+slow_query_buffer: deque = deque(maxlen=1000)
+explained_shapes = TTLCache(maxsize=1024, ttl=SLOW_QUERY_EXPLAIN_TTL_SECONDS)
+
+def record_slow_query(event, collection: str, stats: Optional[QueryStats], seconds: float):
+    """Buffer one slow command, given its CommandStartedEvent"""
+    if event.command_name == "explain" or collection == "slow_queries":
+        return  # the log's own traffic
+    scope = stats.scope if stats is not None else None
+    route = getattr(scope.get("route"), "path", scope["path"]) if scope else None
+    slow_query_buffer.append({
+        "shape": command_shape(event.command_name, event.command),
+        "collection": collection,
+        "command": event.command_name,
+        "database": event.database_name,
+        "duration_ms": round(seconds * 1000, 2),
+        "route": f"{scope['method']} {route}" if scope else "background",
+        "created_at": datetime.now(timezone.utc),
+        "raw_command": event.command
+    })
+
+def explain_sections(explain: Dict[str, Any]) -> tuple:
+    if "queryPlanner" in explain:
+        return explain["queryPlanner"], explain.get("executionStats", {})
+    for stage in explain.get("stages", []):
+        cursor = stage.get("$cursor")
+        if cursor:
+            return cursor.get("queryPlanner", {}), cursor.get("executionStats", {})
+    return {}, {}
+
+def explain_summary(explain: Dict[str, Any]) -> Dict[str, Any]:
+    planner, execution = explain_sections(explain)
+    stages, indexes = [], []
+    
+    def walk(plan: Dict[str, Any]):
+        if plan.get("stage"):
+            stages.append(plan["stage"])
+        if plan.get("indexName"):
+            indexes.append(plan["indexName"])
+        for key in ("queryPlan", "inputStage"):
+            if key in plan:
+                walk(plan[key])
+        for child in plan.get("inputStages", []):
+            walk(child)
+    
+    walk(planner.get("winningPlan", {}))
+    return {
+        "stages": stages,
+        "indexes": indexes,
+        "collscan": "COLLSCAN" in stages,
+        "docs_examined": execution.get("totalDocsExamined"),
+        "keys_examined": execution.get("totalKeysExamined"),
+        "returned": execution.get("nReturned"),
+        "execution_ms": execution.get("executionTimeMillis")
+    }
+
+async def explain_slow_query(entry: Dict[str, Any], command) -> Optional[Dict[str, Any]]:
+    if entry["command"] not in EXPLAINABLE_COMMANDS:
+        return None
+    if entry["shape"] in explained_shapes:
+        return explained_shapes[entry["shape"]]
+    explained = {key: value for key, value in command.items() if key not in COMMAND_ENVELOPE_FIELDS}
+    try:
+        explain = await client[entry["database"]].command({"explain": explained, "verbosity": "executionStats"})
+        summary = explain_summary(explain)
+    except Exception as e:
+        summary = {"error": str(e)[:200]}
+    explained_shapes[entry["shape"]] = summary
+    return summary
+
+async def flush_slow_queries():
+    entries = []
+    while slow_query_buffer:
+        entries.append(slow_query_buffer.popleft())
+    if not entries:
+        return
+    for entry in entries:
+        entry["explain"] = await explain_slow_query(entry, entry.pop("raw_command"))
+    await db.slow_queries.insert_many(entries, ordered=False)
+
+async def ensure_slow_query_log():
+    # Diagnostics only: a server that cannot create it still boots, just without the log
+    try:
+        await db.create_collection("slow_queries", capped=True, size=SLOW_QUERY_LOG_BYTES)
+    except CollectionInvalid:
+        pass  # already there
+    except Exception as e:
+        logger.warning(f"Slow query log unavailable: {str(e)}")
+        return
+    await db.slow_queries.create_index("created_at")
+
+@api_router.get("/admin/slow-queries")
+async def get_slow_queries(
+    admin: Principal = Depends(get_admin_user),
+    hours: int = 24,
+    collection: Optional[str] = None,
+    limit: int = 20
+):
+    """Slow query shapes over the last `hours`, worst total time first"""
+    match = {"created_at": {"$gte": datetime.now(timezone.utc) - timedelta(hours=max(hours, 1))}}
+    if collection:
+        match["collection"] = collection
+    shapes = await db.slow_queries.aggregate([
+        {"$match": match},
+        {"$sort": {"created_at": 1}},
+        {"$group": {
+            "_id": "$shape",
+            "collection": {"$first": "$collection"},
+            "command": {"$first": "$command"},
+            "count": {"$sum": 1},
+            "total_ms": {"$sum": "$duration_ms"},
+            "max_ms": {"$max": "$duration_ms"},
+            "routes": {"$addToSet": "$route"},
+            "explain": {"$last": "$explain"},
+            "last_seen": {"$last": "$created_at"}
+        }},
+        {"$sort": {"total_ms": -1}},
+        {"$limit": max(1, min(limit, 100))}
+    ]).to_list(None)
+    for shape in shapes:
+        shape["shape"] = shape.pop("_id")
+        shape["avg_ms"] = round(shape["total_ms"] / shape["count"], 2)
+    return FastJSONResponse({"threshold_ms": SLOW_QUERY_MS, "hours": hours, "shapes": shapes})
+
 app.include_router(api_router)
 
 app.add_middleware(
@@ -1774,8 +4470,146 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Server-Timing"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(QueryStatsMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+# Long-running loops started on startup; kept here so shutdown can cancel them
+background_tasks: List[asyncio.Task] = []
+
+async def run_periodically(name: str, interval_seconds: float, job):
+    """Run `job` every `interval_seconds`, logging (not propagating) failures"""
+    while True:
+        try:
+            await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Background job {name} failed: {str(e)}")
+        await asyncio.sleep(interval_seconds)
+
+def start_background_job(name: str, interval_seconds: float, job):
+    background_tasks.append(asyncio.create_task(run_periodically(name, interval_seconds, job), name=name))
+
+async def migrate_then_start_rollups():
+    # The rollup groups on BSON dates, so it only starts once string timestamps are gone
+    try:
+        await migrate_datetimes()
+    except Exception as e:
+        logger.error(f"Datetime migration failed: {str(e)}")
+    start_background_job("daily_rollup", ROLLUP_INTERVAL_SECONDS, run_daily_rollup)
+
+async def ensure_indexes():
+    """Create the indexes the query paths above rely on (no-op when present)"""
+    await db.reviews.create_index([("store_id", 1), ("created_at", -1), ("id", -1)])
+    await db.reviews.create_index([("store_id", 1), ("has_photos", 1), ("created_at", -1), ("id", -1)])
+    
+    # Admin listings page on (created_at, id), optionally behind an equality filter
+    for collection in (db.users, db.stores, db.products, db.orders):
+        await collection.create_index([("created_at", -1), ("id", -1)])
+    await db.orders.create_index([("status", 1), ("created_at", -1), ("id", -1)])
+    await db.products.create_index([("category", 1), ("created_at", -1), ("id", -1)])
+    
+    # Expiry and lifecycle range scans
+    await db.orders.create_index([("status", 1), ("expires_at", 1)])
+    await db.users.create_index([("subscription_status", 1), ("subscription_expires_at", 1)])
+    await db.stores.create_index("user_id")
+    await db.products.create_index([("seller_id", 1), ("active", 1)])
+    await db.products.create_index([("store_id", 1), ("active", 1)])
+    await db.subscriptions.create_index([("status", 1), ("payment_date", 1)])
+    
+    # Daily rollups: watermark scans and range reads
+    await db.orders.create_index("updated_at")
+    await db.subscriptions.create_index("updated_at")
+    await db.daily_metrics.create_index([("date", 1), ("dimension", 1), ("key", 1)], unique=True)
+    await db.daily_metrics.create_index([("dimension", 1), ("key", 1), ("date", 1)])
+    
+    # Generated descriptions: lookup by prompt key, expired by Mongo
+    await db.description_cache.create_index("key", unique=True)
+    await db.description_cache.create_index("created_at", expireAfterSeconds=DESCRIPTION_CACHE_TTL_DAYS * 86400)
+    
+    # FSSAI extraction jobs: owner polling
+    await db.fssai_jobs.create_index("id", unique=True)
+    
+    # Wallet: one balance document per user, ledger paged newest first, references booked once
+    await db.wallets.create_index("user_id", unique=True)
+    await db.transactions.create_index([("user_id", 1), ("created_at", -1), ("id", -1)])
+    await db.transactions.create_index(
+        [("user_id", 1), ("reference", 1)],
+        unique=True,
+        partialFilterExpression={"reference": {"$type": "string"}}
+    )
+    
+    # Webhook deliveries: dedupe on Razorpay's event id, drain oldest first
+    await db.payment_events.create_index("id", unique=True)
+    await db.payment_events.create_index([("status", 1), ("received_at", 1)])
+    await db.payment_events.create_index("claim", sparse=True)
+    await db.subscriptions.create_index("razorpay_order_id")
+    
+    # Task queue: leasing per queue, dedupe, admin browsing, cleanup of finished tasks
+    await db.tasks.create_index("id", unique=True)
+    await db.tasks.create_index([("queue", 1), ("status", 1), ("run_at", 1)])
+    await db.tasks.create_index([("queue", 1), ("status", 1), ("leased_until", 1)])
+    await ensure_task_dedupe_index()
+    await db.tasks.create_index([("status", 1), ("created_at", -1), ("id", -1)])
+    await db.tasks.create_index(
+        "finished_at",
+        expireAfterSeconds=TASK_RETENTION_DAYS * 86400,
+        partialFilterExpression={"status": "done"}
+    )
+    
+    # Reviews written before has_photos existed
+    await db.reviews.update_many(
+        {"has_photos": {"$exists": False}},
+        [{"$set": {"has_photos": {"$gt": [{"$size": {"$ifNull": ["$photos", []]}}, 0]}}}]
+    )
+
+async def ensure_task_dedupe_index():
+    """At most one ready task per dedupe key, so concurrent upserts in
+    enqueue_task cannot both insert. Replaces the earlier non-unique index
+    and first drops duplicates that it let through, keeping the oldest."""
+    if "dedupe_key_1_status_1" in await db.tasks.index_information():
+        await db.tasks.drop_index("dedupe_key_1_status_1")
+    
+    ready = {"status": "ready", "dedupe_key": {"$type": "string"}}
+    duplicates = []
+    async for group in db.tasks.aggregate([
+        {"$match": ready},
+        {"$sort": {"created_at": 1}},
+        {"$group": {"_id": "$dedupe_key", "ids": {"$push": "$id"}}},
+        {"$match": {"ids.1": {"$exists": True}}}
+    ]):
+        duplicates.extend(group["ids"][1:])
+    if duplicates:
+        await db.tasks.delete_many({"id": {"$in": duplicates}, "status": "ready"})
+        logger.info(f"Dropped {len(duplicates)} duplicate ready tasks")
+    
+    await db.tasks.create_index(
+        [("dedupe_key", 1), ("status", 1)],
+        unique=True,
+        partialFilterExpression=ready,
+        name="ready_dedupe_key"
+    )
+
+@app.on_event("startup")
+async def startup_db_client():
+    await ensure_indexes()
+    await ensure_slow_query_log()
+    start_task_workers()
+    start_background_job("order_expiry", ORDER_EXPIRY_SWEEP_SECONDS, schedule_order_expiry)
+    start_background_job("subscription_sweep", SUBSCRIPTION_SWEEP_SECONDS, schedule_subscription_sweep)
+    start_background_job("admin_analytics", ANALYTICS_REFRESH_SECONDS, refresh_admin_analytics)
+    start_background_job("event_loop_lag", 0, sample_event_loop_lag)
+    start_background_job("slow_query_log", SLOW_QUERY_FLUSH_SECONDS, flush_slow_queries)
+    background_tasks.append(asyncio.create_task(migrate_then_start_rollups(), name="datetime_migration"))
+    background_tasks.append(asyncio.create_task(backfill_thumbnails(), name="thumbnail_backfill"))
+    background_tasks.append(asyncio.create_task(seed_store_ratings(), name="rating_seed"))
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
     client.close()
\ No newline at end of file
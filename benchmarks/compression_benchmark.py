@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+CPU cost and savings of compressing /api/products feed pages.
+
+Encodes feed pages of several sizes with gzip (levels 1-9) and, when the
+brotli module is installed, brotli (qualities 1-11), the way
+CompressionMiddleware does for a buffered response. Prints the median encode
+time and the bytes saved, which is what COMPRESSION_LEVELS and
+COMPRESSION_MIN_BYTES are tuned from. --photos embeds a base64 JPEG-sized
+blob per product, the worst case the feed can carry.
+
+    python benchmarks/compression_benchmark.py [--rounds 20] [--photos]
+"""
+import argparse
+import base64
+import os
+import random
+import statistics
+import time
+import zlib
+
+import orjson
+
+from serialization_benchmark import make_product
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PAGE_SIZES = (1, 5, 50, 1000)
+GZIP_LEVELS = (1, 4, 6, 9)
+BROTLI_QUALITIES = (1, 4, 5, 11)
+
+def gzip_encode(level):
+    def encode(data):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(data) + compressor.flush()
+    return encode
+
+def brotli_encode(quality):
+    return lambda data: brotli.compress(data, quality=quality)
+
+def bench(fn, data, rounds):
+    out = fn(data)
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(data)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), len(out)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--photos", action="store_true", help="embed a ~60 KiB base64 photo per product")
+    args = parser.parse_args()
+
+    random.seed(42)
+    codecs = [(f"gzip-{level}", gzip_encode(level)) for level in GZIP_LEVELS]
+    if brotli is not None:
+        codecs += [(f"br-{quality}", brotli_encode(quality)) for quality in BROTLI_QUALITIES]
+    else:
+        print("brotli not installed; gzip only")
+
+    for count in PAGE_SIZES:
+        products = [make_product(i) for i in range(count)]
+        if args.photos:
+            for product in products:
+                product["photos"] = ["data:image/jpeg;base64," + base64.b64encode(os.urandom(45000)).decode()]
+        data = orjson.dumps(products)
+        print(f"\n{count} products, {len(data) / 1024:.1f} KiB")
+        for name, fn in codecs:
+            median, size = bench(fn, data, args.rounds)
+            saved = (len(data) - size) / 1024
+            print(f"  {name:8} {median:8.3f} ms  {size / len(data):6.1%} of original  saves {saved:8.1f} KiB  {saved / max(median, 1e-6):8.1f} KiB/ms")
+
+if __name__ == "__main__":
+    main()
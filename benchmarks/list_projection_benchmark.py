@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Bytes read from Mongo and sent to the client for one /api/products feed page.
+
+Builds products the way the app stores them, photos inline as base64 JPEG
+data URLs from the browser, and measures a page under three projections:
+the full document (what the feed read before list projections), the first
+photo sliced out of `photos`, and PRODUCT_LIST_PROJECTION with the
+generated thumbnail. "Mongo" is the BSON size of the returned documents,
+"JSON" what FastJSONResponse sends and "gzip" the same body compressed.
+
+    python benchmarks/list_projection_benchmark.py [--products 200] [--photo-width 1600]
+"""
+import argparse
+import base64
+import gzip
+import io
+import random
+import sys
+
+import bson
+import orjson
+from PIL import Image, ImageDraw
+
+from load_benchmark import BACKEND_DIR, fake_external_services
+from serialization_benchmark import make_product
+
+def make_photo(width: int) -> str:
+    """A phone-camera-like JPEG: soft shapes plus sensor noise"""
+    height = width * 3 // 4
+    image = Image.effect_noise((width, height), 24).convert("RGB")
+    draw = ImageDraw.Draw(image, "RGBA")
+    for _ in range(12):
+        x, y = random.randrange(width), random.randrange(height)
+        r = random.randint(width // 10, width // 3)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(random.randrange(256) for _ in range(3)) + (160,))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+def project(doc: dict, projection: dict) -> dict:
+    """Apply the subset of find() projection syntax the list projections use"""
+    out = {}
+    for key, spec in projection.items():
+        if key == "_id":
+            continue
+        if "." in key:
+            parent, child = key.split(".", 1)
+            if child in doc.get(parent, {}):
+                out.setdefault(parent, {})[child] = doc[parent][child]
+        elif isinstance(spec, dict) and "$slice" in spec:
+            out[key] = doc.get(key, [])[:spec["$slice"]]
+        elif isinstance(spec, dict) and "$substrCP" in spec:
+            _, start, length = spec["$substrCP"]
+            out[key] = doc.get(key, "")[start:start + length]
+        elif key in doc:
+            out[key] = doc[key]
+    return out
+
+def measure(docs):
+    body = orjson.dumps(docs, option=orjson.OPT_NON_STR_KEYS)
+    return sum(len(bson.encode(doc)) for doc in docs), len(body), len(gzip.compress(body, 6))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--photos-per-product", type=int, default=3)
+    parser.add_argument("--photo-width", type=int, default=1600)
+    args = parser.parse_args()
+
+    fake_external_services(argparse.Namespace(mongomock=False))
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+
+    random.seed(42)
+    photos = [make_photo(args.photo_width) for _ in range(8)]
+    products = []
+    for i in range(args.products):
+        product = make_product(i)
+        product.update(
+            description=product["description"] * 4,
+            photos=random.sample(photos, args.photos_per_product),
+            details={"weight": "250g", "ingredients": "Rice, lentils, ghee, whole spices " * 6},
+            availability_days=["mon", "tue", "wed", "thu", "fri"]
+        )
+        product["thumbnail"] = server.make_thumbnail(product["photos"][0])
+        products.append(product)
+
+    sliced = {key: spec for key, spec in server.PRODUCT_LIST_PROJECTION.items() if key != "thumbnail"}
+    projections = {
+        "full document": server.PRODUCT_DETAIL_PROJECTION,
+        "first photo ($slice)": {**sliced, "photos": {"$slice": 1}},
+        "thumbnail": server.PRODUCT_LIST_PROJECTION,
+    }
+    print(f"{args.products} products, {args.photos_per_product} photos of "
+          f"{len(photos[0]) / 1024:.0f} KiB each, thumbnail {len(products[0]['thumbnail']) / 1024:.1f} KiB")
+    print(f"\n{'projection':22} {'Mongo KiB':>10} {'JSON KiB':>10} {'gzip KiB':>10}")
+    for name, projection in projections.items():
+        if projection is server.PRODUCT_DETAIL_PROJECTION:
+            # As stored before thumbnails existed
+            docs = [{key: value for key, value in p.items() if key != "thumbnail"} for p in products]
+        else:
+            docs = [project(p, projection) for p in products]
+        mongo, body, compressed = measure(docs)
+        print(f"{name:22} {mongo / 1024:10.1f} {body / 1024:10.1f} {compressed / 1024:10.1f}")
+
+if __name__ == "__main__":
+    main()
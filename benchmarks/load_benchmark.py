@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+In-process load test of the API against a local Mongo.
+
+Imports backend/server.py with its external services faked and seeds a
+scratch database with synthetic sellers, stores, products, buyers, orders
+and chat messages. It then drives a weighted traffic mix through the full
+middleware stack (httpx's ASGI transport, no sockets): home feed, store
+search, store and product pages, order placement, chat polling and the
+admin dashboard. Prints throughput and p50/p95/p99 per scenario; --json
+saves the run and --compare fails (exit 1) when a scenario's p95 regressed
+past --tolerance against a saved run.
+
+    python benchmarks/load_benchmark.py [--mongomock] [--sellers 50] [--buyers 200]
+        [--concurrency 32] [--duration 30] [--json run.json] [--compare baseline.json]
+
+Without --mongomock it needs a mongod at MONGO_URL (default localhost). Each
+run seeds a fresh scratch database foodambo_bench_<random suffix>, whatever
+DB_NAME says, and drops it afterwards unless --keep is given. The load generator shares the
+server's event loop, so compare runs with each other rather than reading
+the numbers as production capacity.
+
+Faked services: the LLM client is replaced by a canned responder, Twilio,
+Razorpay and SMTP are left unconfigured so the server runs their built-in
+mock modes, and FSSAI extraction uses the fake extractor.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import types
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+CENTER = (19.0760, 72.8777)  # Mumbai
+CATEGORIES = ["breakfast", "lunch", "dinner", "snacks", "sweets", "beverages"]
+SEARCH_TERMS = ["kitchen", "tiffin", "home", "spice", "sweet"]
+
+# name -> weight; the mix of a busy evening
+SCENARIOS = {
+    "home_feed": 35,
+    "store_search": 12,
+    "store_profile": 12,
+    "store_reviews": 8,
+    "product_detail": 10,
+    "place_order": 8,
+    "chat_poll": 12,
+    "admin_analytics": 1,
+    "admin_orders": 2,
+}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mongomock", action="store_true", help="use mongomock-motor instead of a mongod")
+    parser.add_argument("--sellers", type=int, default=50)
+    parser.add_argument("--products-per-store", type=int, default=20)
+    parser.add_argument("--buyers", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--messages-per-order", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of unmeasured load first")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="write the results here")
+    parser.add_argument("--compare", help="results JSON of a previous run to compare p95 against")
+    parser.add_argument("--tolerance", type=float, default=1.2, help="allowed p95 ratio against --compare")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    return parser.parse_args()
+
+def fake_external_services(args):
+    """Environment and modules to set up before server.py is imported"""
+    # Never the DB_NAME of the developer's shell or .env: the run drops it afterwards
+    os.environ["DB_NAME"] = f"foodambo_bench_{uuid.uuid4().hex[:8]}"
+    os.environ["FSSAI_EXTRACTOR"] = "fake"
+    # Empty values are not overridden by the backend's .env, so these stay in mock mode
+    for name in ("TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN", "RAZORPAY_KEY_ID", "RAZORPAY_KEY_SECRET", "SMTP_HOST", "EMERGENT_LLM_KEY"):
+        os.environ[name] = ""
+
+    class LlmChat:
+        def __init__(self, **kwargs):
+            pass
+
+        def with_model(self, *args):
+            return self
+
+        async def send_message(self, message):
+            await asyncio.sleep(0.05)
+            return "Slow-cooked at home with fresh, seasonal ingredients."
+
+    class UserMessage:
+        def __init__(self, text=None, file_contents=None):
+            self.text = text
+
+    class ImageContent:
+        def __init__(self, image_base64):
+            self.image_base64 = image_base64
+
+    chat = types.ModuleType("emergentintegrations.llm.chat")
+    chat.LlmChat, chat.UserMessage, chat.ImageContent = LlmChat, UserMessage, ImageContent
+    sys.modules["emergentintegrations"] = types.ModuleType("emergentintegrations")
+    sys.modules["emergentintegrations.llm"] = types.ModuleType("emergentintegrations.llm")
+    sys.modules["emergentintegrations.llm.chat"] = chat
+
+    if args.mongomock:
+        import mongomock_motor
+        import motor.motor_asyncio
+
+        class MockClient(mongomock_motor.AsyncMongoMockClient):
+            def __init__(self, *client_args, **kwargs):
+                # mongomock emits no command events and has no tz_aware option of its own
+                super().__init__(tz_aware=True)
+
+        motor.motor_asyncio.AsyncIOMotorClient = MockClient
+
+def near(center, km):
+    # ~111 km per degree; good enough for a few km around the centre
+    return center[0] + random.uniform(-km, km) / 111, center[1] + random.uniform(-km, km) / 111
+
+async def seed(server, args):
+    """Insert the synthetic dataset; returns the ids the scenarios pick from"""
+    now = datetime.now(timezone.utc)
+    sellers, stores, products = [], [], []
+    for i in range(args.sellers):
+        seller = server.User(
+            name=f"Seller {i}", email=f"seller{i}@bench.test", auth_method="email", is_seller=True,
+            seller_active=True, activation_paid=True, subscription_plan="monthly",
+            subscription_status="active", subscription_expires_at=now + timedelta(days=30)
+        )
+        latitude, longitude = near(CENTER, 3)
+        store = server.Store(
+            user_id=seller.id, store_name=f"{random.choice(SEARCH_TERMS).title()} Kitchen {i}",
+            address=f"{i} Bench Road", location={"latitude": latitude, "longitude": longitude},
+            categories=random.sample(CATEGORIES, 2)
+        )
+        sellers.append(seller)
+        stores.append(store)
+        for j in range(args.products_per_store):
+            products.append(server.Product(
+                seller_id=seller.id, store_id=store.id, category=random.choice(CATEGORIES),
+                title=f"Dish {i}-{j}", description="Home-style, slow-cooked and freshly made every morning. " * 4,
+                price=round(random.uniform(40, 400), 2), photos=[f"https://cdn.bench.test/{i}/{j}.jpg"],
+                product_type="veg", details={"weight": "250g"}, availability_days=["mon", "tue", "wed"]
+            ))
+    buyers = [server.User(name=f"Buyer {i}", email=f"buyer{i}@bench.test", auth_method="email") for i in range(args.buyers)]
+    admin = server.User(name="Bench Admin", email="admin@bench.test", auth_method="email", is_admin=True)
+
+    orders, messages, reviews = [], [], []
+    for _ in range(args.orders):
+        product = random.choice(products)
+        buyer = random.choice(buyers)
+        status = random.choice(["pending", "accepted", "delivered", "delivered", "cancelled"])
+        created_at = now - timedelta(minutes=random.randint(0, 60 * 24 * 30))
+        order = server.Order(
+            buyer_id=buyer.id, seller_id=product.seller_id, product_id=product.id, quantity=1,
+            total_price=product.price, delivery_method="pickup", scheduled_date="2026-01-01",
+            scheduled_time="12:00", status=status, created_at=created_at,
+            delivered_at=created_at + timedelta(hours=2) if status == "delivered" else None
+        )
+        orders.append(order)
+        for k in range(args.messages_per_order):
+            sender, receiver = (buyer.id, product.seller_id) if k % 2 == 0 else (product.seller_id, buyer.id)
+            messages.append(server.ChatMessage(order_id=order.id, sender_id=sender, receiver_id=receiver, message=f"Message {k}"))
+        if status == "delivered":
+            reviews.append(server.Review(
+                order_id=order.id, store_id=product.store_id, buyer_id=buyer.id,
+                rating=random.randint(3, 5), comment="Tasty", created_at=created_at + timedelta(hours=3)
+            ))
+
+    for collection, docs in (
+        (server.db.users, sellers + buyers + [admin]), (server.db.stores, stores), (server.db.products, products),
+        (server.db.orders, orders), (server.db.chat_messages, messages), (server.db.reviews, reviews),
+    ):
+        for start in range(0, len(docs), 1000):
+            await collection.insert_many([server.to_document(doc) for doc in docs[start:start + 1000]])
+    await server.recompute_store_ratings()
+
+    token = lambda user: {"Authorization": f"Bearer {server.create_access_token({'sub': user.id})}"}
+    return {
+        "stores": [store.id for store in stores],
+        "products": [product.id for product in products],
+        "buyers": [(token(buyer), buyer.id) for buyer in buyers],
+        "chats": [(token(next(b for b in buyers if b.id == order.buyer_id)), order.id) for order in orders[:200]],
+        "admin": token(admin),
+    }
+
+def scenario_request(name, data):
+    """(method, url, kwargs) for one request of scenario `name`"""
+    latitude, longitude = near(CENTER, 1)
+    if name == "home_feed":
+        params = {"latitude": latitude, "longitude": longitude, "radius_km": 2}
+        if random.random() < 0.3:
+            params["categories"] = random.choice(CATEGORIES)
+        return "GET", "/api/products", {"params": params}
+    if name == "store_search":
+        params = {"latitude": latitude, "longitude": longitude}
+        if random.random() < 0.2:
+            params["search"] = random.choice(SEARCH_TERMS)
+        return "GET", "/api/stores/search", {"params": params}
+    if name == "store_profile":
+        # A few shared stores take most of the traffic
+        return "GET", f"/api/stores/{random.choice(data['stores'][:5] if random.random() < 0.6 else data['stores'])}", {}
+    if name == "store_reviews":
+        return "GET", f"/api/reviews/store/{random.choice(data['stores'])}", {}
+    if name == "product_detail":
+        return "GET", f"/api/products/{random.choice(data['products'])}", {}
+    if name == "place_order":
+        headers, _ = random.choice(data["buyers"])
+        return "POST", "/api/orders", {"headers": headers, "json": {
+            "product_id": random.choice(data["products"]), "quantity": random.randint(1, 3),
+            "delivery_method": "pickup", "scheduled_date": "2026-01-01", "scheduled_time": "12:00"
+        }}
+    if name == "chat_poll":
+        headers, order_id = random.choice(data["chats"])
+        return "GET", f"/api/chat/messages/{order_id}", {"headers": headers}
+    if name == "admin_analytics":
+        return "GET", "/api/admin/analytics", {"headers": data["admin"]}
+    if name == "admin_orders":
+        return "GET", "/api/admin/orders", {"headers": data["admin"], "params": {"limit": 50}}
+    raise ValueError(name)
+
+async def drive(client, data, args):
+    names, weights = list(SCENARIOS), list(SCENARIOS.values())
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    loop = asyncio.get_running_loop()
+    measure_from = loop.time() + args.warmup
+    stop_at = measure_from + args.duration
+
+    async def worker():
+        while loop.time() < stop_at:
+            name = random.choices(names, weights)[0]
+            method, url, kwargs = scenario_request(name, data)
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            elapsed = time.perf_counter() - started
+            if loop.time() < measure_from:
+                continue
+            samples[name].append(elapsed)
+            if response.status_code >= 400:
+                errors[name] += 1
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return samples, errors
+
+def percentile(sorted_samples, pct):
+    index = min(len(sorted_samples) - 1, max(0, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+def summarize(samples, errors, duration):
+    results = {}
+    for name, latencies in samples.items():
+        if not latencies:
+            continue
+        ordered = sorted(latencies)
+        results[name] = {
+            "requests": len(ordered),
+            "errors": errors[name],
+            "rps": round(len(ordered) / duration, 2),
+            "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+            **{f"p{pct}_ms": round(percentile(ordered, pct) * 1000, 2) for pct in (50, 95, 99)},
+            "max_ms": round(ordered[-1] * 1000, 2),
+        }
+    return results
+
+def print_report(results, baseline=None):
+    print(f"\n{'scenario':16} {'reqs':>7} {'errs':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, row in results.items():
+        line = f"{name:16} {row['requests']:7d} {row['errors']:5d} {row['rps']:8.1f} {row['p50_ms']:9.2f} {row['p95_ms']:9.2f} {row['p99_ms']:9.2f} {row['max_ms']:9.2f}"
+        if baseline and name in baseline:
+            line += f"   p95 x{row['p95_ms'] / max(baseline[name]['p95_ms'], 1e-6):.2f}"
+        print(line)
+    total = sum(row["requests"] for row in results.values())
+    print(f"{'total':16} {total:7d} {sum(row['errors'] for row in results.values()):5d} {sum(row['rps'] for row in results.values()):8.1f}")
+
+def regressions(results, baseline, tolerance):
+    return [
+        f"{name}: p95 {row['p95_ms']:.2f} ms vs {baseline[name]['p95_ms']:.2f} ms"
+        for name, row in results.items()
+        if name in baseline and row["p95_ms"] > baseline[name]["p95_ms"] * tolerance
+    ]
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=BACKEND_DIR).stdout.strip()
+    except OSError:
+        return None
+
+async def run(args):
+    fake_external_services(args)
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+    if args.mongomock:
+        # mongomock has no aggregation expressions in find projections
+        server.PRODUCT_LIST_PROJECTION["description"] = 1
+
+    db_name = server.db.name
+    started = time.perf_counter()
+    data = await seed(server, args)
+    print(f"seeded {args.sellers} stores, {args.sellers * args.products_per_store} products, "
+          f"{args.buyers} buyers, {args.orders} orders in {time.perf_counter() - started:.1f}s "
+          f"({'mongomock' if args.mongomock else server.mongo_url}/{db_name})")
+
+    await server.startup_db_client()
+    try:
+        # Server errors come back as 500s and count against the scenario instead of aborting the run
+        transport = httpx.ASGITransport(app=server.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            print(f"{args.concurrency} workers, {args.warmup:.0f}s warmup, {args.duration:.0f}s measured")
+            samples, errors = await drive(client, data, args)
+    finally:
+        if not args.mongomock and not args.keep:
+            await server.client.drop_database(db_name)
+        await server.shutdown_db_client()
+    return summarize(samples, errors, args.duration)
+
+def main():
+    args = parse_args()
+    random.seed(args.seed)
+    results = asyncio.run(run(args))
+
+    baseline = None
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())["scenarios"]
+    print_report(results, baseline)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({
+            "meta": {
+                "revision": git_revision(),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "backend": "mongomock" if args.mongomock else "mongod",
+                "args": {k: v for k, v in vars(args).items() if k not in ("json", "compare")},
+            },
+            "scenarios": results,
+        }, indent=2))
+        print(f"\nwrote {args.json}")
+
+    if baseline:
+        slower = regressions(results, baseline, args.tolerance)
+        for line in slower:
+            print(f"REGRESSION {line}")
+        if slower:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
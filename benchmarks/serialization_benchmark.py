@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Serialization cost of one /api/products feed page (1000 products).
+
+Compares the old response path (jsonable_encoder + JSONResponse, i.e. the
+stdlib json encoder) with FastJSONResponse (orjson straight from the Mongo
+documents). Documents are shaped like PRODUCT_LIST_PROJECTION rows with the
+distance/store fields the geo filter adds.
+
+    python benchmarks/serialization_benchmark.py [--products 1000] [--rounds 50]
+"""
+import argparse
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+CATEGORIES = ["breakfast", "lunch", "dinner", "snacks", "sweets", "beverages"]
+
+def make_product(i: int) -> dict:
+    created_at = datetime.now(timezone.utc) - timedelta(minutes=i)
+    return {
+        "id": str(uuid.uuid4()),
+        "seller_id": str(uuid.uuid4()),
+        "store_id": str(uuid.uuid4()),
+        "title": f"Homemade dish #{i}",
+        "description": "Slow-cooked with whole spices and fresh ghee, just like at home. " * 2,
+        "category": random.choice(CATEGORIES),
+        "product_type": "ready_to_eat",
+        "price": round(random.uniform(40, 400), 2),
+        "photos": [f"https://cdn.example.com/products/{i}.jpg"],
+        "is_veg": i % 3 != 0,
+        "spice_level": "medium",
+        "is_party_order": False,
+        "details": {"weight": "250g"},
+        "active": True,
+        "created_at": created_at,
+        "distance": round(random.uniform(0.1, 2.0), 2),
+        "store_name": f"Kitchen {i % 97}",
+        "store_rating": round(random.uniform(3, 5), 1),
+    }
+
+def old_path(products):
+    return JSONResponse(jsonable_encoder(products)).body
+
+def new_path(products):
+    return orjson.dumps(products, option=orjson.OPT_NON_STR_KEYS)
+
+def bench(fn, products, rounds):
+    fn(products)
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(products)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    random.seed(42)
+    products = [make_product(i) for i in range(args.products)]
+    print(f"{args.products} products, payload {len(new_path(products)) / 1024:.0f} KiB, {args.rounds} rounds")
+
+    old_median, old_best = bench(old_path, products, args.rounds)
+    new_median, new_best = bench(new_path, products, args.rounds)
+    print(f"jsonable_encoder + json  median {old_median:8.2f} ms  best {old_best:8.2f} ms")
+    print(f"orjson                   median {new_median:8.2f} ms  best {new_best:8.2f} ms")
+    print(f"speedup                  {old_median / new_median:.1f}x")
+
+if __name__ == "__main__":
+    main()
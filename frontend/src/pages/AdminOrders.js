@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { Card } from '../components/ui/card';
 import { toast } from 'sonner';
@@ -12,6 +12,8 @@ const AdminOrders = () => {
   const [status, setStatus] = useState('');
   const [page, setPage] = useState(1);
   const [totalPages, setTotalPages] = useState(1);
+  // Keyset cursor for each visited page, reset whenever the filters change
+  const cursors = useRef({ key: null, pages: {} });
   const [total, setTotal] = useState(0);
 
   const statusOptions = [
@@ -28,12 +30,17 @@ const AdminOrders = () => {
   }, [page, status]);
 
   const fetchOrders = async () => {
+    const filterKey = JSON.stringify({ status });
+    if (cursors.current.key !== filterKey) {
+      cursors.current = { key: filterKey, pages: {} };
+    }
     setLoading(true);
     try {
       const response = await api.get('/admin/orders', {
-        params: { status, page, limit: 20 }
+        params: { status, page, cursor: cursors.current.pages[page], limit: 20 }
       });
       setOrders(response.data.orders);
+      cursors.current.pages[page + 1] = response.data.next_cursor;
       setTotal(response.data.total);
       setTotalPages(response.data.pages);
     } catch (error) {
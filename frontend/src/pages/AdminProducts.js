@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { Card } from '../components/ui/card';
 import { toast } from 'sonner';
@@ -13,6 +13,8 @@ const AdminProducts = () => {
   const [category, setCategory] = useState('');
   const [page, setPage] = useState(1);
   const [totalPages, setTotalPages] = useState(1);
+  // Keyset cursor for each visited page, reset whenever the filters change
+  const cursors = useRef({ key: null, pages: {} });
   const [total, setTotal] = useState(0);
 
   const categories = [
@@ -40,12 +42,17 @@ const AdminProducts = () => {
   }, [search]);
 
   const fetchProducts = async () => {
+    const filterKey = JSON.stringify({ search, category });
+    if (cursors.current.key !== filterKey) {
+      cursors.current = { key: filterKey, pages: {} };
+    }
     setLoading(true);
     try {
       const response = await api.get('/admin/products', {
-        params: { search, category, page, limit: 20 }
+        params: { search, category, page, cursor: cursors.current.pages[page], limit: 20 }
       });
       setProducts(response.data.products);
+      cursors.current.pages[page + 1] = response.data.next_cursor;
       setTotal(response.data.total);
       setTotalPages(response.data.pages);
     } catch (error) {
@@ -126,9 +133,9 @@ const AdminProducts = () => {
                   <div className="flex items-start gap-4">
                     {/* Product Photo */}
                     <div className="w-24 h-24 rounded-lg bg-gray-100 flex-shrink-0 overflow-hidden">
-                      {product.photos && product.photos[0] ? (
+                      {product.thumbnail ? (
                         <img
-                          src={product.photos[0]}
+                          src={product.thumbnail}
                           alt={product.title}
                           className="w-full h-full object-cover"
                         />
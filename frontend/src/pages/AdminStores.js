@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { Card } from '../components/ui/card';
 import { toast } from 'sonner';
@@ -12,6 +12,8 @@ const AdminStores = () => {
   const [search, setSearch] = useState('');
   const [page, setPage] = useState(1);
   const [totalPages, setTotalPages] = useState(1);
+  // Keyset cursor for each visited page, reset whenever the filters change
+  const cursors = useRef({ key: null, pages: {} });
   const [total, setTotal] = useState(0);
   const [showFssaiPending, setShowFssaiPending] = useState(false);
 
@@ -31,12 +33,17 @@ const AdminStores = () => {
   }, [search]);
 
   const fetchStores = async () => {
+    const filterKey = JSON.stringify({ search, showFssaiPending });
+    if (cursors.current.key !== filterKey) {
+      cursors.current = { key: filterKey, pages: {} };
+    }
     setLoading(true);
     try {
       const response = await api.get('/admin/stores', {
-        params: { search, page, limit: 20, fssai_pending: showFssaiPending }
+        params: { search, page, cursor: cursors.current.pages[page], limit: 20, fssai_pending: showFssaiPending }
       });
       setStores(response.data.stores);
+      cursors.current.pages[page + 1] = response.data.next_cursor;
       setTotal(response.data.total);
       setTotalPages(response.data.pages);
     } catch (error) {
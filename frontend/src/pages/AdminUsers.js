@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { Card } from '../components/ui/card';
 import { toast } from 'sonner';
@@ -12,6 +12,8 @@ const AdminUsers = () => {
   const [search, setSearch] = useState('');
   const [page, setPage] = useState(1);
   const [totalPages, setTotalPages] = useState(1);
+  // Keyset cursor for each visited page, reset whenever the filters change
+  const cursors = useRef({ key: null, pages: {} });
   const [total, setTotal] = useState(0);
 
   useEffect(() => {
@@ -30,12 +32,17 @@ const AdminUsers = () => {
   }, [search]);
 
   const fetchUsers = async () => {
+    const filterKey = JSON.stringify({ search });
+    if (cursors.current.key !== filterKey) {
+      cursors.current = { key: filterKey, pages: {} };
+    }
     setLoading(true);
     try {
       const response = await api.get('/admin/users', {
-        params: { search, page, limit: 20 }
+        params: { search, page, cursor: cursors.current.pages[page], limit: 20 }
       });
       setUsers(response.data.users);
+      cursors.current.pages[page + 1] = response.data.next_cursor;
       setTotal(response.data.total);
       setTotalPages(response.data.pages);
     } catch (error) {
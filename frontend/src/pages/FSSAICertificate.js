@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { storeAPI } from '../utils/api';
 import axios from 'axios';
@@ -18,11 +18,43 @@ const FSSAICertificate = () => {
   const [fssaiNumber, setFssaiNumber] = useState('');
   const [certificateFile, setCertificateFile] = useState(null);
   const [daysRemaining, setDaysRemaining] = useState(null);
+  const [job, setJob] = useState(null);
+  const pollTimer = useRef(null);
 
   useEffect(() => {
-    fetchStore();
+    fetchStore().then((data) => {
+      if (data?.fssai_job_id) {
+        pollJob(data.fssai_job_id);
+      }
+    });
+    return () => clearTimeout(pollTimer.current);
   }, []);
 
+  const pollJob = async (jobId, announce = false) => {
+    try {
+      const response = await storeAPI.getFSSAIJob(jobId);
+      setJob(response.data);
+      if (response.data.status === 'succeeded' || response.data.status === 'failed') {
+        if (announce && response.data.status === 'succeeded') {
+          toast.success('Certificate details extracted');
+        }
+        fetchStore();
+        return;
+      }
+      pollTimer.current = setTimeout(() => pollJob(jobId, true), 2000);
+    } catch (error) {
+      setJob(null);
+    }
+  };
+
+  const readFileAsDataURL = (file) =>
+    new Promise((resolve, reject) => {
+      const reader = new FileReader();
+      reader.onloadend = () => resolve(reader.result);
+      reader.onerror = reject;
+      reader.readAsDataURL(file);
+    });
+
   const fetchStore = async () => {
     try {
       const response = await storeAPI.getMy();
@@ -41,6 +73,8 @@ const FSSAICertificate = () => {
       if (response.data.fssai_number) {
         setFssaiNumber(response.data.fssai_number);
       }
+
+      return response.data;
     } catch (error) {
       toast.error('Failed to load store');
       navigate('/profile');
@@ -58,18 +92,21 @@ const FSSAICertificate = () => {
 
     setSubmitting(true);
     try {
-      const token = localStorage.getItem('foodambo_token');
-      await axios.post(
-        `${API_URL}/api/fssai/upload`,
-        {
-          fssai_number: fssaiNumber,
-          fssai_certificate_url: certificateFile ? 'uploaded' : ''
-        },
-        { headers: { Authorization: `Bearer ${token}` } }
-      );
+      // Certificate photos are read by a background job; PDFs are kept for manual review
+      const isImage = certificateFile && certificateFile.type.startsWith('image/');
+      const response = await storeAPI.uploadFSSAI({
+        fssai_number: fssaiNumber,
+        fssai_certificate_url: certificateFile ? 'uploaded' : '',
+        image_base64: isImage ? await readFileAsDataURL(certificateFile) : null,
+      });
       
       toast.success('FSSAI certificate submitted successfully!');
-      navigate('/profile');
+      if (response.data.job_id) {
+        setJob({ id: response.data.job_id, status: 'queued' });
+        pollJob(response.data.job_id, true);
+      } else {
+        navigate('/profile');
+      }
     } catch (error) {
       toast.error(error.response?.data?.detail || 'Failed to submit certificate');
     } finally {
@@ -154,6 +191,27 @@ const FSSAICertificate = () => {
           </Card>
         )}
 
+        {/* Certificate extraction progress */}
+        {job && !store.fssai_verified && (
+          <Card className="p-4 space-y-1">
+            {job.status === 'succeeded' ? (
+              <>
+                <p className="font-semibold">Certificate details read</p>
+                <p className="text-sm text-foreground-muted">License: {job.result?.license_number || '—'}</p>
+                <p className="text-sm text-foreground-muted">Business: {job.result?.business_name || '—'}</p>
+                <p className="text-sm text-foreground-muted">Valid until: {job.result?.expiry_date || '—'}</p>
+              </>
+            ) : job.status === 'failed' ? (
+              <p className="text-sm text-red-700">We couldn't read your certificate automatically. Our team will review it manually.</p>
+            ) : (
+              <div className="flex items-center gap-2 text-sm text-foreground-muted">
+                <Clock className="w-4 h-4" />
+                Reading your certificate...
+              </div>
+            )}
+          </Card>
+        )}
+
         {/* Upload Form */}
         {!store.fssai_verified && (
           <Card className="p-6 space-y-4">
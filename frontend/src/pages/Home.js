@@ -352,8 +352,8 @@ const Home = () => {
                 <div className="flex gap-4 p-4">
                   {/* Image */}
                   <div className="relative w-32 h-32 rounded-lg overflow-hidden bg-gray-100 flex-shrink-0">
-                    {partyOrder.photos?.[0] ? (
-                      <img src={partyOrder.photos[0]} alt={partyOrder.title} className="w-full h-full object-cover" />
+                    {partyOrder.thumbnail ? (
+                      <img src={partyOrder.thumbnail} alt={partyOrder.title} className="w-full h-full object-cover" />
                     ) : (
                       <div className="w-full h-full flex items-center justify-center text-gray-400 text-4xl">🎊</div>
                     )}
@@ -493,8 +493,8 @@ const Home = () => {
               >
                 {/* Product Image with Badges */}
                 <div className="relative aspect-[4/3] bg-gray-100">
-                  {product.photos?.[0] ? (
-                    <img src={product.photos[0]} alt={product.title} className="w-full h-full object-cover" />
+                  {product.thumbnail ? (
+                    <img src={product.thumbnail} alt={product.title} className="w-full h-full object-cover" />
                   ) : (
                     <div className="w-full h-full flex items-center justify-center text-gray-400">No image</div>
                   )}
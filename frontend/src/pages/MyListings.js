@@ -70,8 +70,8 @@ const MyListings = () => {
             <Card key={product.id} className="p-4" data-testid={`listing-${product.id}`}>
               <div className="flex gap-4">
                 <div className="w-24 h-24 flex-shrink-0 rounded-xl overflow-hidden bg-gray-100">
-                  {product.photos?.[0] ? (
-                    <img src={product.photos[0]} alt={product.title} className="w-full h-full object-cover" />
+                  {product.thumbnail ? (
+                    <img src={product.thumbnail} alt={product.title} className="w-full h-full object-cover" />
                   ) : (
                     <div className="w-full h-full flex items-center justify-center text-gray-400 text-xs">No image</div>
                   )}
@@ -45,8 +45,8 @@ const ProductDetail = () => {
       
       // Fetch store reviews
       try {
-        const reviewsResponse = await reviewAPI.getStore(response.data.store_id);
-        setReviews(reviewsResponse.data);
+        const reviewsResponse = await reviewAPI.getStore(response.data.store_id, { limit: 3 });
+        setReviews(reviewsResponse.data.reviews);
       } catch (error) {
         console.error('Failed to load reviews:', error);
       }
@@ -516,13 +516,13 @@ const ProductDetail = () => {
                   <p className="text-sm">{review.comment}</p>
                 </Card>
               ))}
-              {reviews.length > 3 && (
+              {store.total_reviews > 3 && (
                 <Button
                   variant="outline"
                   onClick={() => navigate(`/store/${store.id}`)}
                   className="w-full"
                 >
-                  View All {reviews.length} Reviews
+                  View All {store.total_reviews} Reviews
                 </Button>
               )}
             </div>
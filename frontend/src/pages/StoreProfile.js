@@ -12,6 +12,8 @@ const StoreProfile = () => {
   const navigate = useNavigate();
   const [store, setStore] = useState(null);
   const [reviews, setReviews] = useState([]);
+  const [reviewsCursor, setReviewsCursor] = useState(null);
+  const [reviewSummary, setReviewSummary] = useState(null);
   const [products, setProducts] = useState([]);
   const [loading, setLoading] = useState(true);
 
@@ -27,7 +29,9 @@ const StoreProfile = () => {
         productAPI.getAll({})
       ]);
       setStore(storeRes.data);
-      setReviews(reviewsRes.data);
+      setReviews(reviewsRes.data.reviews);
+      setReviewsCursor(reviewsRes.data.next_cursor);
+      setReviewSummary(reviewsRes.data.summary);
       setProducts(productsRes.data.filter(p => p.store_id === id));
     } catch (error) {
       toast.error('Failed to load store');
@@ -36,6 +40,16 @@ const StoreProfile = () => {
     }
   };
 
+  const loadMoreReviews = async () => {
+    try {
+      const response = await reviewAPI.getStore(id, { cursor: reviewsCursor });
+      setReviews([...reviews, ...response.data.reviews]);
+      setReviewsCursor(response.data.next_cursor);
+    } catch (error) {
+      toast.error('Failed to load reviews');
+    }
+  };
+
   if (loading || !store) {
     return <div className="flex items-center justify-center min-h-screen">Loading...</div>;
   }
@@ -83,14 +97,14 @@ const StoreProfile = () => {
             </div>
           </div>
 
-          {store.rating > 0 && (
+          {reviewSummary?.total_reviews > 0 && (
             <div className="flex items-center gap-2 mb-4">
               <div className="flex items-center gap-1 bg-secondary/10 px-3 py-1 rounded-full">
                 <Star className="w-5 h-5 text-secondary fill-secondary" />
-                <span className="font-bold text-lg">{store.rating}</span>
+                <span className="font-bold text-lg">{reviewSummary.average}</span>
               </div>
               <span className="text-sm text-foreground-muted">
-                ({store.total_reviews} reviews)
+                ({reviewSummary.total_reviews} reviews)
               </span>
             </div>
           )}
@@ -114,8 +128,8 @@ const StoreProfile = () => {
                 onClick={() => navigate(`/product/${product.id}`)}
               >
                 <div className="aspect-square rounded-t-xl overflow-hidden bg-gray-100">
-                  {product.photos?.[0] && (
-                    <img src={product.photos[0]} alt={product.title} className="w-full h-full object-cover" />
+                  {product.thumbnail && (
+                    <img src={product.thumbnail} alt={product.title} className="w-full h-full object-cover" />
                   )}
                 </div>
                 <div className="p-3">
@@ -129,6 +143,26 @@ const StoreProfile = () => {
 
         <div>
           <h3 className="text-lg font-semibold mb-3">Reviews</h3>
+          {reviewSummary?.total_reviews > 0 && (
+            <Card className="p-4 mb-3" data-testid="rating-summary">
+              {[5, 4, 3, 2, 1].map((star) => {
+                const count = reviewSummary.histogram[star] || 0;
+                return (
+                  <div key={star} className="flex items-center gap-2 text-sm">
+                    <span className="w-3">{star}</span>
+                    <Star className="w-3 h-3 text-secondary fill-secondary" />
+                    <div className="flex-1 h-2 rounded-full bg-gray-100 overflow-hidden">
+                      <div
+                        className="h-full bg-secondary"
+                        style={{ width: `${(count / reviewSummary.total_reviews) * 100}%` }}
+                      />
+                    </div>
+                    <span className="w-8 text-right text-foreground-muted">{count}</span>
+                  </div>
+                );
+              })}
+            </Card>
+          )}
           {reviews.length === 0 ? (
             <p className="text-center text-foreground-muted py-8">No reviews yet</p>
           ) : (
@@ -153,6 +187,11 @@ const StoreProfile = () => {
                   <p className="text-sm">{review.comment}</p>
                 </Card>
               ))}
+              {reviewsCursor && (
+                <Button variant="outline" onClick={loadMoreReviews} className="w-full">
+                  Load More Reviews
+                </Button>
+              )}
             </div>
           )}
         </div>
@@ -7,16 +7,24 @@ import { toast } from 'sonner';
 
 const Wallet = () => {
   const [transactions, setTransactions] = useState([]);
+  const [balance, setBalance] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
-    fetchTransactions();
+    fetchWallet();
   }, []);
 
-  const fetchTransactions = async () => {
+  const fetchWallet = async () => {
     try {
-      const response = await walletAPI.getTransactions();
-      setTransactions(response.data);
+      const [balanceResponse, transactionsResponse] = await Promise.all([
+        walletAPI.getBalance(),
+        walletAPI.getTransactions(),
+      ]);
+      setBalance(balanceResponse.data.balance);
+      setTransactions(transactionsResponse.data.transactions);
+      setNextCursor(transactionsResponse.data.next_cursor);
     } catch (error) {
       toast.error('Failed to load transactions');
     } finally {
@@ -24,9 +32,18 @@ const Wallet = () => {
     }
   };
 
-  const balance = transactions.reduce((acc, t) => {
-    return t.transaction_type === 'credit' ? acc + t.amount : acc - t.amount;
-  }, 0);
+  const loadMoreTransactions = async () => {
+    setLoadingMore(true);
+    try {
+      const response = await walletAPI.getTransactions({ cursor: nextCursor });
+      setTransactions([...transactions, ...response.data.transactions]);
+      setNextCursor(response.data.next_cursor);
+    } catch (error) {
+      toast.error('Failed to load transactions');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   return (
     <div className="min-h-screen bg-background pb-20" data-testid="wallet-page">
@@ -81,6 +98,16 @@ const Wallet = () => {
                 </div>
               </Card>
             ))}
+            {nextCursor && (
+              <Button
+                variant="outline"
+                className="w-full"
+                onClick={loadMoreTransactions}
+                disabled={loadingMore}
+              >
+                {loadingMore ? 'Loading...' : 'Load More'}
+              </Button>
+            )}
           </div>
         )}
       </div>
@@ -36,7 +36,8 @@ export const storeAPI = {
   getMy: () => api.get('/stores/me'),
   get: (id) => api.get(`/stores/${id}`),
   update: (data) => api.put('/stores/me', data),
-  uploadFSSAI: (image_base64) => api.post('/fssai/upload', { image_base64 }),
+  uploadFSSAI: (data) => api.post('/fssai/upload', data),
+  getFSSAIJob: (jobId) => api.get(`/fssai/jobs/${jobId}`),
 };
 
 export const productAPI = {
@@ -62,16 +63,18 @@ export const chatAPI = {
 
 export const reviewAPI = {
   create: (data) => api.post('/reviews', data),
-  getStore: (storeId) => api.get(`/reviews/store/${storeId}`),
+  getStore: (storeId, params) => api.get(`/reviews/store/${storeId}`, { params }),
 };
 
 export const walletAPI = {
   createTransaction: (type, amount, description) => api.post('/wallet/transactions', null, { params: { transaction_type: type, amount, description } }),
-  getTransactions: () => api.get('/wallet/transactions/my'),
+  getTransactions: (params) => api.get('/wallet/transactions/my', { params }),
+  getBalance: () => api.get('/wallet/balance'),
 };
 
 export const aiAPI = {
   generateDescription: (data) => api.post('/ai/generate-description', data),
+  generateDescriptions: (items) => api.post('/ai/generate-descriptions', { items }),
 };
 
 export default api;
\ No newline at end of file
@@ -0,0 +1,122 @@
+"""
+Shared fixtures: the API in-process, with its external services faked.
+
+Tests run against the mongod at MONGO_URL in a fresh scratch database,
+foodambo_test_<random suffix>, whatever DB_NAME says, and drop it
+afterwards. Without a reachable mongod they fall back to mongomock-motor
+when it is installed and are skipped otherwise; mongomock runs no command monitoring, so tests that need
+it ask for the `real_mongo` fixture.
+"""
+import os
+import sys
+import types
+import uuid
+from pathlib import Path
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.update({
+    # Never the DB_NAME of the developer's shell or .env: the session drops it
+    "DB_NAME": f"foodambo_test_{uuid.uuid4().hex[:8]}",
+    "FSSAI_EXTRACTOR": "fake",
+    "FSSAI_JOB_RETRY_BASE_SECONDS": "0.05",
+    "TASK_POLL_SECONDS": "0.1",
+})
+# Empty values are not overridden by the backend's .env, so these stay in mock mode
+for name in ("TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN", "RAZORPAY_KEY_ID", "RAZORPAY_KEY_SECRET", "SMTP_HOST", "EMERGENT_LLM_KEY"):
+    os.environ[name] = ""
+
+def mongod_reachable() -> bool:
+    try:
+        scratch_mongo().admin.command("ping")
+    except PyMongoError:
+        return False
+    return True
+
+def scratch_mongo() -> MongoClient:
+    return MongoClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"), serverSelectionTimeoutMS=500)
+
+REAL_MONGO = mongod_reachable()
+
+def fake_llm():
+    """Tests never reach the LLM service"""
+    class LlmChat:
+        def __init__(self, **kwargs):
+            pass
+
+        def with_model(self, *args):
+            return self
+
+        async def send_message(self, message):
+            return "Slow-cooked at home with fresh, seasonal ingredients."
+
+    class UserMessage:
+        def __init__(self, text=None, file_contents=None):
+            self.text = text
+
+    class ImageContent:
+        def __init__(self, image_base64):
+            self.image_base64 = image_base64
+
+    chat = types.ModuleType("emergentintegrations.llm.chat")
+    chat.LlmChat, chat.UserMessage, chat.ImageContent = LlmChat, UserMessage, ImageContent
+    sys.modules["emergentintegrations"] = types.ModuleType("emergentintegrations")
+    sys.modules["emergentintegrations.llm"] = types.ModuleType("emergentintegrations.llm")
+    sys.modules["emergentintegrations.llm.chat"] = chat
+
+def use_mongomock():
+    import mongomock_motor
+    import motor.motor_asyncio
+
+    class MockClient(mongomock_motor.AsyncMongoMockClient):
+        def __init__(self, *client_args, **kwargs):
+            super().__init__(tz_aware=True)
+
+    motor.motor_asyncio.AsyncIOMotorClient = MockClient
+
+@pytest.fixture(scope="session")
+def server():
+    if not REAL_MONGO:
+        pytest.importorskip("mongomock_motor", reason="needs a mongod at MONGO_URL or mongomock-motor")
+        use_mongomock()
+    fake_llm()
+    import server
+    if not REAL_MONGO:
+        # mongomock has no aggregation expressions in find projections
+        server.PRODUCT_LIST_PROJECTION["description"] = 1
+    return server
+
+@pytest.fixture(scope="session")
+def client(server):
+    from fastapi.testclient import TestClient
+
+    with TestClient(server.app) as client:
+        yield client
+    if REAL_MONGO:
+        scratch_mongo().drop_database(os.environ["DB_NAME"])
+
+@pytest.fixture
+def real_mongo():
+    if not REAL_MONGO:
+        pytest.skip("needs a mongod at MONGO_URL (mongomock emits no command events)")
+
+@pytest.fixture(scope="session")
+def signup(client, server):
+    """signup(**user_fields) -> (user id, auth headers) for a fresh account"""
+    def signup(**fields):
+        response = client.post("/api/auth/email/signup", json={
+            "email": f"{uuid.uuid4().hex[:12]}@test.foodambo.in",
+            "password": "test-password",
+            "name": "Test User",
+        })
+        assert response.status_code == 200, response.text
+        body = response.json()
+        if fields:
+            client.portal.call(server.db.users.update_one, {"id": body["user"]["id"]}, {"$set": fields})
+        return body["user"]["id"], {"Authorization": f"Bearer {body['token']}"}
+    return signup
@@ -0,0 +1,109 @@
+"""FSSAI certificate extraction jobs, run by the task workers with the fake extractor"""
+import asyncio
+import time
+import uuid
+
+import orjson
+import pytest
+
+CERTIFICATE = "data:image/jpeg;base64,/9j/4AAQSkZJRgABAQAAAQABAAD/2wBD"
+
+@pytest.fixture
+def seller(client, signup):
+    user_id, headers = signup()
+    response = client.post("/api/stores", json={
+        "store_name": "Test Kitchen", "address": "1 Test Road",
+        "latitude": 19.076, "longitude": 72.8777, "categories": ["lunch"]
+    }, headers=headers)
+    assert response.status_code == 200, response.text
+    return headers
+
+def upload(client, headers, image=CERTIFICATE):
+    response = client.post("/api/fssai/upload", json={"image_base64": image}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["job_id"]
+
+def wait_for_job(client, headers, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/api/fssai/jobs/{job_id}", headers=headers).json()
+        if job["status"] in ("succeeded", "failed") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+def test_extraction_fills_in_the_store(client, server, seller):
+    job = wait_for_job(client, seller, upload(client, seller))
+
+    expected = asyncio.run(server.fake_fssai_extractor(server.strip_data_url(CERTIFICATE)))
+    assert job["status"] == "succeeded"
+    assert job["attempts"] == 1
+    assert job["result"] == expected
+    store = client.get("/api/stores/me", headers=seller).json()
+    assert store["fssai_number"] == expected["license_number"]
+    assert store["fssai_extraction"]["job_id"] == job["id"]
+
+def test_failed_attempt_is_retried(client, server, seller, monkeypatch):
+    calls = []
+
+    async def flaky(image_base64):
+        calls.append(image_base64)
+        if len(calls) == 1:
+            raise RuntimeError("extractor unavailable")
+        return await server.fake_fssai_extractor(image_base64)
+
+    monkeypatch.setitem(server.FSSAI_EXTRACTORS, "fake", flaky)
+    job = wait_for_job(client, seller, upload(client, seller))
+
+    assert job["status"] == "succeeded"
+    assert job["attempts"] == 2
+    assert job["error"] is None
+
+def test_job_fails_once_attempts_run_out(client, server, seller, monkeypatch):
+    async def broken(image_base64):
+        raise RuntimeError("unreadable certificate")
+
+    monkeypatch.setitem(server.FSSAI_EXTRACTORS, "fake", broken)
+    job_id = upload(client, seller)
+    job = wait_for_job(client, seller, job_id)
+
+    assert job["status"] == "failed"
+    assert job["attempts"] == server.FSSAI_JOB_MAX_ATTEMPTS
+    assert job["error"] == "unreadable certificate"
+    stored = client.portal.call(server.db.fssai_jobs.find_one, {"id": job_id})
+    assert "image_base64" not in stored
+
+def test_interrupted_attempt_requeues_the_job(client, server, monkeypatch):
+    async def hang(image_base64):
+        await asyncio.Event().wait()
+
+    monkeypatch.setitem(server.FSSAI_EXTRACTORS, "fake", hang)
+    job_id = str(uuid.uuid4())
+
+    async def interrupt():
+        await server.db.fssai_jobs.insert_one({
+            "id": job_id, "store_id": "store", "user_id": "user", "status": "queued",
+            "attempts": 0, "image_base64": "AAAA"
+        })
+        attempt = asyncio.create_task(server.process_fssai_job({"job_id": job_id}, {"attempts": 1, "max_attempts": 3}))
+        await asyncio.sleep(0.1)
+        attempt.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await attempt
+        return await server.db.fssai_jobs.find_one({"id": job_id}, {"_id": 0})
+
+    job = client.portal.call(interrupt)
+    assert job["status"] == "queued"
+    assert job["error"] == "Extraction interrupted"
+
+def test_event_stream_follows_the_job_until_it_finishes(client, seller):
+    job_id = upload(client, seller)
+
+    with client.stream("GET", f"/api/fssai/jobs/{job_id}/events", headers=seller) as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        body = response.read().decode()
+
+    events = [chunk.split("\n") for chunk in body.strip().split("\n\n")]
+    assert all(lines[0] == "event: status" for lines in events)
+    statuses = [orjson.loads(lines[1].removeprefix("data: "))["status"] for lines in events]
+    assert statuses[-1] == "succeeded"
+    assert "image_base64" not in body
@@ -0,0 +1,97 @@
+"""Razorpay webhooks: signature check, redelivery, and the background apply"""
+import hashlib
+import hmac
+import time
+
+import orjson
+import pytest
+
+SECRET = "test-webhook-secret"
+
+@pytest.fixture(autouse=True)
+def webhook_secret(server, monkeypatch):
+    monkeypatch.setattr(server, "RAZORPAY_WEBHOOK_SECRET", SECRET)
+
+@pytest.fixture
+def subscription(client, server, signup):
+    """A seller's pending monthly subscription, as /payments/create-order leaves it"""
+    user_id, _ = signup()
+    subscription = server.Subscription(
+        user_id=user_id, plan_type="monthly", amount=29900, status="pending",
+        razorpay_order_id=f"order_{user_id[:8]}"
+    )
+    client.portal.call(server.db.subscriptions.insert_one, server.to_document(subscription))
+    return subscription
+
+def captured(subscription, payment_id="pay_1"):
+    return {"event": "payment.captured", "payload": {"payment": {"entity": {
+        "id": payment_id, "order_id": subscription.razorpay_order_id, "amount": subscription.amount
+    }}}}
+
+def deliver(client, event, event_id, signature=None):
+    body = orjson.dumps(event)
+    if signature is None:
+        signature = hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return client.post("/api/payments/webhook", content=body, headers={
+        "X-Razorpay-Signature": signature, "X-Razorpay-Event-Id": event_id
+    })
+
+def wait_for_event(client, server, event_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        event = client.portal.call(server.db.payment_events.find_one, {"id": event_id}, {"_id": 0})
+        if event["status"] not in ("pending", "processing") or time.monotonic() > deadline:
+            return event
+        time.sleep(0.05)
+
+def user(client, server, user_id):
+    return client.portal.call(server.db.users.find_one, {"id": user_id}, {"_id": 0})
+
+def test_bad_signature_is_rejected(client, server, subscription):
+    response = deliver(client, captured(subscription), f"evt_{subscription.id}", signature="0" * 64)
+
+    assert response.status_code == 400
+    assert client.portal.call(server.db.payment_events.find_one, {"id": f"evt_{subscription.id}"}) is None
+
+def test_redelivered_event_is_acknowledged_once(client, server, subscription):
+    event_id = f"evt_{subscription.id}"
+
+    assert deliver(client, captured(subscription), event_id).json() == {"status": "accepted"}
+    assert deliver(client, captured(subscription), event_id).json() == {"status": "duplicate"}
+    assert client.portal.call(server.db.payment_events.count_documents, {"id": event_id}) == 1
+
+def test_captured_payment_activates_the_seller(client, server, subscription):
+    event_id = f"evt_{subscription.id}"
+    assert deliver(client, captured(subscription), event_id).status_code == 200
+
+    assert wait_for_event(client, server, event_id)["status"] == "processed"
+    stored = client.portal.call(server.db.subscriptions.find_one, {"id": subscription.id}, {"_id": 0})
+    assert stored["status"] == "paid"
+    assert stored["razorpay_payment_id"] == "pay_1"
+    seller = user(client, server, subscription.user_id)
+    assert seller["seller_active"] is True
+    assert seller["subscription_status"] == "active"
+    assert seller["subscription_expires_at"] is not None
+
+def test_retry_after_a_failed_user_write_still_activates(client, server, subscription, monkeypatch):
+    class UsersWriteFails:
+        """server.db, except that users bulk writes raise"""
+        def __init__(self, db):
+            self.db = db
+
+        def __getattr__(self, name):
+            collection = getattr(self.db, name)
+            if name == "users":
+                async def bulk_write(*args, **kwargs):
+                    raise RuntimeError("users write failed")
+                return type("Users", (), {"bulk_write": staticmethod(bulk_write)})()
+            return collection
+
+    event = {"id": f"evt_{subscription.id}", "event": "payment.captured", "payload": captured(subscription)}
+    with monkeypatch.context() as patch:
+        patch.setattr(server, "db", UsersWriteFails(server.db))
+        with pytest.raises(RuntimeError):
+            client.portal.call(server.apply_payment_events, [event])
+
+    assert client.portal.call(server.apply_payment_events, [event]) == {event["id"]: "processed"}
+    assert user(client, server, subscription.user_id)["seller_active"] is True
@@ -0,0 +1,108 @@
+"""
+Mongo commands per request for the main list and detail endpoints.
+
+Each budget is what the endpoint needs with the data seeded here: one find
+for the page, one batched $in per related collection, plus the session
+lookup on authenticated routes. The seed has several stores, products and
+orders per page, so a per-row lookup creeping back in blows the budget.
+"""
+import pytest
+
+from query_budget import assert_query_budget
+
+LATITUDE, LONGITUDE = 19.076, 72.8777
+SELLERS = 6
+PRODUCTS_PER_STORE = 3
+
+pytestmark = pytest.mark.usefixtures("real_mongo")
+
+@pytest.fixture(scope="module")
+def marketplace(client, signup):
+    """Sellers with stores and products, and a buyer who ordered and reviewed from each"""
+    buyer_id, buyer = signup()
+    _, admin = signup(is_admin=True)
+    sellers, stores = [], []
+    for i in range(SELLERS):
+        _, seller = signup()
+        store = client.post("/api/stores", json={
+            "store_name": f"Kitchen {i}", "address": f"{i} Test Road",
+            "latitude": LATITUDE + i / 1000, "longitude": LONGITUDE, "categories": ["lunch"]
+        }, headers=seller)
+        assert store.status_code == 200, store.text
+        products = []
+        for j in range(PRODUCTS_PER_STORE):
+            product = client.post("/api/products", json={
+                "category": "lunch", "title": f"Thali {i}.{j}", "description": "Dal, rice and two sabzis",
+                "price": 120.0, "photos": [f"https://cdn.test.foodambo.in/{i}-{j}.jpg"],
+                "product_type": "meal", "details": {"serves": 1}, "availability_days": ["mon", "tue"]
+            }, headers=seller)
+            assert product.status_code == 200, product.text
+            products.append(product.json())
+        order = client.post("/api/orders", json={
+            "product_id": products[0]["id"], "quantity": 2, "delivery_method": "pickup",
+            "scheduled_date": "2026-01-15", "scheduled_time": "13:00"
+        }, headers=buyer)
+        assert order.status_code == 200, order.text
+        review = client.post("/api/reviews", json={
+            "order_id": order.json()["id"], "rating": 4 + i % 2, "comment": "Tasted like home"
+        }, headers=buyer)
+        assert review.status_code == 200, review.text
+        sellers.append(seller)
+        stores.append(store.json())
+    for amount in (500.0, 120.0, 80.0):
+        response = client.post("/api/wallet/transactions", params={
+            "transaction_type": "credit", "amount": amount, "description": "Top-up"
+        }, headers=buyer)
+        assert response.status_code == 200, response.text
+    return {"buyer": buyer, "admin": admin, "sellers": sellers, "stores": stores}
+
+def test_feed(client, marketplace):
+    response = client.get("/api/products", params={"latitude": LATITUDE, "longitude": LONGITUDE})
+    assert len(response.json()) == SELLERS * PRODUCTS_PER_STORE
+    # products page, then every store on it in one $in
+    assert_query_budget(response, 2)
+
+def test_store_search(client, marketplace):
+    response = client.get("/api/stores/search", params={"latitude": LATITUDE, "longitude": LONGITUDE})
+    assert len(response.json()) == SELLERS
+    # stores, then product counts in one grouped aggregation
+    assert_query_budget(response, 2)
+
+def test_store_profile(client, marketplace):
+    store = marketplace["stores"][0]
+    assert_query_budget(client.get(f"/api/stores/{store['id']}"), 1)
+    assert_query_budget(client.get(f"/api/reviews/store/{store['id']}"), 2)
+
+def test_seller_products(client, marketplace):
+    response = client.get("/api/products/my", headers=marketplace["sellers"][0])
+    assert len(response.json()) == PRODUCTS_PER_STORE
+    assert_query_budget(response, 3)
+
+def test_orders(client, marketplace):
+    response = client.get("/api/orders/my", headers=marketplace["buyer"])
+    assert len(response.json()) == SELLERS
+    # session, orders, and at most one enqueue for orders past their expiry
+    assert_query_budget(response, 3)
+    assert_query_budget(client.get("/api/orders/seller", headers=marketplace["sellers"][0]), 3)
+
+def test_wallet(client, marketplace):
+    buyer = marketplace["buyer"]
+    assert client.get("/api/wallet/balance", headers=buyer).json()["balance"] == 700.0
+    assert_query_budget(client.get("/api/wallet/balance", headers=buyer), 2)
+    assert_query_budget(client.get("/api/wallet/transactions/my", headers=buyer), 2)
+
+@pytest.mark.parametrize("path, budget", [
+    # session, page and total, then one $in per related collection
+    ("/api/admin/users", 3),
+    ("/api/admin/stores", 4),
+    ("/api/admin/products", 4),
+    ("/api/admin/orders", 5),
+])
+def test_admin_listings(client, marketplace, path, budget):
+    response = client.get(path, headers=marketplace["admin"])
+    assert response.status_code == 200, response.text
+    assert_query_budget(response, budget)
+
+def test_admin_analytics_reads_the_snapshot(client, server, marketplace):
+    client.portal.call(server.refresh_admin_analytics)
+    assert_query_budget(client.get("/api/admin/analytics", headers=marketplace["admin"]), 1)
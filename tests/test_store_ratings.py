@@ -0,0 +1,65 @@
+"""Store rating aggregates, including stores saved before they existed"""
+import uuid
+
+import pytest
+
+@pytest.fixture
+def order(client, signup):
+    """(store id, buyer headers, order id) for a fresh store with one order"""
+    _, seller = signup()
+    store = client.post("/api/stores", json={
+        "store_name": "Test Kitchen", "address": "1 Test Road",
+        "latitude": 19.076, "longitude": 72.8777, "categories": ["lunch"]
+    }, headers=seller).json()
+    product = client.post("/api/products", json={
+        "category": "lunch", "title": "Thali", "description": "Dal, rice and two sabzis",
+        "price": 120.0, "photos": [], "product_type": "meal",
+        "details": {"serves": 1}, "availability_days": ["mon"]
+    }, headers=seller).json()
+    _, buyer = signup()
+    created = client.post("/api/orders", json={
+        "product_id": product["id"], "quantity": 1, "delivery_method": "pickup",
+        "scheduled_date": "2026-01-15", "scheduled_time": "13:00"
+    }, headers=buyer)
+    assert created.status_code == 200, created.text
+    return store["id"], buyer, created.json()["id"]
+
+def make_legacy(client, server, store_id, ratings):
+    """Reviews and totals as saved before rating_sum and rating_histogram existed"""
+    async def rewind():
+        await server.db.reviews.insert_many([
+            {"id": str(uuid.uuid4()), "store_id": store_id, "rating": rating} for rating in ratings
+        ])
+        await server.db.stores.update_one({"id": store_id}, {
+            "$set": {"total_reviews": len(ratings), "rating": sum(ratings) / len(ratings)},
+            "$unset": {"rating_sum": "", "rating_histogram": ""}
+        })
+    client.portal.call(rewind)
+
+def stored(client, server, store_id):
+    return client.portal.call(server.db.stores.find_one, {"id": store_id}, {"_id": 0})
+
+def test_first_review_of_a_legacy_store_keeps_its_history(client, server, order):
+    store_id, buyer, order_id = order
+    make_legacy(client, server, store_id, [5, 4])
+
+    response = client.post("/api/reviews", json={"order_id": order_id, "rating": 3, "comment": "Bit salty"}, headers=buyer)
+    assert response.status_code == 200, response.text
+
+    store = stored(client, server, store_id)
+    assert store["total_reviews"] == 3
+    assert store["rating_sum"] == 12
+    assert store["rating"] == 4.0
+    assert store["rating_histogram"] == {"1": 0, "2": 0, "3": 1, "4": 1, "5": 1}
+
+def test_startup_seeding_fills_in_legacy_stores(client, server, order):
+    store_id, _, _ = order
+    make_legacy(client, server, store_id, [5, 5, 2])
+
+    client.portal.call(server.seed_store_ratings)
+
+    store = stored(client, server, store_id)
+    assert store["rating_sum"] == 12
+    assert store["total_reviews"] == 3
+    assert store["rating"] == 4.0
+    assert store["rating_histogram"]["5"] == 2
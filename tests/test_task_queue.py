@@ -0,0 +1,30 @@
+"""Task queue dedupe: one waiting task per dedupe key"""
+import asyncio
+import uuid
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+def test_concurrent_enqueues_share_one_task(client, server):
+    key = f"test:{uuid.uuid4()}"
+
+    async def burst():
+        ids = await asyncio.gather(*(
+            server.enqueue_task("rebuild_wallets", delay_seconds=60, dedupe_key=key) for _ in range(5)
+        ))
+        return ids, await server.db.tasks.count_documents({"dedupe_key": key})
+
+    ids, stored = client.portal.call(burst)
+    assert len(set(ids)) == 1
+    assert stored == 1
+
+def test_index_allows_one_ready_task_per_key(client, server):
+    key = f"test:{uuid.uuid4()}"
+
+    def task(status):
+        return {"id": str(uuid.uuid4()), "name": "rebuild_wallets", "status": status, "dedupe_key": key}
+
+    client.portal.call(server.db.tasks.insert_one, task("ready"))
+    client.portal.call(server.db.tasks.insert_one, task("done"))
+    with pytest.raises(DuplicateKeyError):
+        client.portal.call(server.db.tasks.insert_one, task("ready"))
@@ -0,0 +1,97 @@
+"""Wallet balances kept by $inc alongside the ledger, and their drift repair"""
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+def new_user():
+    return f"user-{uuid.uuid4()}"
+
+async def ledger_entry(server, user_id, transaction_type, amount):
+    """A ledger row written without touching the wallet, as a crash between the two leaves it"""
+    await server.db.transactions.insert_one({
+        "id": str(uuid.uuid4()), "user_id": user_id, "transaction_type": transaction_type,
+        "amount": amount, "description": "legacy", "created_at": datetime.now(timezone.utc)
+    })
+
+async def wallet_and_ledger(server, user_id):
+    wallet = await server.db.wallets.find_one({"user_id": user_id}, server.WALLET_PROJECTION)
+    ledger = await server.first_row(server.db.transactions.aggregate(server.ledger_totals_pipeline({"user_id": user_id})))
+    return wallet, ledger
+
+def assert_matches_ledger(wallet, ledger):
+    for field in ("balance", "credits", "debits"):
+        assert round(wallet[field], 2) == round(ledger.get(field, 0.0), 2), field
+    assert wallet["transaction_count"] == ledger.get("transaction_count", 0)
+
+def test_concurrent_transactions_add_up_to_the_ledger(client, server):
+    user_id = new_user()
+
+    async def burst():
+        await asyncio.gather(
+            *(server.record_transaction(user_id, "credit", 10.0, "top-up") for _ in range(10)),
+            *(server.record_transaction(user_id, "debit", 4.0, "order") for _ in range(5))
+        )
+        return await wallet_and_ledger(server, user_id)
+
+    wallet, ledger = client.portal.call(burst)
+    assert wallet["balance"] == 80.0
+    assert wallet["transaction_count"] == 15
+    assert_matches_ledger(wallet, ledger)
+
+def test_first_transaction_seeds_the_wallet_from_an_existing_ledger(client, server):
+    user_id = new_user()
+
+    async def first_booking():
+        await ledger_entry(server, user_id, "credit", 100.0)
+        await server.record_transaction(user_id, "debit", 30.0, "order")
+        return await wallet_and_ledger(server, user_id)
+
+    wallet, ledger = client.portal.call(first_booking)
+    assert wallet["balance"] == 70.0
+    assert_matches_ledger(wallet, ledger)
+
+def test_repair_corrects_drifted_missing_and_orphaned_wallets(client, server):
+    drifted, missing, orphaned, healthy = (new_user() for _ in range(4))
+
+    async def repair():
+        await server.record_transaction(drifted, "credit", 50.0, "top-up")
+        await ledger_entry(server, drifted, "debit", 20.0)
+        await ledger_entry(server, missing, "credit", 7.0)
+        await server.db.wallets.insert_one({
+            "user_id": orphaned, "balance": 5.0, "credits": 5.0, "debits": 0.0, "transaction_count": 1
+        })
+        await server.record_transaction(healthy, "credit", 12.0, "top-up")
+        before = await server.db.wallets.find_one({"user_id": healthy})
+
+        await server.rebuild_wallets(settle_seconds=0)
+        after = await server.db.wallets.find_one({"user_id": healthy})
+        return before, after, [await wallet_and_ledger(server, user) for user in (drifted, missing, orphaned)]
+
+    before, after, repaired = client.portal.call(repair)
+    for wallet, ledger in repaired:
+        assert_matches_ledger(wallet, ledger)
+    assert repaired[0][0]["balance"] == 30.0
+    assert repaired[2][0]["balance"] == 0.0
+    assert after == before
+
+def test_repair_keeps_a_transaction_booked_while_it_settles(client, server):
+    user_id = new_user()
+
+    async def repair_during_booking():
+        await server.record_transaction(user_id, "credit", 50.0, "top-up")
+        await ledger_entry(server, user_id, "debit", 20.0)
+
+        async def book():
+            await asyncio.sleep(0.05)
+            await server.record_transaction(user_id, "credit", 1.0, "top-up")
+
+        await asyncio.gather(server.rebuild_wallets(settle_seconds=0.2), book())
+        wallet_after_first_run, _ = await wallet_and_ledger(server, user_id)
+        await server.rebuild_wallets(settle_seconds=0)
+        return wallet_after_first_run, await wallet_and_ledger(server, user_id)
+
+    skipped, (wallet, ledger) = client.portal.call(repair_during_booking)
+    # The wallet moved during the settle window, so the first run leaves it alone
+    assert skipped["balance"] == 51.0
+    assert wallet["balance"] == 31.0
+    assert_matches_ledger(wallet, ledger)